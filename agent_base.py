@@ -5,13 +5,17 @@ import locale
 import os
 import re
 
-import markdownify
 import pytz
 import requests
-from bs4 import BeautifulSoup
 from cachetools.func import ttl_cache
 from dotenv import load_dotenv
 
+import html_engine
+import page_sections
+import path_index
+import singleflight
+import visa_store
+
 # Set German locale
 locale.setlocale(locale.LC_ALL, "de_DE.UTF-8")
 
@@ -80,6 +84,9 @@ all_countries.update(_c)
 
 country_name2upper = {name.lower(): name for name in all_countries.values()}
 
+# Exact and substring lookups over trip_sites; rebuilt by apply_sitemap.
+trip_index = path_index.PathIndex(trip_sites)
+
 
 def find_trip_site(recommendation: str) -> str:
     """
@@ -88,10 +95,10 @@ def find_trip_site(recommendation: str) -> str:
     if not recommendation:
         raise ValueError("Recommendation cannot be empty")
 
-    try:
-        return [site for site in trip_sites if recommendation in site][0]
-    except IndexError:
+    site = trip_index.first_containing(recommendation)
+    if site is None:
         raise ValueError(f"No site found for trip recommendation: {recommendation}")
+    return site
 
 
 # Load general FAQs
@@ -175,43 +182,53 @@ Verfügbare Länder:
 """.strip()
 
 
-@ttl_cache(maxsize=1024, ttl=86400)
-def visa_tool_base(country: str) -> str:
-    land_id = country.upper()
-    if land_id not in visa_labels:
-        raise ValueError(
-            f"Unbekanntes Land: {land_id}. Verfügbare Länder: {', '.join(visa_labels.keys())}"
-        )
-
+def fetch_visa_markdown(land_id: str) -> str:
+    """Fetch and render the visum.de page of ``land_id``; raises on any failure."""
     url = f"https://www.visum.de/Visum-beantragen/Visumbeschaffung-beauftragen/apply_visa.php?land_id={land_id}&bundesland_id=AUSLAND"
 
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
+    response = requests.get(url, headers=headers, timeout=10)
+    response.raise_for_status()
 
-        content = soup.find("div", attrs={"id": "content_box"})
+    soup = html_engine.parse(response.text)
 
-        # Convert main content to markdown
-        markdown_content = markdownify.markdownify(str(content)).strip()
+    content = soup.find("div", attrs={"id": "content_box"})
+    if content is None:
+        # A changed or error page: must not replace a stored good copy.
+        raise ValueError(f"no content_box on the visum.de page for {land_id}")
 
-        # Remove multiple line breaks
-        markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
+    # Convert main content to markdown
+    markdown_content = html_engine.to_markdown(content)
 
-        return f"""
+    return f"""
         # Visum-Informationen für {visa_labels[land_id]}
 
         {markdown_content}
         """.strip()
 
+
+def visa_tool_base(country: str) -> str:
+    land_id = country.upper()
+    if land_id not in visa_labels:
+        raise ValueError(
+            f"Unbekanntes Land: {land_id}. Verfügbare Länder: {', '.join(visa_labels.keys())}"
+        )
+
+    # Served from the store, which a daily job keeps current (visa_store);
+    # visum.de is only asked live for a country it does not have yet.
+    stored = visa_store.get(land_id)
+    if stored is not None:
+        return stored
+    try:
+        markdown = fetch_visa_markdown(land_id)
     except requests.RequestException as e:
         return f"Fehler beim Abrufen der Seite: {str(e)}"
     except Exception as e:
         return f"Unerwarteter Fehler: {str(e)}"
+    visa_store.put(land_id, markdown)
+    return markdown
 
 
 # Website tool description
@@ -225,11 +242,14 @@ zum Reiseverlauf (#reiseverlauf) und Reisedetails (#reisedetails)
 noch mal den Leistungen (#leistungen) und den nächsten Terminen (#termine).
 Außerdem gibt es Informationen zu den Unterkünften (#unterkuenfte) und möglichen Verlägerungen (#zusatzprogramme)
 
+Mit einem Anker am Pfad (z.B. "/Afrika/Namibia/Etosha-ALL#reiseverlauf") bekommst du nur diesen
+Abschnitt und ein Inhaltsverzeichnis der Seite; ohne Anker die ganze Seite.
+
 Verfügbare Seiten:
 {sitemap}
 
 Args:
-    url_path: Der Pfad zur gewünschten Seite (z.B. "/Vision", "/Afrika/Namibia")
+    url_path: Der Pfad zur gewünschten Seite (z.B. "/Vision", "/Afrika/Namibia"), optional mit #anker
     
 Returns:
     dict: Enthält 'main_content' (als Markdown) und 'title'
@@ -246,10 +266,11 @@ def apply_sitemap(new_text: str) -> str:
     references stay valid, rebuilds the website tool description, and returns it
     so the caller can push it onto the live LangChain tool.
     """
-    global sitemap, website_tool_description
+    global sitemap, website_tool_description, trip_index
     parsed_sites, parsed_trips, parsed_countries = _parse_sitemap(new_text)
     all_sites[:] = parsed_sites
     trip_sites[:] = parsed_trips
+    trip_index = path_index.PathIndex(parsed_trips)
     all_countries.clear()
     all_countries.update(parsed_countries)
     country_name2upper.clear()
@@ -264,8 +285,21 @@ def apply_sitemap(new_text: str) -> str:
 BASE_URL = "https://www.chamaeleon-reisen.de"
 
 
+# Concurrent misses for the same page (a preview burst, several sessions
+# asking about one trip) share one request; see singleflight. Above the
+# fetch's own 10 s timeout, so a follower only gives up on a hung leader.
+_website_flights = singleflight.Group()
+WEBSITE_FOLLOW_TIMEOUT = 15
+
+
 @ttl_cache(maxsize=1024, ttl=86400)
 def get_chamaeleon_website_html(url_path: str) -> str:
+    return _website_flights.do(
+        url_path, lambda: _fetch_website_html(url_path), WEBSITE_FOLLOW_TIMEOUT
+    )
+
+
+def _fetch_website_html(url_path: str) -> str:
     full_url = BASE_URL + url_path
 
     headers = {
@@ -283,38 +317,51 @@ def chamaeleon_website_tool_base(url_path: str) -> str:
     if url_path.startswith("https://chamaeleon-reisen.de"):
         url_path = url_path[len("https://chamaeleon-reisen.de") :]
 
+    fragment = ""
     if "#" in url_path:
-        url_path, _ = url_path.split("#")
+        url_path, fragment = url_path.split("#", 1)
     if url_path not in all_sites:
         print(f"Warnung: URL '{url_path}' nicht in Sitemap gefunden. ")
     try:
         content = get_chamaeleon_website_html(url_path)
 
-        soup = BeautifulSoup(content, "html.parser")
-
-        # Main Content extrahieren
-        main = soup.find("main") or soup.find("div", class_="main") or soup.find("body")
-
-        # Title extrahieren
-        title = soup.find("title")
-        title_text = title.get_text(strip=True) if title else "Titel nicht gefunden"
-
-        # Convert main content to markdown
-        markdown_content = markdownify.markdownify(str(main)).strip()
-
-        # Remove multiple line breaks
-        markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
+        # Title and main content as markdown, split at the section anchors;
+        # built once per cached page (page_sections).
+        page = page_sections.split(content)
+        title_text = page["title"]
+        markdown_content = page["markdown"]
 
         # Append current termine from TourOne for trip pages. Scraped HTML does
         # not contain them (they are rendered client-side), so this is the only
         # way the bot sees real dates. Must never break the page tool.
         termine_md = ""
-        try:
-            import travel_index
-
-            termine_md = travel_index.get_termine_markdown(url_path)
-        except Exception as e:
-            print(f"[agent_base] termine lookup failed for {url_path}: {e}")
+        if fragment == "termine" or fragment not in page["sections"]:
+            try:
+                import travel_index
+
+                termine_md = travel_index.get_termine_markdown(url_path)
+            except Exception as e:
+                print(f"[agent_base] termine lookup failed for {url_path}: {e}")
+
+        # A fragment asks for one section: that section and the table of
+        # contents instead of the whole page. #termine is answered even
+        # without such a section, from the TourOne termine alone.
+        if fragment in page["sections"] or (fragment == "termine" and termine_md):
+            markdown_content = "\n\n".join(
+                part
+                for part in (page_sections.toc(page), page["sections"].get(fragment, ""))
+                if part
+            )
+        elif fragment:
+            markdown_content = "\n\n".join(
+                part
+                for part in (
+                    f"(Abschnitt #{fragment} gibt es auf dieser Seite nicht, hier die ganze Seite.)",
+                    page_sections.toc(page),
+                    markdown_content,
+                )
+                if part
+            )
 
         result = f"""
         # {title_text}
@@ -347,11 +394,10 @@ def markdownify_page_html(page_html: str) -> str:
     if not isinstance(page_html, str) or not page_html.strip():
         return ""
     try:
-        soup = BeautifulSoup(page_html[:PAGE_HTML_MAX_CHARS], "html.parser")
+        soup = html_engine.parse(page_html[:PAGE_HTML_MAX_CHARS])
         for tag in soup(["script", "style", "noscript"]):
             tag.decompose()
-        markdown_content = markdownify.markdownify(str(soup)).strip()
-        markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
+        markdown_content = html_engine.to_markdown(soup)
         return markdown_content[:PAGE_CONTENT_MAX_CHARS]
     except Exception as e:
         print(f"[agent_base] page_html markdownify failed: {e}")
@@ -628,8 +674,10 @@ Der Kunde befindet sich gerade auf folgender Webseite: {{endpoint}}. Gehe davon
 """.strip()
 
 # URL patterns for link processing
-site_link_pattern = re.compile(r"(?:/[a-zA-Z0-9\-\_]+)*")
-assert all(site_link_pattern.match(url) for url in all_sites)
+# One or more segments: the former ``*`` also matched the empty string at
+# every position of the reply.
+site_link_pattern = re.compile(r"(?:/[a-zA-Z0-9\-\_]+)+")
+assert all(site_link_pattern.match(url) for url in all_sites if url != "/")
 url_pattern = re.compile(
     r"\s(https:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*))"
 )
@@ -637,11 +685,13 @@ url_pattern = re.compile(
 def detect_recommendation_links(reply: str) -> set[str]:
     """
     Detect and return a set of recommendation links from the reply.
+
+    One regex pass plus a set lookup per candidate: linear in the reply.
     """
     links = set()
     for match in site_link_pattern.finditer(reply):
         link = match.group(0)
-        if link in trip_sites:
+        if link in trip_index:
             # check if the link is to #termine
             _, end = match.span(0)
             if reply[end : end + 8] == "#termine":
@@ -45,7 +45,9 @@ import re
 
 import requests
 
+import agenturdaten
 import session_binding
+import shared_state
 from kunden_auth import DEFAULT_USER_AGENT, TIMEOUT, _PHPSESSID_RE
 
 # Eigene Origin→ss.php-Tabelle, NICHT kunden_auth.SS_URLS.
@@ -115,7 +117,13 @@ _AGTNR_RE = re.compile(
 # session renders when the key exists but is unset.
 _AGTNR_RE_VALUE = re.compile(r"\A(?!0+\Z)[0-9]{1,12}\Z")
 
-_store = session_binding.new_store(lambda: AGENTUR_BINDING_TTL)
+# on_drop clears the agency's prefetched Hop 1, as in kunden_auth.
+_store = session_binding.new_store(
+    lambda: AGENTUR_BINDING_TTL,
+    on_drop=agenturdaten.drop_warm,
+    shared=shared_state.get(),
+    name="agentur",
+)
 
 # Live aliases onto the store's own dicts — see kunden_auth for why this is safe
 # (nothing ever reassigns them; they are mutated in place).
@@ -217,6 +225,19 @@ def resolve(session_id: str) -> str | None:
     return session_binding.resolve(_store, session_id)
 
 
+def sweep() -> int:
+    """Evict expired bindings (session_binding.start_sweeper runs this)."""
+    evicted = session_binding.sweep(_store)
+    if evicted:
+        print(f"[agentur_auth] evicted {evicted} expired bindings")
+    return evicted
+
+
+def binding_gauges() -> dict[str, int]:
+    """Bindings, auths in flight and evictions of this store (/admin/bindings)."""
+    return session_binding.gauges(_store)
+
+
 def authenticate(
     body: dict, user_agent: str = "", origin: str = ""
 ) -> tuple[bool, str | None]:
@@ -246,6 +267,15 @@ def authenticate(
     if not committed:
         print("[agentur_auth] superseded by a newer auth for the same session")
     authenticated = bool(agentur_id) and committed
+    if authenticated:
+        # Background Hop 1, same rules as kunden_auth: lands only while this
+        # session is still bound to this agency.
+        agenturdaten.prefetch_hop1(
+            agentur_id,
+            lambda ablegen: session_binding.if_bound(
+                _store, session_id, agentur_id, ablegen
+            ),
+        )
     # Wie im Kundenpfad entfernt: eine Zeile pro Seitenaufruf, sobald ein
     # agt-Host das neue Widget ausliefert. Die Anomalien bleiben — superseded
     # oben, unbekannter Origin und ss.php-Statuscodes in
@@ -3,10 +3,11 @@
 Gegenstück zu :mod:`kundendaten`, mit demselben Zwei-Hop-Aufbau — aber Hop 1 ist
 hier bereits ungewöhnlich reichhaltig:
 
-    GET /get/buchungLeistungenListe?agenturNummer=<agtNr>   (Hop 1, timeout=8)
+    GET /get/buchungLeistungenListe?agenturNummer=<agtNr>   (Hop 1, timeout=8;
+      │                                                 nach der Auth vorgewärmt)
       └─ buchungLeistungen.{ACTION, KUNDE, TEILNEHMERS[], LEISTUNGEN[]}
            ├─ details=false → grobe Liste, NUR Hop 1
-           └─ details=true  → je Buchung, nebenläufig (DETAIL_PARALLEL):
+           └─ details=true  → je Buchung, nebenläufig (fanout.TOURONE_PARALLEL):
                 GET /get/buchung?vorgangsNummer=…            (Hop 2)
                 → Zahlstand, Flüge, Personenzahl, autoritativer Titel
 
@@ -50,11 +51,11 @@ Rohziffern. Es wird ausschließlich ``leistungVonDat``/``leistungBisDat``
 gelesen (``YYYY-MM-DD HH:MM:SS``).
 """
 
-from concurrent.futures import ThreadPoolExecutor
 from typing import Literal
 
 from langchain_core.tools import tool
 
+import hop2_batch
 from kundendaten import (
     buchung_titel,
     flug_zeile,
@@ -63,6 +64,8 @@ from kundendaten import (
     heute_berlin,
     personen_text,
     select,
+    warm_prefetch,
+    warm_take,
     zahlstand_zeilen,
     zeit_marker,
 )
@@ -82,11 +85,17 @@ TIMEOUT = 8
 # Kunde hat eine Handvoll eigener Buchungen, eine Agentur bis zu 191 fremder.
 DETAIL_ROW_CAP = 25
 
-# Gleichzeitige Hop-2-Requests gegen TourOne. Wie im Kundenpfad: begrenzt die
-# Last, nicht die Sichtbarkeit — wie viele Buchungen im Detail erscheinen,
-# entscheidet allein DETAIL_ROW_CAP. Bei ~0,13s je Hop 2 (Plan §3) bleiben die
-# maximal 25 Buchungen so unter einer halben Sekunde statt über drei.
-DETAIL_PARALLEL = 8
+# Gleichzeitige Hop-2-Requests gegen TourOne begrenzt ``fanout.TOURONE_PARALLEL``
+# — prozessweit, geteilt mit dem Kundenpfad. Wie dort: begrenzt die Last, nicht
+# die Sichtbarkeit — wie viele Buchungen im Detail erscheinen, entscheidet allein
+# DETAIL_ROW_CAP. Bei ~0,13s je Hop 2 (Plan §3) bleiben die maximal 25 Buchungen
+# so unter einer halben Sekunde statt über drei, solange der Pool frei ist.
+
+# agentur_id -> (Hop-1-Seite, ablauf), nach der Auth vorgewärmt. Gleiche Regeln
+# wie ``kundendaten._warm``: nach Identität geschlüsselt, geräumt über on_drop
+# des agentur_auth-Stores. Gecacht wird die ROHE Seite — G3 läuft bei jedem
+# Lesen erneut, ein vorgewärmter Hop 1 umgeht keinen Wächter.
+_warm: dict[str, tuple[object, float]] = {}
 
 # Die Anforderung, die die gebuchte REISE bezeichnet (gemessen: erster Eintrag
 # bei 422/486 Buchungen, längste Zeitspanne bei 391/486). Alle anderen Codes
@@ -131,6 +140,27 @@ def _agentur_get(path: str, params: dict):
     return _tourone_get(path, params, timeout=TIMEOUT)
 
 
+def _hole_liste(agentur_id: str):
+    return _agentur_get("/get/buchungLeistungenListe", {"agenturNummer": agentur_id})
+
+
+def prefetch_hop1(agentur_id: str, still_bound) -> None:
+    """Hop 1 dieser Agentur vorwärmen (siehe :func:`kundendaten.warm_prefetch`)."""
+
+    def hole():
+        page = _hole_liste(agentur_id)
+        # Leere Seite nicht cachen: eine frische Buchung soll beim ersten
+        # Tool-Aufruf sichtbar sein, nicht erst nach dem nächsten Vorwärmen.
+        return page if _rows(page) else None
+
+    warm_prefetch(_warm, agentur_id, hole, still_bound, "agenturdaten")
+
+
+def drop_warm(agentur_id: str) -> None:
+    """Vorgewärmten Hop 1 verwerfen — ``on_drop`` des agentur_auth-Stores."""
+    _warm.pop(agentur_id, None)
+
+
 def _rows(page: object) -> list[dict]:
     """``{"0": {...}, "1": {...}, "anzahl": N}`` → Liste. Objekt, kein Array."""
     if isinstance(page, dict):
@@ -344,22 +374,13 @@ def _hop2_alle(ausgewaehlt: list) -> list:
     demselben Grund wie im Kundenpfad: sequenziell wäre die Wartezeit linear in
     der Buchungszahl.
     """
-    if not ausgewaehlt:
-        return []
-
-    def hole(b: dict):
-        try:
-            return _tourone_get(
-                "/get/buchung", {"vorgangsNummer": b["vorgang"]}, timeout=TIMEOUT
-            )
-        except Exception as e:
-            print(f"[agenturdaten] buchung lookup failed: {type(e).__name__}")
-            return None
-
-    if len(ausgewaehlt) == 1:  # kein Pool für einen einzelnen Request
-        return [hole(ausgewaehlt[0])]
-    with ThreadPoolExecutor(max_workers=min(DETAIL_PARALLEL, len(ausgewaehlt))) as pool:
-        return list(pool.map(hole, ausgewaehlt))
+    # Gebündelt oder je Buchung — hop2_batch entscheidet nach dem Startup-Probe.
+    # G3 auf Hop 2 (_hop2_freigeben) läuft danach auf JEDER Zeile, egal woher.
+    return hop2_batch.hole_details(
+        [b["vorgang"] for b in ausgewaehlt],
+        lambda path, params: _tourone_get(path, params, timeout=TIMEOUT),
+        "agenturdaten",
+    )
 
 
 def _hop2_freigeben(detail: object, agentur_id: str) -> dict | None:
@@ -466,10 +487,10 @@ def fetch_buchungen_text(
     agentur_id: str, auswahl: str = "alle", anzahl: int = 0, details: bool = False
 ) -> str:
     """Hole und formatiere die Buchungen dieser Agentur. Wirft nie."""
+    page = warm_take(_warm, agentur_id)
     try:
-        page = _agentur_get(
-            "/get/buchungLeistungenListe", {"agenturNummer": agentur_id}
-        )
+        if page is None:
+            page = _hole_liste(agentur_id)
     except Exception as e:
         # ~1–2% der eingeloggten Agenturen scheitern hier hart und dauerhaft
         # (§3). Das MUSS als „gerade nicht abrufbar" ankommen, nie als „keine
@@ -1,25 +1,34 @@
+import functools
 import json
 import os
 import threading
 import time
 import traceback
-from functools import cache
 
 import requests
 from flask import Flask, Response, abort, request, send_from_directory
 from flask_cors import CORS
+from werkzeug.datastructures import Headers
 
 from agent import call_stream
+import agent_base
 from agent_base import markdownify_page_html
 from kundendaten import filter_new_tool_calls
 import agentur_auth
 import kunden_auth
 import dashboard
+import proxy_cache
+import proxy_encoding
+import proxy_stream
+import hop2_batch
 import rate_limit
+import session_binding
+import singleflight
 import sitemap_sync
 import travel_index
-from db_logging import DEBUG, Message, log_messages, log_queue
-from recommendations import make_recommendation_previews_async
+import visa_store
+from db_logging import DEBUG, Message, log_queue
+from recommendations import PreviewStage
 
 app = Flask(__name__)
 
@@ -153,6 +162,10 @@ def chat_stream():
                 # Handle recommendation previews for final response
                 if event.get("type") == "response":
                     recommendations = event["data"]["recommendations"]
+                    # Start the previews before anything is sent: they build
+                    # on the shared pool while the response goes out.
+                    previews = PreviewStage()
+                    previews.start(recommendations)
 
                     # Send the response first without previews
                     event_json = json.dumps(event, ensure_ascii=False)
@@ -167,38 +180,36 @@ def chat_stream():
                         }
                     )
 
-                    # Generate previews asynchronously and send them separately
-                    if recommendations:
-                        try:
-                            previews = make_recommendation_previews_async(
-                                recommendations
-                            )
-                            if previews:
-                                preview_event = {
-                                    "type": "recommendation_previews",
-                                    "data": {"recommendation_previews": previews},
-                                }
-                                preview_json = json.dumps(
-                                    preview_event, ensure_ascii=False
-                                )
-                                yield f"data: {preview_json}\n\n"
-                                logging_messages.append(
-                                    {
-                                        "role": "recommendation_previews",
-                                        "content": previews,
-                                        "url": endpoint,
-                                        "timestamp": time.time(),
-                                    }
-                                )  # type: ignore
-                        except Exception as e:
-                            print(f"Error generating recommendation previews: {e}")
+                    # One event per preview, as each becomes ready; the log
+                    # keeps them together in one message, as before.
+                    sent: list = []
+                    try:
+                        for preview in previews.ready():
+                            preview_event = {
+                                "type": "recommendation_previews",
+                                "data": {"recommendation_previews": [preview]},
+                            }
+                            preview_json = json.dumps(preview_event, ensure_ascii=False)
+                            yield f"data: {preview_json}\n\n"
+                            sent.append(preview)
+                    except Exception as e:
+                        print(f"Error generating recommendation previews: {e}")
+                    if sent:
+                        logging_messages.append(
+                            {
+                                "role": "recommendation_previews",
+                                "content": sent,
+                                "url": endpoint,
+                                "timestamp": time.time(),
+                            }
+                        )  # type: ignore
 
                 # elif event["type"]=="status":
                 #     event_json = json.dumps(event, ensure_ascii=False)
                 #     print("Status message: ", event_json)
                 # yield f"data: {event_json}\n\n"
 
-            log_queue.put(lambda: log_messages(session_id, logging_messages))
+            log_queue.put((session_id, logging_messages))
 
         except Exception as e:
             print(f"Error in streaming: {e}")
@@ -321,56 +332,226 @@ for route, view_func, *rest in dashboard.routes:
 # --- Proxy Setup ---
 BASE_URL = "https://www.chamaeleon-reisen.de"
 
+# Site responses are kept in memory as long as upstream's Cache-Control /
+# Expires allow, bounded by body bytes (proxy_cache). GETs only.
+PROXY_CACHE_BYTES = int(os.environ.get("PROXY_CACHE_BYTES", 64 * 1024 * 1024))
+_proxy_cache = proxy_cache.ProxyCache(PROXY_CACHE_BYTES)
 
-# --- Proxy Route ---
-@app.route("/", defaults={"path": ""})
-@app.route("/<path:path>", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-@cache
-def proxy(path):
+# Everything else is streamed through one keep-alive pool (proxy_stream).
+_proxy_session = proxy_stream.new_session()
+
+# Concurrent misses for the same page share one upstream fetch (singleflight).
+# A follower waits this long for the leader's body to reach the cache.
+_proxy_flights = singleflight.Group()
+PROXY_FOLLOW_TIMEOUT = 10
+
+# Compressed copies of cached pages, one per coding (proxy_encoding).
+_proxy_variants = proxy_encoding.VariantCache(8 * 1024 * 1024)
+
+# Connect / between-chunks read timeout. A streamed body may take longer in
+# total; only a stalled upstream is cut off.
+PROXY_TIMEOUT = (10, 60)
+
+# A cacheable request asks upstream with the CACHE's validators, not the
+# client's: a 304 meant for the browser would leave nothing to store. The
+# client's own validators are answered from the stored response instead.
+_CONDITIONAL_HEADERS = {
+    "if-none-match",
+    "if-modified-since",
+    "if-match",
+    "if-unmodified-since",
+    "if-range",
+}
+
+_REWRITE_FROM = "https://chamaeleon-webbot-production.up.railway.app"
+
+
+def _proxy_upstream(
+    path: str, coding: str, extra_headers: dict | None = None, conditional=True
+):
     target_url = f"{BASE_URL}/{path}"
     if request.query_string:
         target_url += "?" + request.query_string.decode("utf-8")
 
-    headers = {key: value for key, value in request.headers if key.lower() != "host"}
+    headers = {
+        key: value
+        for key, value in request.headers
+        if key.lower() != "host"
+        and (conditional or key.lower() not in _CONDITIONAL_HEADERS)
+    }
     headers["Host"] = "www.chamaeleon-reisen.de"
+    # Exactly the coding the client gets: asset bytes pass through as sent.
+    headers["Accept-Encoding"] = coding
+    headers.update(extra_headers or {})
+
+    return _proxy_session.request(
+        method=request.method,
+        url=target_url,
+        headers=headers,
+        data=request.get_data(),
+        cookies=request.cookies,
+        allow_redirects=False,
+        stream=True,
+        timeout=PROXY_TIMEOUT,
+    )
 
-    try:
-        resp = requests.request(
-            method=request.method,
-            url=target_url,
-            headers=headers,
-            data=request.get_data(),
-            cookies=request.cookies,
-            allow_redirects=False,
-        )
 
-        excluded_headers = [
-            "content-encoding",
-            "content-length",
-            "transfer-encoding",
-            "connection",
-        ]
-        response_headers = [
-            (name, value)
-            for name, value in resp.raw.headers.items()
-            if name.lower() not in excluded_headers
-        ]
+def _is_rewritten(resp, path: str) -> bool:
+    return "text/html" in resp.headers.get("Content-Type", "") and "." not in path
 
-        content_type = resp.headers.get("Content-Type", "")
 
-        # Only inject if content is HTML
-        if "text/html" in content_type and "." not in path:
-            # Decode content from ISO-8859-1 to Python Unicode string
-            content = resp.content.decode("ISO-8859-1")
+def _proxy_render(resp, path: str):
+    """Status, headers and (streamed) body the proxy serves for an upstream response.
 
-            content = content.replace(
-                "https://chamaeleon-webbot-production.up.railway.app", ""
-            )
+    Rewritten HTML comes back decoded (``identity``); _encoded() compresses it.
+    """
+    # Only inject if content is HTML
+    if _is_rewritten(resp, path):
+        # The site is ISO-8859-1; served as UTF-8 (no headers, like a str body
+        # to Flask's Response), with the webbot URL made relative.
+        chunks = resp.iter_content(chunk_size=proxy_stream.CHUNK_BYTES)
+        body = proxy_stream.replace_stream(chunks, _REWRITE_FROM, "")
+        return resp.status_code, [], body
+
+    # Anything else: upstream's bytes, still in the coding it chose.
+    excluded_headers = [
+        "transfer-encoding",
+        "connection",
+    ]
+    response_headers = [
+        (name, value)
+        for name, value in resp.raw.headers.items()
+        if name.lower() not in excluded_headers
+    ]
+    if not any(
+        n.lower() == "vary" and "accept-encoding" in v.lower()
+        for n, v in response_headers
+    ):
+        response_headers.append(("Vary", "Accept-Encoding"))
+    chunks = resp.raw.stream(proxy_stream.CHUNK_BYTES, decode_content=False)
+    return resp.status_code, response_headers, chunks
+
+
+def _encoded(headers: list, coding: str) -> list:
+    return headers + [("Content-Encoding", coding), ("Vary", "Accept-Encoding")]
+
+
+def _proxy_cached(entry: proxy_cache.CachedResponse, coding: str) -> Response:
+    body, headers = entry["body"], entry["headers"]
+    # Rewritten HTML is the entry without headers (_proxy_render); asset
+    # bytes are already in the client's coding, or upstream chose none.
+    if (
+        not headers
+        and coding != "identity"
+        and len(body) >= proxy_encoding.MIN_BYTES
+    ):
+        body = _proxy_variants.get(body, coding)
+        headers = _encoded(headers, coding)
+    return Response(body, entry["status"], headers).make_conditional(request)
+
+
+def _proxy_miss(path, query, coding, cache_headers, entry, done) -> Response:
+    """Fetch a cacheable GET the cache could not answer (missing or stale).
+
+    ``done()`` — ``done(error=e)`` if upstream failed — is called once the
+    cache holds whatever this fetch could give it: at once if nothing will be
+    stored, after the last byte if the streamed body is being kept.
+    """
+    try:
+        resp = _proxy_upstream(
+            path, coding, _proxy_cache.validators(entry), conditional=False
+        )
+    except Exception as e:
+        done(error=e)
+        raise
+    if resp.status_code == 304 and entry is not None:
+        resp.close()
+        _proxy_cache.refresh(entry, resp.headers)
+        done()
+        return _proxy_cached(entry, coding)
+
+    status, headers, body = _proxy_render(resp, path)
+    rewritten = _is_rewritten(resp, path)
+    kept = _proxy_cache.admits("GET", status, resp.headers, time.time())
+    if kept:
+        body = proxy_stream.tee(
+            body,
+            _proxy_cache.max_entry_bytes,
+            lambda data: (
+                _proxy_cache.store(
+                    "GET", path, query, cache_headers,
+                    status, resp.headers, headers, data,
+                    # Rewritten HTML is stored decoded, one copy for
+                    # every coding; asset bytes are per coding.
+                    encoded=not rewritten,
+                ),
+                done(),
+            ),
+        )
+    else:
+        done()
+    served = headers  # what the cache keeps stays as rendered
+    if rewritten and coding != "identity":
+        body = proxy_encoding.compress_stream(body, coding)
+        served = _encoded(headers, coding)
+    response = Response(body, status, served)
+    response.call_on_close(resp.close)
+    if kept:
+        response.call_on_close(done)  # a body cut short is not stored: release anyway
+    # Streamed: make_conditional must not buffer it to count bytes.
+    response.implicit_sequence_conversion = False
+    return response.make_conditional(request)
+
+
+def _no_flight(error=None):
+    pass
 
-            # Flask's Response will encode the string to UTF-8 by default
-            return Response(content, resp.status_code)
 
-        return Response(resp.content, resp.status_code, response_headers)
+# --- Proxy Route ---
+@app.route("/", defaults={"path": ""})
+@app.route("/<path:path>", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+def proxy(path):
+    query = request.query_string.decode("utf-8")
+    coding = proxy_encoding.negotiate(request.accept_encodings)
+    try:
+        if not proxy_cache.storable_request(request.method, request.headers):
+            resp = _proxy_upstream(path, coding)
+            status, headers, body = _proxy_render(resp, path)
+            if _is_rewritten(resp, path) and coding != "identity":
+                body = proxy_encoding.compress_stream(body, coding)
+                headers = _encoded(headers, coding)
+            response = Response(body, status, headers)
+            # Back to the pool once the client has the body (or went away).
+            response.call_on_close(resp.close)
+            return response
+
+        # Keyed on the negotiated coding, not the raw header: three variants
+        # at most, however many spellings of Accept-Encoding there are.
+        cache_headers = Headers(request.headers)  # outlives the request
+        cache_headers["Accept-Encoding"] = coding
+        entry, fresh = _proxy_cache.lookup("GET", path, query, cache_headers)
+        if fresh:
+            return _proxy_cached(entry, coding)
+
+        # A burst on one page: the first request fetches (and streams to its
+        # client), the others wait until the cache has the page. The leader
+        # streams rather than going through Group.do, so it ends its flight
+        # itself (_proxy_miss ``done``).
+        key = ("GET", path, query, coding)
+        flight, leader = _proxy_flights.begin(key)
+        if leader:
+            done = functools.partial(_proxy_flights.end, key, flight)
+            return _proxy_miss(path, query, coding, cache_headers, entry, done)
+        try:
+            _proxy_flights.wait(flight, PROXY_FOLLOW_TIMEOUT)
+        except singleflight.Timeout:
+            pass  # a slow leader: fetch on our own rather than fail
+        else:
+            entry, fresh = _proxy_cache.lookup("GET", path, query, cache_headers)
+            if fresh:
+                return _proxy_cached(entry, coding)
+        # Not storable (or the leader gave up): nothing to share, fetch alone.
+        return _proxy_miss(path, query, coding, cache_headers, entry, _no_flight)
 
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
@@ -386,18 +567,33 @@ if os.environ.get("PORT") or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
     sitemap_sync.restore_from_db()
     sitemap_sync.start_scheduler()
     travel_index.start_scheduler()
+    visa_store.start_scheduler(agent_base.fetch_visa_markdown, agent_base.visa_labels)
+    # Bindings of sessions that never come back are evicted here, not left
+    # until a resolve that never happens.
+    session_binding.start_sweeper(kunden_auth.sweep, agentur_auth.sweep)
 
     # Boot warm-up in a background thread (boot itself must not block):
     # run the sitemap sync immediately — a fresh deploy should know today's
     # pages, not wait for the 02:00 job — and only THEN build the travel
     # index, so it derives against the just-synced sitemap instead of racing
     # it. Both steps fail open; the daily schedulers repeat them anyway.
+    # The Hop-2 batch probe goes first: it is one short call, and until it
+    # answers booking details simply take the per-vorgang fan-out.
+    # The visa pages go last: the persisted copies are loaded at once, and
+    # only countries without a day-fresh copy are fetched again.
     def _startup_warm():
+        hop2_batch.probe()
+        visa_store.load()
         try:
             sitemap_sync.sync()
         except Exception as e:
             print(f"[app] startup sitemap sync failed: {e}")
         travel_index.rebuild()
+        visa_store.refresh(
+            agent_base.fetch_visa_markdown,
+            agent_base.visa_labels,
+            max_age=visa_store.MAX_AGE_SECONDS,
+        )
 
     threading.Thread(target=_startup_warm, name="startup-warm", daemon=True).start()
 
@@ -0,0 +1,249 @@
+"""In-memory index of chat sessions for db_logging, with bounded history cache.
+
+db_logging needs two things per chat session: the ``chats`` row id (so a later
+turn updates the same row instead of inserting a duplicate) and, in rewrite
+mode, the history so far. Both used to live in an ``OrderedDict`` that was
+re-sorted by pop+insert on every turn and scanned on every call, and the
+histories had no limit but the 12h window — a spike of long chats sat in memory
+for half a day.
+
+    SessionStore
+      ├─ sessions          sid -> Session (metadata, optional cached history)
+      ├─ expiry heap       (created_at + session_ttl, sid)   → drop the session
+      ├─ history heap      (last_active + history_ttl, sid)  → drop its history
+      └─ LRU               sid -> encoded size of its history; over the byte
+                           budget the least recently used history is dropped
+                           back to "fetch on demand"
+
+Both heaps are lazy: touching a session pushes a new history entry instead of
+re-ordering anything, and stale entries are skipped when they surface. When a
+heap holds far more stale entries than live ones it is rebuilt, so it cannot
+grow without bound under a single very chatty session.
+
+Cached histories are kept ENCODED (:func:`pack_history`): msgpack + zlib, with
+each message's ``url`` moved into a per-history table. A history is only read
+when the session's next turn merges into it, so paying a decode then is cheap
+next to holding thousands of small dicts, repeated URL strings and
+``recommendation_previews`` payloads for 12h. Decoded URLs are interned, so the
+one history that is live at a time shares them with every other decode.
+
+Only rewrite mode caches histories. With ``CHAT_LOG_MODE=append`` (the default)
+db_logging stores none (db_logging._caches_histories), so the history heap,
+the byte budget and :func:`pack_history` sit idle and a session is just its
+row id and timestamps. They come into play with ``CHAT_LOG_MODE=rewrite``, or
+once the ``append_chat_messages`` RPC turns out to be missing and db_logging
+falls back to rewriting.
+
+Dropping a history never loses data — the full history is in ``chats``; the
+next rewrite-mode write fetches it (db_logging._fetch_chat_history). Dropping a
+SESSION forgets its row id, which is what the 7-day horizon is for.
+
+Not thread-safe on its own: db_logging touches it only from the log writer.
+"""
+
+import heapq
+import json
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from typing import NotRequired, TypedDict
+
+try:
+    import ormsgpack
+except ImportError:  # pinned via langgraph in _requirements.txt; JSON otherwise
+    ormsgpack = None
+
+
+class Session(TypedDict):
+    db_id: str
+    history: NotRequired[bytes]  # pack_history(); read through SessionStore.history
+    created_at: float
+    last_active: float
+
+
+# Preset zlib dictionary: strings every history repeats. Short histories (one
+# or two turns, most sessions) compress far better with it than without.
+_ZDICT = (
+    b"recommendation_previews"
+    b"https://www.chamaeleon-reisen.de/"
+    b"assistant"
+    b"timestamp"
+    b"content"
+    b"role"
+    b"user"
+    b"url"
+)
+
+
+def _dumps(obj) -> bytes:
+    if ormsgpack is not None:
+        return b"m" + ormsgpack.packb(obj)
+    return b"j" + json.dumps(obj, ensure_ascii=False, default=str).encode()
+
+
+def _loads(raw: bytes):
+    if raw[:1] == b"m":
+        return ormsgpack.unpackb(raw[1:])
+    return json.loads(raw[1:])
+
+
+def pack_history(history: list) -> bytes:
+    """Compact encoding of a history: URL table + messages, serialised, deflated."""
+    urls: dict[str, int] = {}
+    messages = []
+    for message in history:
+        url = message.get("url") if isinstance(message, dict) else None
+        if isinstance(url, str):
+            message = {**message, "url": urls.setdefault(url, len(urls))}
+        messages.append(message)
+    compressor = zlib.compressobj(6, zdict=_ZDICT)
+    return compressor.compress(_dumps([list(urls), messages])) + compressor.flush()
+
+
+def unpack_history(blob: bytes) -> list:
+    """Inverse of :func:`pack_history`; URL strings come back interned."""
+    decompressor = zlib.decompressobj(zdict=_ZDICT)
+    urls, messages = _loads(decompressor.decompress(blob) + decompressor.flush())
+    urls = [sys.intern(u) for u in urls]
+    for message in messages:
+        if isinstance(message, dict) and isinstance(message.get("url"), int):
+            message["url"] = urls[message["url"]]
+    return messages
+
+
+class SessionStore:
+    def __init__(self, session_ttl: float, history_ttl: float, history_budget: int):
+        self.session_ttl = session_ttl
+        self.history_ttl = history_ttl
+        self.history_budget = history_budget
+        self.sessions: dict[str, Session] = {}
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._history_heap: list[tuple[float, str]] = []
+        self._lru: OrderedDict[str, int] = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "history_expired": 0,
+            "sessions_expired": 0,
+            "bytes": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def get(self, session_id: str) -> Session | None:
+        return self.sessions.get(session_id)
+
+    # --- writes -------------------------------------------------------------
+
+    def add(
+        self,
+        session_id: str,
+        db_id: str,
+        created_at: float,
+        last_active: float,
+        history: list | None = None,
+    ) -> None:
+        self.discard(session_id)
+        self.sessions[session_id] = {
+            "db_id": db_id,
+            "created_at": created_at,
+            "last_active": last_active,
+        }
+        heapq.heappush(self._expiry_heap, (created_at + self.session_ttl, session_id))
+        heapq.heappush(self._history_heap, (last_active + self.history_ttl, session_id))
+        if history is not None:
+            self.set_history(session_id, history)
+
+    def touch(self, session_id: str, now: float | None = None) -> None:
+        session = self.sessions[session_id]
+        session["last_active"] = now if now is not None else time.time()
+        heapq.heappush(
+            self._history_heap, (session["last_active"] + self.history_ttl, session_id)
+        )
+        self._compact()
+
+    def discard(self, session_id: str) -> None:
+        """Forget the session (its heap entries go stale and are skipped)."""
+        self.drop_history(session_id)
+        self.sessions.pop(session_id, None)
+
+    # --- histories ----------------------------------------------------------
+
+    def history(self, session_id: str) -> list | None:
+        """The cached history, decoded, or None (→ fetch on demand). Counts hit/miss."""
+        session = self.sessions.get(session_id)
+        if session is None or "history" not in session:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self._lru.move_to_end(session_id)
+        return unpack_history(session["history"])
+
+    def set_history(self, session_id: str, history: list) -> None:
+        """Cache ``history`` encoded (replacing any previous one), then enforce the budget."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        self.drop_history(session_id)
+        blob = pack_history(history)
+        session["history"] = blob
+        self._lru[session_id] = len(blob)
+        self.stats["bytes"] += len(blob)
+        self._enforce_budget(keep=session_id)
+
+    def extend_history(self, session_id: str, messages: list) -> None:
+        """Append to a cached history (decode, merge, re-encode)."""
+        session = self.sessions.get(session_id)
+        if session is None or "history" not in session:
+            return
+        self.set_history(session_id, unpack_history(session["history"]) + messages)
+
+    def drop_history(self, session_id: str) -> bool:
+        session = self.sessions.get(session_id)
+        if session is None or session.pop("history", None) is None:
+            return False
+        self.stats["bytes"] -= self._lru.pop(session_id, 0)
+        return True
+
+    def _enforce_budget(self, keep: str) -> None:
+        # The history just written is kept even if it alone exceeds the budget:
+        # it is about to be used, and evicting it would only force a refetch.
+        while self.stats["bytes"] > self.history_budget and len(self._lru) > 1:
+            victim = next(iter(self._lru))
+            if victim == keep:
+                self._lru.move_to_end(victim)
+                victim = next(iter(self._lru))
+            self.drop_history(victim)
+            self.stats["evictions"] += 1
+
+    # --- expiry -------------------------------------------------------------
+
+    def prune(self, now: float | None = None) -> None:
+        """Apply both horizons. Cost is proportional to what actually expired."""
+        now = time.time() if now is None else now
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            deadline, session_id = heapq.heappop(self._expiry_heap)
+            session = self.sessions.get(session_id)
+            if session and session["created_at"] + self.session_ttl == deadline:
+                self.discard(session_id)
+                self.stats["sessions_expired"] += 1
+        while self._history_heap and self._history_heap[0][0] <= now:
+            deadline, session_id = heapq.heappop(self._history_heap)
+            session = self.sessions.get(session_id)
+            if session and session["last_active"] + self.history_ttl == deadline:
+                if self.drop_history(session_id):
+                    self.stats["history_expired"] += 1
+
+    def _compact(self) -> None:
+        if len(self._history_heap) > 4 * len(self.sessions) + 64:
+            self._history_heap = [
+                (s["last_active"] + self.history_ttl, sid)
+                for sid, s in self.sessions.items()
+            ]
+            heapq.heapify(self._history_heap)
@@ -0,0 +1,245 @@
+"""Local append-only spool for chat log turns (SQLite, stdlib only).
+
+The log writer (db_logging._log_worker) used to hold turns only in memory: a
+Supabase outage longer than LOG_MAX_ATTEMPTS backoffs, a full queue, or a
+redeploy mid-outage meant the turn was gone. Now every turn lands here FIRST,
+in the writer thread (never in the request), and is deleted only after its
+Supabase write succeeded:
+
+    log_queue ──► _log_worker ──► spool.add()  (local disk, one transaction)
+                      │
+                      └─► log_messages() ok ──► spool.ack(ids)
+                          fails            ──► stays spooled; the writer keeps
+                                               retrying, and a restart replays it
+    log_queue full ──► spool.add() from the producer, picked up by the writer
+
+A turn Supabase can never take (a permanent error, or LOG_SPOOL_MAX_ATTEMPTS
+retries) is moved to ``dead_turns`` with its last error, not retried forever:
+it stays in the file for inspection, and stops holding up the later turns of
+its session.
+
+Each turn carries an idempotency key, ``session_id:<timestamp of its newest
+message>``. The spool refuses a second copy of a key, and any turn that is
+retried or replayed is first looked up in ``chats`` by that timestamp
+(db_logging ``_already_logged``): a write that reached Supabase before its
+answer was lost — or before the process died — is not appended twice.
+
+WAL + synchronous=NORMAL: a commit survives a process crash (what a redeploy
+is), only a power loss can cost the last few.
+
+Not a queue between processes: every process writes its OWN file,
+``<CHAT_LOG_SPOOL>.<host>-<pid>`` (:func:`open_process_spool`), and holds a
+lock on it for as long as it lives. A file whose lock nobody holds belongs to a
+process that is gone; the next process to start adopts its turns into its own
+file and deletes it. So with several gunicorn workers no two of them ever
+replay the same turn, and a restart still loses nothing.
+"""
+
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+
+def turn_time(messages: list) -> float | None:
+    """Timestamp of the turn's newest message, ``None`` if none carries one."""
+    stamps = [m.get("timestamp") for m in messages if isinstance(m, dict)]
+    stamps = [t for t in stamps if isinstance(t, (int, float))]
+    return max(stamps) if stamps else None
+
+
+def turn_key(session_id: str, messages: list) -> str:
+    """Idempotency key of a turn: the session plus its newest message time.
+
+    Producers stamp every message with ``time.time()``; a turn without any
+    stamp falls back to a content hash so two of them cannot collide.
+    """
+    ts = turn_time(messages)
+    if ts is None:
+        body = json.dumps(messages, sort_keys=True, default=str).encode()
+        return f"{session_id}:#{hashlib.sha1(body).hexdigest()}"
+    return f"{session_id}:{ts!r}"
+
+
+class ChatSpool:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._owner = None  # lock file held by open_process_spool
+        # Written by the log writer, and by producers only when the queue is
+        # full; the lock serialises both on the one connection.
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL UNIQUE,"
+            " session_id TEXT NOT NULL,"
+            " messages TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_turns ("
+            " id INTEGER PRIMARY KEY,"
+            " key TEXT NOT NULL,"
+            " session_id TEXT NOT NULL,"
+            " messages TEXT NOT NULL,"
+            " error TEXT NOT NULL,"
+            " dead_at REAL NOT NULL)"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _absorb(self, path: str) -> int:
+        """Copy another spool file's turns (and dead turns) into this one."""
+        ChatSpool(path).close()  # older files: create any table they lack
+        with self._lock:
+            self._db.execute("ATTACH DATABASE ? AS orphan", (path,))
+            try:
+                self._db.execute("BEGIN")
+                try:
+                    moved = self._db.execute(
+                        "INSERT OR IGNORE INTO turns (key, session_id, messages)"
+                        " SELECT key, session_id, messages FROM orphan.turns ORDER BY id"
+                    ).rowcount
+                    self._db.execute(
+                        "INSERT INTO dead_turns (key, session_id, messages, error, dead_at)"
+                        " SELECT key, session_id, messages, error, dead_at"
+                        " FROM orphan.dead_turns"
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+            finally:
+                self._db.execute("DETACH DATABASE orphan")
+        return moved
+
+    def add(self, turns: list[tuple[str, list]]) -> list[int | None]:
+        """Spool ``turns`` in one transaction; their ids, ``None`` for a duplicate."""
+        ids: list[int | None] = []
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for session_id, messages in turns:
+                    cur = self._db.execute(
+                        "INSERT OR IGNORE INTO turns (key, session_id, messages)"
+                        " VALUES (?, ?, ?)",
+                        (
+                            turn_key(session_id, messages),
+                            session_id,
+                            json.dumps(messages, ensure_ascii=False, default=str),
+                        ),
+                    )
+                    ids.append(cur.lastrowid if cur.rowcount else None)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return ids
+
+    def ack(self, ids: list[int]) -> None:
+        """Forget turns that reached Supabase."""
+        if not ids:
+            return
+        with self._lock:
+            self._db.executemany("DELETE FROM turns WHERE id = ?", [(i,) for i in ids])
+
+    def bury(self, ids: list[int], error: str) -> None:
+        """Move turns Supabase will not take to ``dead_turns``, in one transaction."""
+        if not ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for i in ids:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO dead_turns"
+                        " SELECT id, key, session_id, messages, ?, ?"
+                        " FROM turns WHERE id = ?",
+                        (error, now, i),
+                    )
+                    self._db.execute("DELETE FROM turns WHERE id = ?", (i,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def dead(self) -> int:
+        """How many turns are in ``dead_turns``."""
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM dead_turns").fetchone()[0]
+
+    def pending(self, exclude: set[int] = frozenset()) -> list[tuple[int, str, list]]:
+        """Every spooled turn, oldest first, except ids already in flight."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, session_id, messages FROM turns ORDER BY id"
+            ).fetchall()
+        return [(i, sid, json.loads(m)) for i, sid, m in rows if i not in exclude]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM turns").fetchone()[0]
+
+
+def _remove(path: str) -> None:
+    for suffix in ("", "-wal", "-shm", ".lock"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _orphans(base: str, own: str) -> list[str]:
+    """Spool files next to ``base`` whose owner has exited (their lock is free).
+
+    Returns them LOCKED; the caller removes them. ``base`` itself is the file
+    of the single-spool layout, adopted like any other.
+    """
+    found = []
+    for path in [base] + sorted(glob.glob(glob.escape(base) + ".*")):
+        if path == own or path.endswith(("-wal", "-shm", ".lock")) or not os.path.exists(path):
+            continue
+        lock = open(path + ".lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()  # a live process owns it
+            continue
+        found.append((path, lock))
+    return found
+
+
+def open_process_spool(base: str) -> ChatSpool:
+    """This process's own spool next to ``base``, with orphaned spools adopted.
+
+    Taking our own lock and adopting run under one lock file
+    (``<base>.adopt.lock``), so two workers starting together cannot both
+    adopt the same orphan, nor adopt the file of a worker still starting.
+    """
+    own = f"{base}.{socket.gethostname()}-{os.getpid()}"
+    with open(base + ".adopt.lock", "a") as gate:
+        fcntl.flock(gate, fcntl.LOCK_EX)
+        owner = open(own + ".lock", "a")
+        fcntl.flock(owner, fcntl.LOCK_EX)  # held until the process exits
+        spool = ChatSpool(own)
+        spool._owner = owner
+        for path, lock in _orphans(base, own):
+            try:
+                moved = spool._absorb(path)
+                _remove(path)
+                print(f"[chat_spool] adopted {moved} turn(s) from {path}")
+            except Exception as e:
+                print(f"[chat_spool] could not adopt {path}: {e}")
+            finally:
+                lock.close()
+    return spool
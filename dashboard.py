@@ -1,7 +1,8 @@
 """
 Following idea:
-- On startup, load all chats from the DB and analyze them, storing results in an in-memory cache grouped by month.
+- On startup, load the hourly rollups (db_logging.ROLLUP_TABLE, kept up to date by the log writer) and aggregate them, storing results in an in-memory cache grouped by month. The chats themselves are only read for a month's chat list.
 - When the dashboard requests data for a month, serve from cache if available and not expired;
+- A month's chats are never cached: their summaries are streamed page by page (/api/dashboard/<month>/chats), a transcript is fetched on its own (/api/dashboard/chat/<row_id>).
 
 Only current month can expire, past months are static once loaded. When current month expires, only re-fetch current month to update it, not everything.
 
@@ -10,19 +11,35 @@ When current month changes, fetch old current month to finalize it, and start tr
 All datetimes in local timezone, i.e. German local time.
 """
 
+import gzip
 import hmac
+import json
 import os
 import time
+import uuid
 import travel_index
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 from zoneinfo import ZoneInfo
 from types import NoneType
 from dateutil.parser import isoparse
-from typing import Any, Literal, NotRequired, Optional, TypedDict
-
-from flask import request, jsonify, send_from_directory
-
+from typing import Any, Iterator, Literal, NotRequired, TypedDict
+
+from flask import (
+    Response,
+    current_app,
+    jsonify,
+    request,
+    send_from_directory,
+    stream_with_context,
+)
+
+try:
+    import numpy as np
+except ImportError:  # in _requirements.txt (the image), not requirements.txt
+    np = None
+
+import db_logging
 from db_logging import ChatHistory, Message, _message_bounds, supabase, DEBUG
 
 DAY_NAME = [
@@ -83,6 +100,12 @@ class ChatRow(TypedDict):
 type AnyChatRow = OldChatRow | ChatRow
 
 
+class RollupRow(TypedDict):
+    bucket: str  # hour start, ISO-8601 (UTC) — see db_logging.ROLLUP_TABLE
+    chats: int
+    user_messages: int
+
+
 # ──────────────────────────────────────────
 # Dashboard API payload
 # ──────────────────────────────────────────
@@ -103,14 +126,19 @@ type Weekday = int  # 0–6, where 0=Monday, 6=Sunday
 #     timestamp: NotRequired[str]
 
 
-class ChatDetail(TypedDict):
-    id: str | None
+class ChatSummary(TypedDict):
+    id: str | None  # session_id for new chats, the row id for old ones
+    row_id: str  # `chats.id`, for /api/dashboard/chat/<row_id>
     chat_timestamp: str | None
     # ISO strings for JSON serialization
     started_at: NotRequired[str]
     ended_at: NotRequired[str]
     duration_seconds: NotRequired[float]
     user_message_count: int
+    message_count: int
+
+
+class ChatDetail(ChatSummary):
     messages: list[AnyMessage]
 
 
@@ -146,7 +174,6 @@ class MonthDetail(TypedDict):
     daily_counts: list[DailyCount]
     hourly_counts: list[HourlyCount]
     weekday_counts: list[WeekdayCount]
-    chats: Optional[list[ChatDetail]]
 
 
 class DashboardPayload(TypedDict):
@@ -215,6 +242,14 @@ class MonthCache:
         self.total_user_messages = 0
         self.hourly_counts = [0] * 24
         self.weekday_counts = [0] * 7
+        # False while the rollup table is missing: counts come from `chats`.
+        self.from_rollups = True
+        # Bumped whenever a month's numbers actually change (not on every
+        # refresh): the dashboard's HTTP validators are derived from these.
+        self.generation = 0
+        self.modified_at = time.time()
+        self.month_generation: dict[MonthKey, int] = {}
+        self.month_modified_at: dict[MonthKey, float] = {}
 
     @property
     def avg_user_messages_per_chat(self) -> float:
@@ -228,27 +263,26 @@ class MonthCache:
         return now - self.last_fetched_current_month > self.EXPIRY_SECONDS
 
     def load_all(self):
-        # fetch everything
-        # TODO: long term: stream this if it gets too big, or do it in batches by month
-        rows: list[AnyChatRow] = supabase.table("chats").select("*").execute().data  # type: ignore
+        rollups = fetch_rollups() if backfill_rollups() else None
+        if rollups is None:
+            # No rollup table (yet), or its history is not backfilled: the old
+            # way, every chat ever logged (counted page by page).
+            self.from_rollups = False
+            rollups = [row for page, _ in count_chats() for row in page]
 
         if DEBUG:
-            print(
-                f"Fetched {len(rows)} chat rows from Supabase for cache initialization"
-            )
+            print(f"Fetched {len(rollups)} rollup rows for cache initialization")
 
         # setup month grouping
         month_rows: dict[
             MonthKey,
-            list[AnyChatRow],
+            list[RollupRow],
         ] = {}
 
         # group rows by month
-        for row in rows:
-            timestamp = isoparse(row["timestamp"])
-            _month_key = month_key(timestamp)
-
-            month_rows.setdefault(_month_key, []).append(row)
+        for row in rollups:
+            # Buckets are UTC ISO strings: the month is their prefix.
+            month_rows.setdefault(row["bucket"][:7], []).append(row)
 
         # setup counting
         self.total_chats = 0
@@ -270,7 +304,7 @@ class MonthCache:
         self.last_fetched_current_month = time.time()
 
     def compute_month(
-        self, rows: list[AnyChatRow], _month_key: MonthKey
+        self, rows: list[RollupRow], _month_key: MonthKey
     ) -> tuple[int, int, dict[Hour, int], dict[Day, int], dict[Weekday, int]]:
         (
             total_count,
@@ -278,25 +312,9 @@ class MonthCache:
             hourly_count,
             daily_count,
             weekday_count,
-        ) = (0, 0, {h: 0 for h in range(24)}, {}, {wd: 0 for wd in range(7)})
-
-        for row in rows:
-            timestamp = isoparse(row["timestamp"])
-            day, hour, weekday = timestamp.day, timestamp.hour, timestamp.weekday()
-            total_count += 1
-            try:
-                user_message_count += sum(1 for m in row["messages"] if is_user(m))
-            except (KeyError, TypeError):
-                print(row["messages"])
-                continue
-            hourly_count[hour] += 1
-            daily_count[day] = daily_count.get(day, 0) + 1
-            weekday_count[weekday] += 1
+        ) = month_histograms(rows)
 
-        for day in range(1, max(daily_count.keys(), default=0) + 1):
-            daily_count.setdefault(day, 0)
-
-        self._cache[_month_key] = {
+        entry: MonthDetail = {
             "month": _month_key,
             "label": f"{GERMAN_MONTHS[int(_month_key[5:7])]} {_month_key[:4]}",
             "total_chats": total_count,
@@ -315,8 +333,13 @@ class MonthCache:
                 build_weekday_count(weekday, count)
                 for weekday, count in sorted(weekday_count.items())
             ],
-            "chats": None,
         }
+        if self._cache.get(_month_key) != entry:
+            self.generation += 1
+            self.modified_at = time.time()
+            self.month_generation[_month_key] = self.generation
+            self.month_modified_at[_month_key] = self.modified_at
+        self._cache[_month_key] = entry
 
         return (
             total_count,
@@ -326,16 +349,30 @@ class MonthCache:
             weekday_count,
         )
 
-    def update_current_month(
-        self, include_chats: bool = False
-    ) -> None | list[ChatDetail]:
+    def update_current_month(self) -> None:
         """
         If you call this, first check if it is actually expired.
+
+        Counts come from the current month's rollups (a few hundred rows at
+        most), never from the chats.
         """
         if self.current_month not in self._cache:
             return self.add_month(self.current_month)
         cache_entry = self._cache[self.current_month]
         now = time.time()
+
+        # re-fetch current month data from DB
+        rollups = None
+        if self.from_rollups:
+            # Bounded above too: on a rollover this re-counts the month that
+            # just ended, and the new month's buckets must not land in it.
+            rollups = fetch_rollups(
+                since=month_start_utc(self.current_month),
+                until=next_month_start_utc(self.current_month),
+            )
+        if rollups is None:
+            rollups = rollups_from_chats(fetch_month_chats(self.current_month))
+
         # subtract old current month counts from totals before re-fetching
         self.total_chats -= cache_entry["total_chats"]
         self.total_user_messages -= round(
@@ -346,8 +383,6 @@ class MonthCache:
         for weekday, count in enumerate(cache_entry["weekday_counts"]):
             self.weekday_counts[weekday] -= count["count"]
 
-        # re-fetch current month data from DB
-        rows = fetch_month_chats(self.current_month)
         # analyze and update cache for current month
         (
             total_count,
@@ -355,9 +390,7 @@ class MonthCache:
             hourly_count,
             _,
             weekday_count,
-        ) = self.compute_month(rows, self.current_month)
-        if include_chats:
-            chats = self._cache[self.current_month]["chats"] = analyse_chats(rows)
+        ) = self.compute_month(rollups, self.current_month)
 
         # update total counts and averages
         self.total_chats += total_count
@@ -369,9 +402,6 @@ class MonthCache:
 
         self.last_fetched_current_month = now
 
-        if include_chats:
-            return chats
-
     def current_month_rollover(self):
         """
         Checks if current month has changed, and if so, finalizes old month and starts tracking new month.
@@ -381,7 +411,7 @@ class MonthCache:
             return
 
         # finalize old month
-        self.update_current_month(include_chats=False)
+        self.update_current_month()
         # start tracking new month
         self.add_month(new_current_month)
 
@@ -397,10 +427,9 @@ class MonthCache:
                 "daily_counts": [],
                 "hourly_counts": [],
                 "weekday_counts": [],
-                "chats": None,
             },
         )
-        return self.update_current_month(include_chats=False)
+        return self.update_current_month()
 
     @staticmethod
     def current_month_start() -> datetime:
@@ -408,54 +437,379 @@ class MonthCache:
         return datetime(now.year, now.month, 1)
 
 
-def fetch_month_chats(month_key: MonthKey) -> list[AnyChatRow]:
+_CHAT_PAGE_SIZE = 200  # rows per read; a page of transcripts is all that is held
+
+
+def iter_month_chats(
+    month_key: MonthKey, columns: str = "*"
+) -> Iterator[list[AnyChatRow]]:
+    """A month's chat rows, newest first, one ``range()`` page at a time."""
     month_start = datetime.strptime(month_key + "-01", "%Y-%m-%d").replace(tzinfo=tz)
     next_month_start = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
-    rows: list[AnyChatRow] = (
-        supabase.table("chats")
-        .select("*")
-        .gte("timestamp", month_start.isoformat())
-        .lt("timestamp", next_month_start.isoformat())
-        .order("timestamp", desc=True)
-        .execute()
-        .data  # type: ignore
+    start = 0
+    while True:
+        page: list[AnyChatRow] = (
+            supabase.table("chats")
+            .select(columns)
+            .gte("timestamp", month_start.isoformat())
+            .lt("timestamp", next_month_start.isoformat())
+            .order("timestamp", desc=True)
+            .range(start, start + _CHAT_PAGE_SIZE - 1)
+            .execute()
+            .data  # type: ignore
+        )
+        if page:
+            yield page
+        if len(page) < _CHAT_PAGE_SIZE:
+            return
+        start += _CHAT_PAGE_SIZE
+
+
+def fetch_month_chats(month_key: MonthKey) -> list[AnyChatRow]:
+    """Timestamps and messages of a whole month (counting without rollups only)."""
+    return [
+        row
+        for page in iter_month_chats(month_key, "timestamp, messages")
+        for row in page
+    ]
+
+
+def month_start_utc(month_key: MonthKey) -> datetime:
+    return datetime.strptime(month_key + "-01", "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def next_month_start_utc(month_key: MonthKey) -> datetime:
+    return (month_start_utc(month_key).replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+_ROLLUP_PAGE_SIZE = 1000  # PostgREST's default max-rows; paged so none are cut off
+
+
+def fetch_rollups(
+    since: datetime | None = None, until: datetime | None = None
+) -> list[RollupRow] | None:
+    """All rollup rows in ``[since, until)``, oldest first. None = no rollup table."""
+    rows: list[RollupRow] = []
+    try:
+        while True:
+            query = supabase.table(db_logging.ROLLUP_TABLE).select(
+                "bucket, chats, user_messages"
+            )
+            if since is not None:
+                query = query.gte("bucket", since.isoformat())
+            if until is not None:
+                query = query.lt("bucket", until.isoformat())
+            page = (
+                query.order("bucket", desc=False)
+                .range(len(rows), len(rows) + _ROLLUP_PAGE_SIZE - 1)
+                .execute()
+                .data
+            )
+            rows.extend(page)  # type: ignore
+            if len(page) < _ROLLUP_PAGE_SIZE:
+                return rows
+    except Exception as e:
+        print(f"[dashboard] rollups unavailable, counting from chats: {e}")
+        return None
+
+
+# ──────────────────────────────────────────
+# Aggregation
+#
+# Two implementations of the same two functions: NumPy (timestamps parsed in
+# bulk into integer hours since the epoch, histograms by bincount) and the
+# row-by-row original, used when NumPy is missing and as the reference in the
+# tests. rollups_from_chats runs over a page of chats at a time on a backfill
+# or without the rollup table; month_histograms over a month of buckets.
+# ──────────────────────────────────────────
+
+type MonthHistograms = tuple[
+    int, int, dict[Hour, int], dict[Day, int], dict[Weekday, int]
+]
+
+
+def _user_message_counts(rows: list[AnyChatRow]) -> list[int]:
+    counts = []
+    for row in rows:
+        try:
+            counts.append(sum(1 for m in row["messages"] if is_user(m)))
+        except (KeyError, TypeError):
+            print(row["messages"])
+            counts.append(0)
+    return counts
+
+
+def _utc_hours(timestamps: list[str]):
+    """Hours since the epoch (int64 array) for ISO timestamps, parsed in bulk.
+
+    NumPy's datetime64 takes no UTC offset, so a trailing ``+00:00``/``Z`` (what
+    PostgREST sends for timestamptz) is cut first. Anything else is parsed row
+    by row, which is also the answer to a string NumPy refuses.
+    """
+    plain = [
+        t[:-6] if t.endswith("+00:00") else t[:-1] if t.endswith("Z") else None
+        for t in timestamps
+    ]
+    if None not in plain:
+        try:
+            parsed = np.array(plain, dtype="datetime64[us]")
+            return parsed.astype("datetime64[h]").astype(np.int64)
+        except ValueError:
+            pass
+    return np.array(
+        [int(isoparse(t).timestamp() // 3600) for t in timestamps], dtype=np.int64
+    )
+
+
+def _rollups_from_chats_np(rows: list[AnyChatRow]) -> list[RollupRow]:
+    if not rows:
+        return []
+    hours = _utc_hours([row["timestamp"] for row in rows])
+    users = np.array(_user_message_counts(rows), dtype=np.int64)
+    buckets, index = np.unique(hours, return_inverse=True)
+    chats = np.bincount(index, minlength=len(buckets))
+    user_messages = np.bincount(index, weights=users, minlength=len(buckets))
+    labels = np.datetime_as_string(buckets.astype("datetime64[h]"), unit="s")
+    return [
+        {"bucket": f"{label}+00:00", "chats": int(c), "user_messages": int(u)}
+        for label, c, u in zip(labels.tolist(), chats.tolist(), user_messages.tolist())
+    ]
+
+
+def _rollups_from_chats_py(rows: list[AnyChatRow]) -> list[RollupRow]:
+    buckets: dict[str, RollupRow] = {}
+    for row, users in zip(rows, _user_message_counts(rows)):
+        timestamp = isoparse(row["timestamp"]).astimezone(timezone.utc)
+        key = timestamp.replace(minute=0, second=0, microsecond=0).isoformat()
+        bucket = buckets.setdefault(key, {"bucket": key, "chats": 0, "user_messages": 0})
+        bucket["chats"] += 1
+        bucket["user_messages"] += users
+    return sorted(buckets.values(), key=lambda r: r["bucket"])
+
+
+def rollups_from_chats(rows: list[AnyChatRow]) -> list[RollupRow]:
+    """Hourly rollup rows computed from chat rows (backfill, and the fallback)."""
+    if np is not None:
+        return _rollups_from_chats_np(rows)
+    return _rollups_from_chats_py(rows)
+
+
+def _month_histograms_np(rows: list[RollupRow]) -> MonthHistograms:
+    hours = _utc_hours([row["bucket"] for row in rows])
+    chats = np.array([row["chats"] for row in rows], dtype=np.int64)
+    users = sum(row["user_messages"] for row in rows)
+    dates = hours.astype("datetime64[h]").astype("datetime64[D]")
+    day = (dates - dates.astype("datetime64[M]")).astype(np.int64) + 1
+    # 1970-01-01 was a Thursday (3 with Monday = 0).
+    weekday = (dates.astype(np.int64) + 3) % 7
+    hourly = np.bincount(hours % 24, weights=chats, minlength=24).astype(np.int64)
+    weekdays = np.bincount(weekday, weights=chats, minlength=7).astype(np.int64)
+    daily = np.bincount(day, weights=chats, minlength=32).astype(np.int64)
+    last_day = int(day[chats > 0].max()) if (chats > 0).any() else 0
+    return (
+        int(chats.sum()),
+        int(users),
+        dict(enumerate(hourly.tolist())),
+        {d: int(daily[d]) for d in range(1, last_day + 1)},
+        dict(enumerate(weekdays.tolist())),
     )
-    return rows
 
 
-def analyse_chats(rows: list[AnyChatRow]) -> list[ChatDetail]:
-    details: list[ChatDetail] = []
+def _month_histograms_py(rows: list[RollupRow]) -> MonthHistograms:
+    (
+        total_count,
+        user_message_count,
+        hourly_count,
+        daily_count,
+        weekday_count,
+    ) = (0, 0, {h: 0 for h in range(24)}, {}, {wd: 0 for wd in range(7)})
+
     for row in rows:
-        # read values from row
-        db_id = row["id"]
-        messages = row["messages"]
-        if not messages:
-            continue
-        timestamp = row["timestamp"]
-        session_id = row["session_id"]
-        # number of user messages
-        user_message_count = sum(1 for m in messages if is_user(m))
-        detail: ChatDetail = {
-            "id": db_id,
-            "chat_timestamp": timestamp,
-            "user_message_count": user_message_count,
-            "messages": messages,  # type: ignore
-            # "html": False,
-        }
-        details.append(detail)
-        if session_id is None:
+        timestamp = isoparse(row["bucket"])
+        day, hour, weekday = timestamp.day, timestamp.hour, timestamp.weekday()
+        chats = row["chats"]
+        total_count += chats
+        user_message_count += row["user_messages"]
+        if not chats:
             continue
-        # Only new chats after here
-        _row: ChatRow = row  # type: ignore
-        messages = _row["messages"]
-        detail["id"] = session_id
-        # detail["html"] = True
-        start_ts, end_ts = _message_bounds(messages)
-        detail["started_at"] = datetime.fromtimestamp(start_ts).isoformat()
-        detail["ended_at"] = datetime.fromtimestamp(end_ts).isoformat()
-        detail["duration_seconds"] = end_ts - start_ts
+        hourly_count[hour] += chats
+        daily_count[day] = daily_count.get(day, 0) + chats
+        weekday_count[weekday] += chats
+
+    for day in range(1, max(daily_count.keys(), default=0) + 1):
+        daily_count.setdefault(day, 0)
+    return total_count, user_message_count, hourly_count, daily_count, weekday_count
+
+
+def month_histograms(rows: list[RollupRow]) -> MonthHistograms:
+    """Totals and hourly/daily/weekday chat histograms of one month's buckets."""
+    if np is not None and rows:
+        return _month_histograms_np(rows)
+    return _month_histograms_py(rows)
+
+
+def count_chats(
+    since: str | None = None, until: str | None = None
+) -> Iterator[tuple[list[RollupRow], str | None]]:
+    """Rollup rows of the chats started in ``[since, until)``, page by page.
+
+    Only one page of chats is held. Each yield is a list of complete hours
+    plus where the count has got to (everything before it is yielded): the
+    last hour of a page may go on in the next one, so it is held back until
+    it is complete.
+    """
+    offset = 0
+    held: RollupRow | None = None
+    while True:
+        query = supabase.table("chats").select("timestamp, messages")
+        if since is not None:
+            query = query.gte("timestamp", since)
+        if until is not None:
+            query = query.lt("timestamp", until)
+        page: list[AnyChatRow] = (
+            query.order("timestamp", desc=False)
+            .range(offset, offset + _ROLLUP_PAGE_SIZE - 1)
+            .execute()
+            .data  # type: ignore
+        )
+        offset += len(page)
+        rollups = rollups_from_chats(page)
+        if held is not None:
+            if rollups and rollups[0]["bucket"] == held["bucket"]:
+                first = rollups[0]
+                first["chats"] += held["chats"]
+                first["user_messages"] += held["user_messages"]
+            else:
+                rollups.insert(0, held)
+        if len(page) < _ROLLUP_PAGE_SIZE:
+            if rollups:
+                yield rollups, until
+            return
+        held = rollups.pop()
+        if rollups:
+            yield rollups, held["bucket"]
+
 
-    return details
+# The one-time count of the chats logged before the rollups existed. Created
+# by hand in the Supabase SQL editor, next to db_logging's chat_rollups:
+#
+#   create table chat_rollup_backfill (
+#     id smallint primary key default 1 check (id = 1),
+#     watermark timestamptz not null,  -- chats started before it are counted
+#     counted_until timestamptz,       -- hours before it are merged (resume)
+#     done boolean not null default false
+#   );
+#   create or replace function merge_chat_rollups(p_rows jsonb)
+#   returns void language sql as $$
+#     insert into chat_rollups as r (bucket, chats, user_messages)
+#     select (e->>'bucket')::timestamptz, (e->>'chats')::int,
+#            (e->>'user_messages')::int
+#     from jsonb_array_elements(p_rows) e
+#     on conflict (bucket) do update
+#       set chats = greatest(r.chats, excluded.chats),
+#           user_messages = greatest(r.user_messages, excluded.user_messages);
+#   $$;
+#   revoke execute on function merge_chat_rollups(jsonb) from anon, authenticated;
+#
+# The log writer bumps the rollups from the moment they exist, so an hour can
+# already hold some of the chats being counted, and keeps getting bumped while
+# the count runs. A counted hour includes every bump made before it was read,
+# so ``greatest`` keeps whichever is more complete and never drops a bump;
+# merging the same page twice changes nothing, so a backfill cut short simply
+# resumes from counted_until on the next boot.
+BACKFILL_TABLE = "chat_rollup_backfill"
+BACKFILL_RPC = "merge_chat_rollups"
+_backfilled = False
+
+
+def backfill_rollups() -> bool:
+    """Count the chats before the watermark into the rollups, once.
+
+    False while the rollups cannot be trusted for the whole history (a table
+    or the RPC is missing, or the backfill failed part way): the caller then
+    counts from ``chats``.
+    """
+    global _backfilled
+    if _backfilled:
+        return True
+    try:
+        supabase.table(BACKFILL_TABLE).upsert(
+            {"id": 1, "watermark": datetime.now(timezone.utc).isoformat()},
+            ignore_duplicates=True,
+        ).execute()
+        state = supabase.table(BACKFILL_TABLE).select("*").eq("id", 1).execute().data[0]  # type: ignore
+        if not state["done"]:
+            merged = 0
+            for rollups, counted_until in count_chats(
+                state["counted_until"], state["watermark"]
+            ):
+                supabase.rpc(BACKFILL_RPC, {"p_rows": rollups}).execute()
+                supabase.table(BACKFILL_TABLE).update(
+                    {"counted_until": counted_until}
+                ).eq("id", 1).execute()
+                merged += len(rollups)
+            supabase.table(BACKFILL_TABLE).update({"done": True}).eq("id", 1).execute()
+            print(f"[dashboard] backfilled {merged} rollup rows up to {state['watermark']}")
+    except Exception as e:
+        print(f"[dashboard] rollup backfill not done, counting from chats: {e}")
+        return False
+    _backfilled = True
+    return True
+
+
+def summarise_chat(row: AnyChatRow) -> ChatSummary | None:
+    """Everything the chat list shows, without the message bodies."""
+    messages = row["messages"]
+    if not messages:
+        return None
+    summary: ChatSummary = {
+        "id": row["id"],
+        "row_id": row["id"],
+        "chat_timestamp": row["timestamp"],
+        "user_message_count": sum(1 for m in messages if is_user(m)),
+        "message_count": len(messages),
+    }
+    session_id = row["session_id"]
+    if session_id is None:
+        return summary
+    # Only new chats after here
+    _row: ChatRow = row  # type: ignore
+    summary["id"] = session_id
+    start_ts, end_ts = _message_bounds(_row["messages"])
+    summary["started_at"] = datetime.fromtimestamp(start_ts).isoformat()
+    summary["ended_at"] = datetime.fromtimestamp(end_ts).isoformat()
+    summary["duration_seconds"] = end_ts - start_ts
+    return summary
+
+
+def stream_chat_summaries(month_key: MonthKey) -> Iterator[str]:
+    """JSON array of the month's chat summaries, written as pages arrive.
+
+    Offsets can shift while a month is still being written to (a new chat lands
+    on page 1 and pushes one row onto the next page), so ids are de-duplicated.
+    """
+    seen: set[str] = set()
+    yield "["
+    for page in iter_month_chats(month_key):
+        for row in page:
+            summary = summarise_chat(row)
+            if summary is None or summary["row_id"] in seen:
+                continue
+            yield ("," if seen else "") + json.dumps(summary, ensure_ascii=False)
+            seen.add(summary["row_id"])
+    yield "]"
+
+
+def fetch_chat(row_id: str) -> ChatDetail | None:
+    rows: list[AnyChatRow] = (
+        supabase.table("chats").select("*").eq("id", row_id).limit(1).execute().data  # type: ignore
+    )
+    if not rows:
+        return None
+    summary = summarise_chat(rows[0])
+    if summary is None:
+        return None
+    return {**summary, "messages": rows[0]["messages"]}  # type: ignore
 
 
 month_cache = MonthCache()
@@ -521,6 +875,78 @@ def auth_required(view):
     return wrapped
 
 
+# HTTP caching.
+#
+# The dashboard polls /api/dashboard and the open month every few seconds; the
+# answer changes only when MonthCache's numbers do. Each response body is built
+# and gzipped once per VERSION and kept; the version goes out as a weak ETag
+# (plus Last-Modified), and a poll that sends it back gets a bodiless 304.
+# Weak, because the gzip and identity bodies are the same representation.
+# _BOOT_TAG keeps a restarted process from answering 304 to an ETag it did not
+# issue (its generation counters start from zero again).
+_BOOT_TAG = uuid.uuid4().hex[:8]
+_GZIP_MIN_BYTES = 1024  # below this gzip's header eats the gain
+_responses: dict[str, tuple[str, bytes, bytes | None]] = {}
+
+
+def _cached_response(
+    key: str,
+    version: object,
+    last_modified: float,
+    build,
+    mimetype: str = "application/json",
+) -> Response:
+    """Serve ``build()`` (bytes) for ``version``, conditional and compressed.
+
+    ``build`` only runs when ``version`` changed since the last time ``key``
+    was served.
+    """
+    etag = f"{_BOOT_TAG}-{version}"
+    entry = _responses.get(key)
+    if entry is None or entry[0] != etag:
+        raw = build()
+        packed = gzip.compress(raw, 6) if len(raw) >= _GZIP_MIN_BYTES else None
+        entry = _responses[key] = (etag, raw, packed)
+    _, raw, packed = entry
+
+    use_gzip = packed is not None and "gzip" in request.accept_encodings
+    response = Response(packed if use_gzip else raw, mimetype=mimetype)
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    # Behind Basic-Auth: browsers may keep it, shared caches must not, and
+    # every use revalidates (cheap: a 304).
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.set_etag(etag, weak=True)
+    response.last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+    return response.make_conditional(request)
+
+
+def _json_bytes(payload: object) -> bytes:
+    # The app's JSON provider, so bodies are byte-identical to jsonify's.
+    return (current_app.json.dumps(payload) + "\n").encode("utf-8")
+
+
+def _static_response(directory: str, filename: str) -> Response:
+    path = os.path.join(current_app.root_path, directory, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return send_from_directory(directory, filename)  # its own 404
+
+    def read() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    return _cached_response(
+        f"static:{directory}/{filename}",
+        stat.st_mtime_ns,
+        stat.st_mtime,
+        read,
+        mimetype="text/html",
+    )
+
+
 # Routes
 @auth_required
 def DASHBOARD_data():
@@ -531,8 +957,17 @@ def DASHBOARD_data():
     month_cache.current_month_rollover()
 
     if month_cache.expired:
-        month_cache.update_current_month(include_chats=True)
+        month_cache.update_current_month()
+
+    return _cached_response(
+        "dashboard",
+        month_cache.generation,
+        month_cache.modified_at,
+        lambda: _json_bytes(_dashboard_payload()),
+    )
 
+
+def _dashboard_payload() -> DashboardPayload:
     payload: DashboardPayload = {
         "total_chats": month_cache.total_chats,
         "avg_user_messages_per_chat": month_cache.avg_user_messages_per_chat,
@@ -558,19 +993,16 @@ def DASHBOARD_data():
         ],
         "current_month": month_cache.current_month,
     }
-
-    return jsonify(payload)
+    return payload
 
 
 def _DASHBOARD_month(_month_key: MonthKey) -> MonthDetail:
     """
-    Endpoint for fetching detailed data for a specific month, including individual chats.
+    Endpoint for fetching the counts of a specific month. Its chats are listed by
+    DASHBOARD_month_chats.
     """
     if _month_key == month_cache.current_month and month_cache.expired:
-        month_cache.update_current_month(include_chats=True)
-    elif not month_cache._cache[_month_key]["chats"]:
-        rows = fetch_month_chats(_month_key)
-        month_cache._cache[_month_key]["chats"] = analyse_chats(rows)
+        month_cache.update_current_month()
     return month_cache._cache[_month_key]
 
 
@@ -582,33 +1014,74 @@ def DASHBOARD_month(month: MonthKey):
     elif month not in month_cache._cache:
         return jsonify({"error": f"Month '{month}' not found in cache"}), 404
 
-    return jsonify(_DASHBOARD_month(month))
+    detail = _DASHBOARD_month(month)
+    return _cached_response(
+        f"month:{month}",
+        month_cache.month_generation.get(month, 0),
+        month_cache.month_modified_at.get(month, month_cache.modified_at),
+        lambda: _json_bytes(detail),
+    )
+
+
+@auth_required
+def DASHBOARD_month_chats(month: MonthKey):
+    """Chat summaries of a month (no message bodies), streamed as a JSON array."""
+    if month not in month_cache._cache:
+        return jsonify({"error": f"Month '{month}' not found in cache"}), 404
+    return Response(
+        stream_with_context(stream_chat_summaries(month)),
+        mimetype="application/json",
+    )
+
+
+@auth_required
+def DASHBOARD_chat(row_id: str):
+    """One chat with its full transcript."""
+    try:
+        uuid.UUID(row_id)
+    except ValueError:
+        return jsonify({"error": "Invalid chat id"}), 400
+    chat = fetch_chat(row_id)
+    if chat is None:
+        return jsonify({"error": f"Chat '{row_id}' not found"}), 404
+    return jsonify(chat)
 
 
 @auth_required
 def DASHBOARD_index():
-    return send_from_directory("static/dashboard", "index.html")
+    return _static_response("static/dashboard", "index.html")
 
 
 @auth_required
 def admin_index():
     # Hidden admin page: no link from the dashboard, same Basic-Auth gate.
-    return send_from_directory("static/admin", "index.html")
+    return _static_response("static/admin", "index.html")
 
 
 @auth_required
 def admin_sitemap_get():
     """Current in-memory sitemap text + persisted version history."""
+    import zlib
+
     import agent_base
     import sitemap_store
 
-    return jsonify(
-        {
-            "text": agent_base.sitemap,
-            "paths": len(agent_base.all_sites),
-            "trip_paths": len(agent_base.trip_sites),
-            "versions": sitemap_store.recent_versions(),
-        }
+    # The text can change without a save (sitemap_sync applies, then persists
+    # only if something changed), so it is part of the version itself.
+    text = agent_base.sitemap
+    version = f"{sitemap_store.generation}-{zlib.crc32(text.encode('utf-8')):08x}"
+    return _cached_response(
+        "sitemap",
+        version,
+        sitemap_store.saved_at,
+        lambda: _json_bytes(
+            {
+                "text": text,
+                "paths": len(agent_base.all_sites),
+                "trip_paths": len(agent_base.trip_sites),
+                "versions": sitemap_store.recent_versions(),
+            }
+        ),
     )
 
 
@@ -622,6 +1095,17 @@ def admin_sitemap_post():
     return jsonify(result), (400 if "error" in result else 200)
 
 
+@auth_required
+def admin_bindings():
+    """Gauges of the Kunden/Agentur session bindings (count, in flight, evicted)."""
+    import agentur_auth
+    import kunden_auth
+
+    return jsonify(
+        {"kunden": kunden_auth.binding_gauges(), "agentur": agentur_auth.binding_gauges()}
+    )
+
+
 @auth_required
 def reindex_travels():
     """Trigger a TourOne travel-index rebuild off the request thread.
@@ -641,6 +1125,8 @@ month_cache.load_all()
 routes = [
     ("/api/dashboard", DASHBOARD_data),
     ("/api/dashboard/<string:month>", DASHBOARD_month),
+    ("/api/dashboard/<string:month>/chats", DASHBOARD_month_chats),
+    ("/api/dashboard/chat/<string:row_id>", DASHBOARD_chat),
     ("/dashboard", DASHBOARD_index),
     ("/dashboard/", DASHBOARD_index),
     ("/admin", admin_index),
@@ -648,4 +1134,5 @@ routes = [
     ("/admin/reindex", reindex_travels, ["POST"]),
     ("/admin/sitemap", admin_sitemap_get),
     ("/admin/sitemap", admin_sitemap_post, ["POST"]),
+    ("/admin/bindings", admin_bindings),
 ]
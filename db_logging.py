@@ -1,3 +1,5 @@
+import atexit
+import json
 import os
 import time
 from collections import OrderedDict
@@ -9,6 +11,10 @@ import threading
 from dotenv import load_dotenv
 from supabase import Client, create_client
 
+from chat_sessions import Session, SessionStore
+import shared_state
+from chat_spool import ChatSpool, open_process_spool, turn_time
+
 load_dotenv()
 
 DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
@@ -33,19 +39,89 @@ type ChatHistory = list[Message]
 type SessionID = str
 
 
-class Session(TypedDict):
-    db_id: str
-    history: NotRequired[ChatHistory]
-    created_at: float
-    last_active: float
+SESSION_MESSAGE_EXPIRY_SECONDS = 12 * 60 * 60  # 12 hours
+SESSION_EXPIRY_SECONDS = 7 * 24 * 60 * 60  # 7 days
 
+# Upper bound for cached histories across ALL sessions (encoded bytes). Over it the
+# least recently used history is dropped and re-read on demand; see chat_sessions.
+CHAT_HISTORY_BUDGET_BYTES = int(
+    os.environ.get("CHAT_HISTORY_BUDGET_BYTES", str(32 * 1024 * 1024))
+)
 
-# sorted old -> new
-_sessions: OrderedDict[SessionID, Session] = OrderedDict()
-_sessions_by_last_active: OrderedDict[SessionID, None] = OrderedDict()
 
-SESSION_MESSAGE_EXPIRY_SECONDS = 12 * 60 * 60  # 12 hours
-SESSION_EXPIRY_SECONDS = 7 * 24 * 60 * 60  # 7 days
+def _new_store() -> SessionStore:
+    return SessionStore(
+        session_ttl=SESSION_EXPIRY_SECONDS,
+        history_ttl=SESSION_MESSAGE_EXPIRY_SECONDS,
+        history_budget=CHAT_HISTORY_BUDGET_BYTES,
+    )
+
+
+_store = _new_store()
+
+# _store is this process's index. With several workers (SHARED_STATE set) the
+# row each one creates is also published here — session_id -> (row id,
+# created_at) — so a session whose next turn is logged by ANOTHER worker
+# appends to its row instead of inserting a second one.
+_shared = shared_state.get()
+_shared_rows = (
+    _shared.map("chat_rows", expires_of=lambda row: row[1] + SESSION_EXPIRY_SECONDS)
+    if _shared is not None
+    else None
+)
+
+
+def _learn_shared_row(session_id: SessionID) -> bool:
+    """Take over the row another worker created for this session, if any."""
+    if _shared_rows is None:
+        return False
+    try:
+        row = _shared_rows.get(session_id)
+    except Exception as e:
+        print(f"[db_logging] shared row lookup failed: {e}")
+        return False
+    if row is None:
+        return False
+    db_id, created_at = row
+    _store.add(session_id, db_id, created_at, time.time())
+    return True
+
+
+def _publish_row(session_id: SessionID, db_id: str, created_at: float) -> None:
+    if _shared_rows is None:
+        return
+    try:
+        _shared_rows[session_id] = (db_id, created_at)
+        _shared_rows.discard_expired(time.time())
+    except Exception as e:
+        print(f"[db_logging] shared row publish failed: {e}")
+
+# How a turn of an EXISTING session reaches the DB.
+#
+# "rewrite": UPDATE chats SET messages = <whole history>. Every turn resends
+#   everything so far, so a long chat gets slower and more expensive per turn,
+#   and a session whose history was pruned from memory costs a read first.
+# "append" (default): only the new messages, through a jsonb-append RPC. The
+#   row shape does not change — `chats.messages` is still the full array — so
+#   the dashboard and _fetch_chat_history read exactly what they read before.
+#
+# The function is created once by hand in the Supabase SQL editor (the API
+# client cannot run DDL), like sitemap_store's table:
+#
+#   create or replace function append_chat_messages(p_id uuid, p_messages jsonb)
+#   returns integer language sql as $$
+#     with u as (
+#       update chats set messages = coalesce(messages, '[]'::jsonb) || p_messages
+#       where id = p_id returning 1
+#     ) select count(*)::int from u;
+#   $$;
+#   revoke execute on function append_chat_messages(uuid, jsonb) from anon, authenticated;
+#
+# Until it exists the first append fails with PostgREST's "function not found"
+# and this process falls back to "rewrite" for good (logged once).
+CHAT_LOG_MODE = os.environ.get("CHAT_LOG_MODE", "append").lower()
+APPEND_RPC = "append_chat_messages"
+_append_unavailable = False
 
 
 def _message_bounds(messages: ChatHistory) -> tuple[float, float]:
@@ -67,9 +143,11 @@ T = TypeVar("T")
 
 
 def _execute_with_retries(
-    action: Callable[[], T], failure_message: str, session_id: SessionID
+    action: Callable[[], T],
+    failure_message: str,
+    session_id: SessionID,
+    max_retries: int = 3,
 ) -> T:
-    max_retries = 3
     last_error: Exception | None = None
     last_response: object | None = None
 
@@ -88,32 +166,78 @@ def _execute_with_retries(
     )
 
 
-def _db_query_all(cutoff: str):
+# Boot reads session METADATA only — never a message body. Histories are
+# fetched on demand (_fetch_chat_history) by the one path that still needs them,
+# a rewrite-mode UPDATE; append mode needs none at all. Downloading every body
+# of the last seven days made boot time and resident memory grow with weekly
+# chat volume, for data that was almost never read again.
+#
+# last_active is projected server-side from the LAST message's timestamp
+# (PostgREST JSON path, negative index). If the projection is refused (older
+# PostgREST), the row's own timestamp stands in for it: it only decides when
+# the (then unloaded) history would have been pruned, so erring early is free.
+_META_COLUMNS = "id, session_id, timestamp"
+_META_LAST_ACTIVE = "last_ts:messages->-1->>timestamp"
+_BOOT_PAGE_SIZE = 1000  # PostgREST's default max-rows; paged so none are cut off
+
+
+def _db_query_all(cutoff: str, columns: str, start: int):
     return (
         supabase.table("chats")
-        .select("id, session_id, messages, timestamp")
+        .select(columns)
         .gte("timestamp", cutoff)
         .order("timestamp", desc=False)
+        .range(start, start + _BOOT_PAGE_SIZE - 1)
         .execute()
     )
 
 
-def _load_sessions_from_db() -> None:
-    cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    response = _execute_with_retries(
-        lambda: _db_query_all(cutoff),
-        "Failed to load chat sessions for session {session_id}",
-        "startup",
-    )
+def _query_session_metadata(cutoff: str) -> list:
+    columns = f"{_META_COLUMNS}, {_META_LAST_ACTIVE}"
+    try:
+        supabase.table("chats").select(columns).limit(1).execute()
+    except Exception as e:
+        print(f"[db_logging] last_active projection refused, using row timestamps: {e}")
+        columns = _META_COLUMNS
 
-    rows = response.data
-    if not isinstance(rows, list):
-        raise RuntimeError(
-            f"Failed to load chat sessions for session startup: {response}"
+    rows: list = []
+    while True:
+        response = _execute_with_retries(
+            lambda: _db_query_all(cutoff, columns, len(rows)),
+            "Failed to load chat sessions for session {session_id}",
+            "startup",
         )
+        page = response.data
+        if not isinstance(page, list):
+            raise RuntimeError(
+                f"Failed to load chat sessions for session startup: {response}"
+            )
+        rows.extend(page)
+        if len(page) < _BOOT_PAGE_SIZE:
+            return rows
+
+
+def _epoch(value: object) -> float | None:
+    """Epoch seconds from a float/numeric string or an ISO-8601 timestamp."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
 
-    now = time.time()
-    loaded_sessions: list[tuple[SessionID, Session]] = []
+
+def _load_sessions_from_db() -> None:
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+    rows = _query_session_metadata(cutoff)
+
+    store = _new_store()
 
     for row in rows:
         if not isinstance(row, dict):
@@ -121,60 +245,26 @@ def _load_sessions_from_db() -> None:
 
         session_id = row.get("session_id")
         db_id = row.get("id")
-        messages: ChatHistory = row.get("messages")  # type: ignore
 
         if not isinstance(session_id, str):
             continue
 
-        if not isinstance(db_id, str) or not isinstance(messages, list) or not messages:
+        created_at = _epoch(row.get("timestamp"))
+        if not isinstance(db_id, str) or created_at is None:
             print(f"Skipping invalid session row with id {session_id}: {row}")
             continue
+        last_active = _epoch(row.get("last_ts")) or created_at
 
-        created_at, last_active = _message_bounds(messages)
+        # No history: it is loaded lazily, on the first write that needs it.
+        store.add(session_id, db_id, created_at, max(created_at, last_active))
 
-        session: Session = {
-            "db_id": db_id,
-            "created_at": created_at,
-            "last_active": last_active,
-        }
-        if now - last_active <= SESSION_MESSAGE_EXPIRY_SECONDS:
-            session["history"] = list(messages)
+    global _store
+    _store = store
 
-        loaded_sessions.append((session_id, session))
 
-    global _sessions, _sessions_by_last_active
-    _sessions = OrderedDict(loaded_sessions)
-    _sessions_by_last_active = OrderedDict(
-        sorted(
-            ((sid, None) for sid in _sessions),
-            key=lambda item: _sessions[item[0]]["last_active"],
-        )
-    )
-
-
-def _prune_sessions() -> None:
-    now = time.time()
-    session_cutoff = now - SESSION_EXPIRY_SECONDS
-    message_cutoff = now - SESSION_MESSAGE_EXPIRY_SECONDS
-
-    expired_session_ids = []
-    for sid, session in _sessions.items():
-        if session["created_at"] >= session_cutoff:
-            break
-        expired_session_ids.append(sid)
-
-    for sid in expired_session_ids:
-        del _sessions[sid]
-        _sessions_by_last_active.pop(sid, None)
-
-    for session_id in _sessions_by_last_active:
-        session = _sessions[session_id]
-        if session["last_active"] >= message_cutoff:
-            break
-        session.pop("history", None)
-
-
-def _fetch_chat_history(db_id: str, session_id: SessionID) -> ChatHistory:
+def _fetch_chat_history(
+    db_id: str, session_id: SessionID, max_retries: int = 3
+) -> ChatHistory:
     """Fetch chat history from Supabase with retries."""
     response = _execute_with_retries(
         lambda: supabase.table("chats")
@@ -183,6 +273,7 @@ def _fetch_chat_history(db_id: str, session_id: SessionID) -> ChatHistory:
         .execute(),
         "Failed to fetch chat history for session {session_id}",
         session_id,
+        max_retries,
     )
 
     data = response.data
@@ -211,13 +302,109 @@ def _fetch_chat_history(db_id: str, session_id: SessionID) -> ChatHistory:
     return history
 
 
+def _append_messages(db_id: str, session_id: SessionID, messages: ChatHistory) -> bool:
+    """Append ``messages`` to the row server-side. False = RPC missing, use rewrite.
+
+    Not retried here. The log writer retries the whole turn, and an append is
+    not idempotent: a retry after a lost response would store the turn twice,
+    which the writer's idempotency lookup (_already_logged) catches first.
+    """
+    global _append_unavailable
+    try:
+        response = supabase.rpc(
+            APPEND_RPC, {"p_id": db_id, "p_messages": messages}
+        ).execute()
+    except Exception as e:
+        text = str(e)
+        if "PGRST202" in text or "Could not find the function" in text:
+            _append_unavailable = True
+            print(
+                f"[db_logging] {APPEND_RPC} missing (see CHAT_LOG_MODE) "
+                "— falling back to full rewrites"
+            )
+            return False
+        raise
+    if response.data == 0:
+        raise RuntimeError(
+            f"Failed to append chat log for session {session_id}: no row {db_id}"
+        )
+    return True
+
+
+# Dashboard rollups: per-hour counters, so /api/dashboard never has to read
+# `chats` (see dashboard.MonthCache). One row per UTC hour in which chats were
+# STARTED; a later turn counts its user messages into the hour its chat started
+# in, which is what the dashboard always attributed them to. Created by hand in
+# the Supabase SQL editor, like append_chat_messages:
+#
+#   create table chat_rollups (
+#     bucket timestamptz primary key,  -- hour start, UTC
+#     chats integer not null default 0,
+#     user_messages integer not null default 0
+#   );
+#   create or replace function bump_chat_rollup(
+#     p_bucket timestamptz, p_chats integer, p_user_messages integer
+#   ) returns void language sql as $$
+#     insert into chat_rollups as r (bucket, chats, user_messages)
+#     values (date_trunc('hour', p_bucket), p_chats, p_user_messages)
+#     on conflict (bucket) do update
+#       set chats = r.chats + excluded.chats,
+#           user_messages = r.user_messages + excluded.user_messages;
+#   $$;
+#   revoke execute on function bump_chat_rollup(timestamptz, integer, integer)
+#     from anon, authenticated;
+#
+# Missing RPC → bumps stop for this process (logged once) and the dashboard
+# keeps computing from `chats`, as before. A failed bump never fails the turn:
+# the chat log is the record, the rollup only a view of it.
+ROLLUP_TABLE = "chat_rollups"
+ROLLUP_RPC = "bump_chat_rollup"
+_rollups_unavailable = False
+
+
+def _bump_rollup(created_at: float, chats: int, messages: ChatHistory) -> None:
+    global _rollups_unavailable
+    user_messages = sum(1 for m in messages if m.get("role") == "user")
+    if _rollups_unavailable or not (chats or user_messages):
+        return
+    bucket = datetime.fromtimestamp(created_at, timezone.utc).replace(
+        minute=0, second=0, microsecond=0
+    )
+    try:
+        supabase.rpc(
+            ROLLUP_RPC,
+            {
+                "p_bucket": bucket.isoformat(),
+                "p_chats": chats,
+                "p_user_messages": user_messages,
+            },
+        ).execute()
+    except Exception as e:
+        text = str(e)
+        if "PGRST202" in text or "Could not find the function" in text:
+            _rollups_unavailable = True
+            print(f"[db_logging] {ROLLUP_RPC} missing — dashboard rollups off")
+            return
+        print(f"[db_logging] rollup bump failed for {bucket.isoformat()}: {e}")
+
+
+def _caches_histories() -> bool:
+    """Only a rewrite UPDATE reads a history back; appending never does.
+
+    In append mode a cached copy would just duplicate ``chats.messages`` in
+    memory for the history horizon. If the RPC turns out to be missing, the
+    rewrite fallback fetches the history once and caches it from then on.
+    """
+    return CHAT_LOG_MODE != "append" or _append_unavailable
+
+
 def log_messages(session_id: SessionID, messages: ChatHistory) -> None:
     if not session_id:
         raise ValueError("session_id must not be empty")
 
-    _prune_sessions()
+    _store.prune()
 
-    if session_id not in _sessions:
+    if session_id not in _store and not _learn_shared_row(session_id):
         # TODO: check if the session_id already exists in DB to avoid duplicates
         # --- New session: INSERT ---
         row = {
@@ -240,44 +427,52 @@ def log_messages(session_id: SessionID, messages: ChatHistory) -> None:
             print(f"Inserted chat log: {db_id} with messages: {messages}")
 
         now = time.time()
-
-        session: Session = {
-            "db_id": db_id,
-            "history": messages,
-            "created_at": now,
-            "last_active": now,
-        }
-
-        _sessions[session_id] = session
-        _sessions_by_last_active[session_id] = None
+        _store.add(
+            session_id, db_id, now, now, history=messages if _caches_histories() else None
+        )
+        _publish_row(session_id, db_id, now)
+        _bump_rollup(now, 1, messages)
 
     else:
         # --- Existing session: UPDATE ---
-        session = _sessions[session_id]
-        session["last_active"] = time.time()
+        session: Session = _store.sessions[session_id]
+        _store.touch(session_id)
         db_id = session["db_id"]
-        # update last active sorting
-        _sessions_by_last_active.pop(session_id, None)
-        _sessions_by_last_active[session_id] = None
-
-        # Merge
-        if "history" not in session:
-            history = _fetch_chat_history(db_id, session_id)
-        else:
-            history = session["history"]
-        history += messages
-
-        # TODO: optimize by only sending new messages instead of whole history on every update
+
+        if (
+            CHAT_LOG_MODE == "append"
+            and not _append_unavailable
+            and _append_messages(db_id, session_id, messages)
+        ):
+            # Appending needs no history: none is kept (or read back).
+            _store.drop_history(session_id)
+            _bump_rollup(session["created_at"], 0, messages)
+            return
+
+        # Merge. A new list, not +=: if the UPDATE fails the writer retries
+        # this turn, and an in-place merge would then hold it twice.
+        history = _store.history(session_id)
+        if history is None:
+            # One attempt; the log writer owns retries (without sleeping here).
+            history = _fetch_chat_history(db_id, session_id, max_retries=1)
+        history = history + messages
+
         update_payload = {
             "messages": history,
         }
         supabase.table("chats").update(update_payload).eq("id", db_id).execute()  # type: ignore
-        session["history"] = history
+        _store.set_history(session_id, history)
+        _bump_rollup(session["created_at"], 0, messages)
 
 
 def active_session_count() -> int:
-    _prune_sessions()
-    return len(_sessions)
+    _store.prune()
+    return len(_store)
+
+
+def session_stats() -> dict[str, int]:
+    """Cache counters of the session store (hits, misses, evictions, bytes, ...)."""
+    return {**_store.stats, "sessions": len(_store)}
 
 
 ############## Running #############
@@ -288,22 +483,364 @@ _load_sessions_from_db()
 print("Active Sessions:", active_session_count())
 
 ################## Log worker + queue ####################################
-log_queue: queue.Queue = queue.Queue()
+# Producers (chat_stream, the 429 audit trail) put ``(session_id, messages)``
+# and return at once. One writer thread owns every Supabase write:
+#
+#   log_queue (bounded) ──► _log_worker
+#                             ├─ spool first (chat_spool: local SQLite), then:
+#                             ├─ coalesce: all pending turns of a session
+#                             │  become ONE log_messages call
+#                             ├─ flush when LOG_BATCH_SESSIONS are pending or
+#                             │  LOG_FLUSH_SECONDS after a session's first turn
+#                             └─ failure → that session backs off (2**attempt s,
+#                                at most LOG_RETRY_MAX_SECONDS) while every
+#                                other session keeps flushing
+#
+# With the spool, a failing session rides out an outage: its turns stay on disk
+# and in order until Supabase takes them, and whatever is still pending at exit
+# is replayed by the next process. A turn is acked (deleted from the spool) only
+# after its write succeeded. What Supabase will never take is buried instead
+# (moved to the spool's dead_turns, counted as log_stats["dead"]) so it stops
+# blocking its session: at once on a permanent error (_is_permanent: the row
+# itself is invalid), else after LOG_SPOOL_MAX_ATTEMPTS — about 8h of backoff.
+# Without a spool (CHAT_LOG_SPOOL=off, or the file cannot be opened) the old
+# in-memory behaviour applies: give up after LOG_MAX_ATTEMPTS, or at once on a
+# permanent error.
+#
+# Full queue → the producer spools the turn itself and the writer picks it up;
+# without a spool it is dropped and counted (log_stats). Never blocking the
+# request: a chat answer matters more than its log line. On shutdown (Railway
+# redeploy → SIGTERM → gunicorn's graceful exit → interpreter exit) drain()
+# flushes what is pending, bounded by LOG_DRAIN_SECONDS so it stays inside
+# gunicorn's graceful timeout.
+LOG_QUEUE_MAX = 1000
+LOG_BATCH_SESSIONS = 50
+LOG_FLUSH_SECONDS = 1.0
+LOG_MAX_ATTEMPTS = 5
+LOG_SPOOL_MAX_ATTEMPTS = 500
+LOG_RETRY_MAX_SECONDS = 60.0
+LOG_DRAIN_SECONDS = 10.0
+
+# Base path of the spool files; "off" disables them. Each process writes its own
+# <base>.<host>-<pid> and adopts those of exited processes (chat_spool).
+# Relative to the working directory (/app in the container), so they survive a
+# process restart; mount a volume there to keep them across redeploys too.
+CHAT_LOG_SPOOL = os.environ.get("CHAT_LOG_SPOOL", ".chat_log_spool.sqlite3")
+
+log_stats = {
+    "dropped": 0,
+    "spooled": 0,
+    "overflow": 0,
+    "written": 0,
+    "duplicates": 0,
+    "retried": 0,
+    "failed": 0,
+    "dead": 0,
+}
+
+_STOP = object()
+_drain_deadline: float | None = None
+# Set by a producer that spooled past a full queue: the writer re-reads the spool.
+_overflowed = threading.Event()
+
+
+def _open_spool() -> ChatSpool | None:
+    if CHAT_LOG_SPOOL.lower() in ("", "off", "0", "false"):
+        return None
+    try:
+        return open_process_spool(CHAT_LOG_SPOOL)
+    except Exception as e:
+        print(f"[log_worker] spool {CHAT_LOG_SPOOL} unavailable, memory only: {e}")
+        return None
+
+
+_spool = _open_spool()
+
+
+class LogQueue(queue.Queue):
+    """Bounded queue whose ``put`` never blocks the caller.
+
+    When full, the turn goes straight to the spool (or is dropped without one).
+    """
+
+    def put(self, item, block=False, timeout=None):
+        try:
+            super().put(item, block, timeout)
+            return
+        except queue.Full:
+            pass
+        if _spool is not None:
+            try:
+                _spool.add([item])
+                log_stats["overflow"] += 1
+                _overflowed.set()
+                return
+            except Exception as e:
+                print(f"[log_worker] overflow spool failed: {e}")
+        log_stats["dropped"] += 1
+        n = log_stats["dropped"]
+        if n == 1 or n % 100 == 0:
+            print(f"[log_worker] queue full — {n} turn(s) dropped so far")
+
+
+log_queue: queue.Queue = LogQueue(maxsize=LOG_QUEUE_MAX)
+
+
+class _Turn(TypedDict):
+    messages: ChatHistory
+    spool_id: int | None
+
+
+class _Pending(TypedDict):
+    turns: list[_Turn]
+    due_at: float
+    attempt: int
+    check: bool  # retried or replayed: look in ``chats`` before writing
+
+
+def _already_logged(session_id: SessionID, messages: ChatHistory) -> bool:
+    """Whether this turn is already in ``chats`` — its idempotency check.
+
+    Looks for the turn's newest message by timestamp (jsonb containment), one
+    request. A row found this way also teaches the session store its id, so an
+    INSERT whose answer was lost is not repeated as a second row.
+    """
+    ts = turn_time(messages)
+    if ts is None:
+        return False
+    response = (
+        supabase.table("chats")
+        .select("id, timestamp")
+        .eq("session_id", session_id)
+        .contains("messages", json.dumps([{"timestamp": ts}]))
+        .limit(1)
+        .execute()
+    )
+    rows = response.data if isinstance(response.data, list) else []
+    if not rows:
+        return False
+    row = rows[0]
+    if session_id not in _store and isinstance(row.get("id"), str):
+        created_at = _epoch(row.get("timestamp")) or time.time()
+        _store.add(session_id, row["id"], created_at, time.time())
+    return True
+
+
+def _ack(turns: list[_Turn]) -> None:
+    ids = [t["spool_id"] for t in turns if t["spool_id"] is not None]
+    if _spool is not None and ids:
+        try:
+            _spool.ack(ids)
+        except Exception as e:
+            # Left behind = replayed later, and then caught by _already_logged.
+            print(f"[log_worker] spool ack failed: {e}")
+
+
+def _write(session_id: SessionID, entry: _Pending) -> None:
+    turns = entry["turns"]
+    if entry["check"]:
+        landed = [t for t in turns if _already_logged(session_id, t["messages"])]
+        if landed:
+            log_stats["duplicates"] += len(landed)
+            _ack(landed)
+            turns = entry["turns"] = [t for t in turns if all(t is not x for x in landed)]
+        if not turns:
+            return
+    log_messages(session_id, [m for t in turns for m in t["messages"]])
+    _ack(turns)
+
+
+def _is_permanent(e: Exception) -> bool:
+    """Whether retrying this write can never succeed.
+
+    Postgres data exceptions (SQLSTATE class 22) and integrity violations (23)
+    are about the row itself, as are messages that cannot be serialised
+    (TypeError). Network errors, timeouts, 5xx — and a 5xx page that fails to
+    parse as JSON (ValueError) — are not.
+    """
+    if isinstance(e, TypeError):
+        return True
+    code = getattr(e, "code", None)  # postgrest.APIError
+    return isinstance(code, str) and code[:2] in ("22", "23")
+
+
+def _give_up(session_id: SessionID, entry: _Pending, e: Exception) -> None:
+    """Stop retrying a session's turns: bury the spooled ones, drop the rest."""
+    turns = entry["turns"]
+    ids = [t["spool_id"] for t in turns if t["spool_id"] is not None]
+    n = sum(len(t["messages"]) for t in turns)
+    if _spool is not None and ids:
+        try:
+            _spool.bury(ids, f"{type(e).__name__}: {e}")
+            log_stats["dead"] += len(ids)
+            log_stats["failed"] += len(turns) - len(ids)
+            print(
+                f"[log_worker] moved {n} message(s) for session {session_id} "
+                f"to dead_turns after {entry['attempt']} attempt(s): {e}"
+            )
+            return
+        except Exception as bury_error:
+            # Left in turns = replayed by the next process.
+            print(f"[log_worker] spool bury failed: {bury_error}")
+    log_stats["failed"] += 1
+    print(f"[log_worker] giving up on {n} message(s) for session {session_id}: {e}")
+
+
+def _flush(pending: OrderedDict[SessionID, _Pending], force: bool) -> None:
+    """Write every session that is due (all of them when ``force``)."""
+    now = time.time()
+    for session_id in list(pending):
+        entry = pending[session_id]
+        if not force and entry["due_at"] > now:
+            continue
+        try:
+            _write(session_id, entry)
+        except Exception as e:
+            entry["attempt"] += 1
+            entry["check"] = True  # the failed write may have landed after all
+            max_attempts = LOG_MAX_ATTEMPTS if _spool is None else LOG_SPOOL_MAX_ATTEMPTS
+            if _is_permanent(e) or entry["attempt"] >= max_attempts:
+                del pending[session_id]
+                _give_up(session_id, entry, e)
+            else:
+                delay = min(2 ** entry["attempt"], LOG_RETRY_MAX_SECONDS)
+                entry["due_at"] = time.time() + delay
+                log_stats["retried"] += 1
+                print(f"[log_worker] Error (attempt {entry['attempt']}): {e}")
+            continue
+        del pending[session_id]
+        log_stats["written"] += 1
+
+
+def _enqueue(
+    pending: OrderedDict[SessionID, _Pending],
+    session_id: SessionID,
+    turn: _Turn,
+    check: bool,
+) -> None:
+    entry = pending.get(session_id)
+    if entry is None:
+        pending[session_id] = {
+            "turns": [turn],
+            "due_at": time.time() + (0.0 if check else LOG_FLUSH_SECONDS),
+            "attempt": 0,
+            "check": check,
+        }
+    else:
+        # Behind anything still waiting or backing off: order is kept.
+        entry["turns"].append(turn)
+        entry["check"] = entry["check"] or check
+
+
+def _replay(pending: OrderedDict[SessionID, _Pending]) -> None:
+    """Queue spooled turns the writer does not hold yet (previous process, overflow)."""
+    if _spool is None:
+        return
+    held = {
+        t["spool_id"] for e in pending.values() for t in e["turns"] if t["spool_id"]
+    }
+    try:
+        rows = _spool.pending(exclude=held)
+    except Exception as e:
+        print(f"[log_worker] spool replay failed: {e}")
+        return
+    for spool_id, session_id, messages in rows:
+        _enqueue(pending, session_id, {"messages": messages, "spool_id": spool_id}, True)
+    for entry in pending.values():
+        # An overflowed turn can arrive after a later one of its session.
+        entry["turns"].sort(key=lambda t: turn_time(t["messages"]) or 0.0)
+    if rows:
+        print(f"[log_worker] replaying {len(rows)} spooled turn(s)")
+
+
+def _spool_items(items: list) -> list[int | None]:
+    """Spool ids for ``items``; ``-1`` marks a turn the spool already holds."""
+    if _spool is None:
+        return [None] * len(items)
+    try:
+        ids = _spool.add(items)
+    except Exception as e:
+        print(f"[log_worker] spool write failed, memory only: {e}")
+        return [None] * len(items)
+    log_stats["spooled"] += len(items)
+    return [-1 if i is None else i for i in ids]
 
 
 def _log_worker():
-    """Single background thread — processes logging tasks one at a time."""
+    """Single background thread — spools, coalesces and writes queued turns."""
+    pending: OrderedDict[SessionID, _Pending] = OrderedDict()
+    _replay(pending)
     while True:
-        task = log_queue.get()
-        if task is None:  # poison pill to shut down
-            break
+        timeout = None
+        if pending:
+            timeout = max(0.0, min(e["due_at"] for e in pending.values()) - time.time())
         try:
-            task()
-        except Exception as e:
-            print(f"[log_worker] Error: {e}")
-        finally:
+            item = log_queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+        # Take whatever else is already waiting: a burst coalesces into one pass.
+        items = [] if item is None else [item]
+        while item is not None and len(items) < LOG_QUEUE_MAX:
+            try:
+                items.append(log_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        stopping = False
+        turns = []
+        for it in items:
             log_queue.task_done()
+            if it is _STOP:
+                stopping = True
+            else:
+                turns.append(it)
+        for (session_id, messages), spool_id in zip(turns, _spool_items(turns)):
+            if spool_id == -1:
+                continue  # same idempotency key already spooled: written once
+            _enqueue(
+                pending,
+                session_id,
+                {"messages": list(messages), "spool_id": spool_id},
+                False,
+            )
+        if _overflowed.is_set():
+            _overflowed.clear()
+            _replay(pending)
+
+        if stopping:
+            deadline = _drain_deadline or time.time()
+            while pending and time.time() < deadline:
+                _flush(pending, force=True)
+                if pending:
+                    time.sleep(min(1.0, max(0.0, deadline - time.time())))
+            if pending:
+                kept = " (kept in spool)" if _spool is not None else ""
+                print(f"[log_worker] shutdown: {len(pending)} session(s) not written{kept}")
+            return
+
+        fresh = [e for e in pending.values() if e["attempt"] == 0]
+        if len(fresh) >= LOG_BATCH_SESSIONS:
+            # Size trigger: write the fresh ones now; backing-off ones keep waiting.
+            for entry in fresh:
+                entry["due_at"] = 0.0
+        _flush(pending, force=False)
+
+
+def drain(timeout: float = LOG_DRAIN_SECONDS) -> None:
+    """Flush pending turns and stop the writer. Registered with atexit."""
+    global _drain_deadline
+    if not _worker.is_alive():
+        return
+    _drain_deadline = time.time() + timeout
+    try:
+        # Blocking put (bypasses the drop policy): the stop marker must land.
+        queue.Queue.put(log_queue, _STOP, True, timeout)
+    except queue.Full:
+        return
+    _worker.join(timeout + 1)
 
 
 # Start exactly ONE worker thread at module load time
-threading.Thread(target=_log_worker, daemon=True, name="log-worker").start()
+_worker = threading.Thread(target=_log_worker, daemon=True, name="log-worker")
+_worker.start()
+atexit.register(drain)
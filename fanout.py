@@ -0,0 +1,108 @@
+"""Process-wide bounded fan-out, gevent-aware.
+
+Hop 2 in Kunden- and Agentur-Modus used to build a fresh
+``ThreadPoolExecutor(max_workers=8)`` on every tool call. Two problems with
+that, both a consequence of the deploy shape (gunicorn -k gevent, one worker,
+up to 1000 connections — see session_binding):
+
+* The limit was per CALL, not per process. Twenty sessions asking for details
+  at once put 20 x 8 requests on TourOne, and nothing here noticed.
+* Under the gevent worker the pool mixed real OS threads with greenlets and
+  paid thread start-up on every call, for work that is pure network wait.
+
+So there is exactly one pool per purpose, created on first use and kept for the
+life of the process. Its size IS the global limit: every caller's tasks queue
+on the same pool, whichever session they come from. Under gevent it is a
+``gevent.pool.Pool`` (greenlets, cooperative, no OS threads); otherwise — tests,
+``python app.py`` — a ``ThreadPoolExecutor`` with the same bound.
+
+Never submit to a pool from inside a task of the same pool: with every slot held
+by a waiting parent, the children never start.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, TypeVar
+
+# Gleichzeitige Hop-2-Requests gegen TourOne — über ALLE Sessions zusammen, nicht
+# je Tool-Aufruf. Derselbe Wert wie das frühere DETAIL_PARALLEL je Aufruf; er
+# begrenzt die Last, nicht wie viele Buchungen ein Nutzer sieht.
+TOURONE_PARALLEL = 8
+
+# Link previews of chat replies, also over all sessions together (see
+# recommendations.PreviewStage).
+PREVIEW_PARALLEL = 8
+
+POOL_SIZES: dict[str, int] = {
+    "tourone": TOURONE_PARALLEL,
+    "previews": PREVIEW_PARALLEL,
+}
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_lock = threading.Lock()
+_pools: dict[str, object] = {}
+
+
+def gevent_active() -> bool:
+    """True when gevent has monkey-patched ``threading`` (the gunicorn worker)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def _pool(name: str):
+    """The long-lived pool for ``name``, built on first use.
+
+    Built lazily rather than at import: the gevent check has to run after the
+    worker has patched, and a plain ``import`` from a test must not pick gevent.
+    """
+    with _lock:
+        pool = _pools.get(name)
+        if pool is None:
+            size = POOL_SIZES[name]
+            if gevent_active():
+                from gevent.pool import Pool
+
+                pool = Pool(size)
+            else:
+                pool = ThreadPoolExecutor(
+                    max_workers=size, thread_name_prefix=f"fanout-{name}"
+                )
+            _pools[name] = pool
+        return pool
+
+
+def fan_out(name: str, fn: Callable[[T], R], items: Iterable[T]) -> list[R]:
+    """``[fn(x) for x in items]``, run on the shared ``name`` pool, in input order.
+
+    Blocks until every item is done. An exception in ``fn`` propagates to the
+    caller, so callers that must not lose the other results catch per item
+    (both ``_hop2_alle`` do). A single item still goes through the pool: a
+    shortcut around it would be a way past the global limit.
+    """
+    items = list(items)
+    if not items:
+        return []
+    return list(_pool(name).map(fn, items))
+
+
+def submit(name: str, fn: Callable[..., object], *args) -> None:
+    """Run ``fn(*args)`` on the shared ``name`` pool in the background.
+
+    Returns at once, even with every slot busy — the task queues for the same
+    bound as :func:`fan_out` rather than going around it. Fire-and-forget: the
+    result is dropped, so ``fn`` handles (and logs) its own errors.
+    """
+    pool = _pool(name)
+    if gevent_active():
+        import gevent
+
+        # Pool.spawn blocks the caller while the pool is full; a free-standing
+        # greenlet waiting on pool.apply does not.
+        gevent.spawn(pool.apply, fn, args)
+    else:
+        pool.submit(fn, *args)
@@ -0,0 +1,174 @@
+"""Hop 2 (``/get/buchung``) batched when TourOne allows it, fan-out otherwise.
+
+``travel_index._fetch_termine_filtered`` already asks reiseliste for many
+travels in ONE call via ``reisecode[]``. Booking details are still one request
+per vorgang: a details=true answer over 20 bookings is 20 TourOne round trips,
+bounded by the shared pool in :mod:`fanout` but still 20 of them.
+
+Whether ``/get/buchung`` accepts ``vorgangsNummer[]`` is not documented, so it
+is DETECTED, never assumed: :func:`probe` runs once at startup (app.py) and
+only a positive answer switches batching on. Until then — and in tests, and
+whenever the probe says no — every call takes the existing per-vorgang fan-out.
+
+    hole_details(vorgaenge, get, label, gehoert=None)
+      ├─ batching off / unprobed → fan_out(get /get/buchung?vorgangsNummer=…)
+      └─ batching on → chunks of BATCH_SIZE, fanned out over the same pool:
+           GET /get/buchung?vorgangsNummer[]=…&vorgangsNummer[]=…
+           ├─ rows matched back by THEIR OWN ``vorgang`` field; a row for a
+           │  vorgang nobody asked for is dropped and logged
+           ├─ ``gehoert(row)`` false → the row is dropped and its vorgang
+           │  counts as failed (``None``), never re-fetched
+           └─ anything not in a row (failed chunk, missing row) → single fetch
+
+The batch answer never vouches for itself. A row only reaches the caller under
+the vorgang it names, and only if that vorgang was requested — so an endpoint
+that ignored the array and answered with the whole tenant could not leak a
+single foreign booking. A caller that can tell whose row it is passes
+``gehoert`` as well: kundendaten checks ``adrKundenNr`` against the bound
+kunden_id there, because on the batched path the vorgang number no longer
+alone decides which booking comes back. The callers' own per-row checks (G3 on
+Hop 2 in agenturdaten) still run on every row, exactly as on the fan-out path.
+
+``get(path, params)`` is passed in rather than imported so each caller keeps
+its own timeout and its own ``_tourone_get`` seam — that is what the existing
+tests patch.
+"""
+
+import os
+
+import fanout
+from travel_index import _tourone_get
+
+# "auto" = probe at startup, "off" = never batch, "on" = batch without probing
+# (only for a TourOne known to support it; a wrong "on" costs one failed call
+# per chunk before each falls back).
+BATCH_MODE = os.getenv("TOURONE_HOP2_BATCH", "auto").strip().lower()
+
+# vorgänge per batched request. Same number as agenturdaten.DETAIL_ROW_CAP, so
+# an agency details answer is one call; the uncapped customer path splits.
+BATCH_SIZE = 25
+
+# Two vorgänge known to exist, comma-separated. Only an answer carrying both
+# of them shows that the array was honoured; without them the probe has
+# nothing to prove support with and reports unsupported.
+PROBE_VORGAENGE = tuple(
+    v.strip() for v in os.getenv("TOURONE_HOP2_PROBE_VORGAENGE", "").split(",") if v.strip()
+)
+
+# None = not probed (→ fan-out), True/False = probe result.
+_supported: bool | None = True if BATCH_MODE == "on" else None
+
+
+def _rows(page: object) -> list[dict] | None:
+    """Rows of a batched answer, or ``None`` if it is not a row container.
+
+    Same container shape as reiseliste / buchungLeistungenListe:
+    ``{"0": {...}, "1": {...}, "anzahl": N}``. A bare list is accepted too.
+    """
+    if isinstance(page, list):
+        return [r for r in page if isinstance(r, dict)]
+    if isinstance(page, dict) and "anzahl" in page:
+        return [v for k, v in page.items() if k.isdigit() and isinstance(v, dict)]
+    return None
+
+
+def probe(get=None) -> bool:
+    """Ask TourOne once whether ``vorgangsNummer[]`` works. Never raises.
+
+    Yes only for a row container holding exactly the PROBE_VORGAENGE, one
+    row each. An empty answer does not count: it is also what an endpoint
+    that ignored the unknown array param might send, and a false yes would put
+    every chunk through a failing call first. A missing probe vorgang, or any
+    row naming a vorgang we did not ask for, is a hard no.
+    """
+    global _supported
+    if BATCH_MODE != "auto":
+        return bool(_supported)
+    if len(set(PROBE_VORGAENGE)) < 2:
+        print("[hop2_batch] TOURONE_HOP2_PROBE_VORGAENGE unset — fan-out")
+        _supported = False
+        return False
+    get = get or (lambda path, params: _tourone_get(path, params, timeout=10))
+    try:
+        page = get("/get/buchung", {"vorgangsNummer[]": list(PROBE_VORGAENGE)})
+    except Exception as e:
+        print(f"[hop2_batch] probe failed: {type(e).__name__} — fan-out")
+        _supported = False
+        return False
+    rows = _rows(page) if isinstance(page, dict) else None
+    _supported = rows is not None and sorted(str(r.get("vorgang")) for r in rows) == sorted(
+        set(PROBE_VORGAENGE)
+    )
+    print(f"[hop2_batch] vorgangsNummer[] {'supported' if _supported else 'unsupported'}")
+    return _supported
+
+
+def hole_details(vorgaenge: list[str], get, label: str, gehoert=None) -> list:
+    """``/get/buchung`` for each vorgang, in input order; ``None`` per failure.
+
+    ``get(path, params)`` does the authenticated GET. ``label`` prefixes log
+    lines (the caller's module). ``gehoert(row)``, if given, must hold for a
+    batched row to be used. Never raises.
+    """
+    if not vorgaenge:
+        return []
+
+    def einzeln(vorgang: str):
+        try:
+            return get("/get/buchung", {"vorgangsNummer": vorgang})
+        except Exception as e:
+            print(f"[{label}] buchung lookup failed: {type(e).__name__}")
+            return None
+
+    if not _supported:
+        return fanout.fan_out("tourone", einzeln, vorgaenge)
+
+    def gebuendelt(chunk: list[str]) -> dict:
+        try:
+            page = get("/get/buchung", {"vorgangsNummer[]": chunk})
+        except Exception as e:
+            print(f"[{label}] batched buchung lookup failed: {type(e).__name__}")
+            return {}
+        rows = _rows(page)
+        if rows is None:
+            print(f"[{label}] batched buchung answer has no rows — single fetch")
+            return {}
+        gefragt = set(chunk)
+        treffer: dict = {}
+        verworfen: set = set()
+        for row in rows:
+            vorgang = str(row.get("vorgang") or "").strip()
+            if vorgang not in gefragt:
+                # Not a "missing" row but a foreign one: the batch answered for
+                # something we did not ask. Dropped, never shown.
+                print(f"[{label}] batched buchung row for an unrequested vorgang dropped")
+                continue
+            if gehoert is not None and not gehoert(row):
+                print(f"[{label}] batched buchung row of someone else dropped")
+                verworfen.add(vorgang)
+                continue
+            treffer.setdefault(vorgang, row)
+        # A vorgang whose batched row was refused is a failure, not a miss: a
+        # single fetch would only ask the same endpoint the same question.
+        for vorgang in verworfen:
+            treffer.setdefault(vorgang, None)
+        return treffer
+
+    schluessel = [str(v).strip() for v in vorgaenge]
+    eindeutig = list(dict.fromkeys(schluessel))
+    # An empty vorgang never goes into a batch: a row that lacks the field
+    # would otherwise "match" it. It takes the single path, as before.
+    gebuendelt_nr = [v for v in eindeutig if v]
+    chunks = [
+        gebuendelt_nr[i : i + BATCH_SIZE]
+        for i in range(0, len(gebuendelt_nr), BATCH_SIZE)
+    ]
+    gefunden: dict = {}
+    for treffer in fanout.fan_out("tourone", gebuendelt, chunks):
+        gefunden.update(treffer)
+
+    # Second pass, NOT nested inside a pool task (see fanout: that deadlocks).
+    fehlend = [v for v in eindeutig if v not in gefunden]
+    for vorgang, detail in zip(fehlend, fanout.fan_out("tourone", einzeln, fehlend)):
+        gefunden[vorgang] = detail
+    return [gefunden.get(v) for v in schluessel]
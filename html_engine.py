@@ -0,0 +1,61 @@
+"""HTML parsing and HTML → markdown for the tools, with a choice of engine.
+
+The website, visa and page-content tools and the sitemap sync all parsed with
+BeautifulSoup's pure-Python ``html.parser``, and the markdown step parsed the
+same markup a SECOND time: ``markdownify.markdownify(str(tag))`` serialises the
+tag and hands the string to a fresh ``html.parser`` soup. Two engines now:
+
+    "lxml"         lxml's C parser builds the soup; markdownify converts that
+                   soup directly (no serialise + reparse); links are read with
+                   one XPath query without building a soup at all
+    "html.parser"  the former path, byte for byte — the fallback without lxml,
+                   and the reference the benchmark diffs against
+
+Both produce the same markdown on the site's pages (see
+tests/test_html_engine_bench.py for time, memory and output diffs over a
+corpus of sitemap pages). ``HTML_ENGINE`` picks one; the default is lxml when
+it is installed.
+"""
+
+import os
+import re
+
+import markdownify
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+ENGINES = ("lxml", "html.parser")
+
+ENGINE = os.getenv("HTML_ENGINE") or ("lxml" if lxml is not None else "html.parser")
+if ENGINE not in ENGINES or (ENGINE == "lxml" and lxml is None):
+    print(f"[html_engine] HTML_ENGINE={ENGINE!r} not available, using html.parser")
+    ENGINE = "html.parser"
+
+
+def parse(html: str, engine: str | None = None) -> BeautifulSoup:
+    return BeautifulSoup(html, engine or ENGINE)
+
+
+def to_markdown(node, engine: str | None = None) -> str:
+    """Markdown of a parsed tag (or whole soup), stripped, blank-line runs collapsed."""
+    if (engine or ENGINE) == "html.parser":
+        markdown = markdownify.markdownify(str(node))
+    elif node is None:
+        markdown = "None"  # what str(None) gave the former path
+    else:
+        markdown = markdownify.MarkdownConverter().convert_soup(node)
+    return re.sub(r"\n{3,}", "\n\n", markdown.strip())
+
+
+def links(html: str, engine: str | None = None) -> list[str]:
+    """The ``href`` of every ``<a>`` in the page, in document order."""
+    if (engine or ENGINE) == "lxml":
+        try:
+            return [str(href) for href in lxml.html.document_fromstring(html).xpath("//a/@href")]
+        except (ValueError, lxml.etree.LxmlError):
+            pass  # empty document, or an XML encoding declaration in a str
+    return [a["href"] for a in BeautifulSoup(html, "html.parser").find_all("a", href=True)]
@@ -26,9 +26,11 @@ the response body, not even on error.
       │                                  Returns a generation token.
       ├─ verify(phpsessid, ua) ──► ss.php ──► SESSION_ADRKUNDENNR
       │       └─ bad shape / network / non-200 / no key → None (fail closed)
-      └─ commit_auth(session_id, kunden_id, generation)
-              └─ writes ONLY if no newer auth (or unbind) intervened, so a slow
-                 call cannot resurrect an identity a later one already cleared
+      ├─ commit_auth(session_id, kunden_id, generation)
+      │       └─ writes ONLY if no newer auth (or unbind) intervened, so a slow
+      │          call cannot resurrect an identity a later one already cleared
+      └─ prefetch_hop1 (background, optional) ──► /get/adresse, kept only while
+              the session is still bound to that customer
 
 ``bind()`` is the unconditional primitive and is NOT what the route uses.
 """
@@ -40,7 +42,8 @@ from urllib.parse import parse_qs
 import requests
 
 import session_binding
-from kundendaten import parse_kunden_id
+import shared_state
+from kundendaten import drop_warm, parse_kunden_id, prefetch_hop1
 
 # MeinChamäleon session-introspection endpoint. With the customer's session
 # cookies it returns their session (incl. SESSION_ADRKUNDENNR); without → empty.
@@ -203,10 +206,15 @@ _KUNDENNR_RE = re.compile(
 #
 # TTL is passed as a callable so BINDING_TTL above stays the single source of
 # truth: the store reads it at bind time rather than snapshotting it at import.
-_store = session_binding.new_store(lambda: BINDING_TTL)
+#
+# on_drop clears the customer's prefetched Hop 1 (see authenticate) the moment
+# this session stops vouching for them.
+_store = session_binding.new_store(
+    lambda: BINDING_TTL, on_drop=drop_warm, shared=shared_state.get(), name="kunden"
+)
 
-# Live aliases onto the store's own dicts, kept because the tests and rate_limit
-# read them directly. Safe ONLY because nothing ever reassigns store["bindings"]
+# Live aliases onto the store's own maps (dicts, or shared_state views of the
+# SQLite file), kept because the tests and rate_limit read them directly. Safe ONLY because nothing ever reassigns store["bindings"]
 # or store["inflight"] — they are mutated in place, never swapped. That is the
 # whole reason session_binding is functions over a dict and not a class.
 _bindings: dict[str, tuple[str, float]] = _store["bindings"]
@@ -375,6 +383,16 @@ def authenticate(
     if not committed:
         print("[kunden_auth] superseded by a newer auth for the same session")
     authenticated = bool(kunden_id) and committed
+    if authenticated:
+        # Warm Hop 1 in the background so the first buchungen_tool call doesn't
+        # pay for it. It only lands if this session is STILL bound to this
+        # customer when TourOne answers.
+        prefetch_hop1(
+            kunden_id,
+            lambda ablegen: session_binding.if_bound(
+                _store, session_id, kunden_id, ablegen
+            ),
+        )
     # Der frühere ungated print("authenticated=…") ist raus. Sein Kommentar
     # behauptete "einmal pro Chat-Öffnung" — tatsächlich ruft das Widget
     # authenticateSession() beim SEITENAUFRUF auf, also bei jedem Klick durch
@@ -464,3 +482,16 @@ def coerce_json_body(parsed, raw_text: str) -> dict:
 def resolve(session_id: str) -> str | None:
     """Verified kunden_id for this session, or ``None`` (never bound / expired)."""
     return session_binding.resolve(_store, session_id)
+
+
+def sweep() -> int:
+    """Evict expired bindings (session_binding.start_sweeper runs this)."""
+    evicted = session_binding.sweep(_store)
+    if evicted:
+        print(f"[kunden_auth] evicted {evicted} expired bindings")
+    return evicted
+
+
+def binding_gauges() -> dict[str, int]:
+    """Bindings, auths in flight and evictions of this store (/admin/bindings)."""
+    return session_binding.gauges(_store)
@@ -8,7 +8,8 @@ EIGENEN Buchungen des Kunden, nie wessen), nur GET-Zugriffe, und die Antwort
 enthält ausschließlich whitelisted Felder.
 
 ``buchungen_tool(auswahl, anzahl, details)`` — Closure auf kunden_id:
-  └─ GET /get/adresse?kundennummer=…                    (Hop 1, timeout=8)
+  └─ GET /get/adresse?kundennummer=…                    (Hop 1, timeout=8;
+       │                                                 nach der Auth vorgewärmt)
        ├─ Liste ([])  → unbekannte ID → UNBEKANNT_TEXT
        └─ Objekt → buchungen[] → select(auswahl, anzahl):
             auswahl "alle"       → kommende (näheste voran), dann vergangene
@@ -22,7 +23,7 @@ enthält ausschließlich whitelisted Felder.
             ├─ details=false → grobe Liste (Titel, Zeitraum, Buchungsnr.),
             │                  NUR Hop 1, kein Hop 2
             └─ details=true  → je Buchung, OHNE Deckel, nebenläufig
-                                                       (DETAIL_PARALLEL):
+                                          (fanout.TOURONE_PARALLEL, global):
                  GET /get/buchung?vorgangsNummer=…       (Hop 2)
                  → Whitelist → Status, Reisende, Zahlstand, Flüge
 
@@ -45,13 +46,16 @@ im Gemini-Request landet. Änderungen hier gegen diese Grenze prüfen.
 """
 
 import datetime
+import os
 import re
-from concurrent.futures import ThreadPoolExecutor
+import time
 from typing import Literal
 
 import pytz
 from langchain_core.tools import tool
 
+import fanout
+import hop2_batch
 # Bewusster Import der privaten TourOne-Plumbing-Funktion: es soll genau eine
 # Implementierung geben, und die lebt in travel_index (Entscheidung 2A).
 from travel_index import _tourone_get, get_titel_for_code
@@ -70,8 +74,26 @@ TIMEOUT = 8
 # gebündelt (gemessen 2026-07-30: Hop 1 ~0,51s, Hop 2 ~0,15s), sonst wäre die
 # Antwortzeit linear in der Buchungszahl. Die Schranke begrenzt nur, wie viele
 # Requests gleichzeitig auf TourOne treffen — nicht, wie viele Buchungen der
-# Kunde sehen kann.
-DETAIL_PARALLEL = 8
+# Kunde sehen kann. Sie steht in ``fanout.TOURONE_PARALLEL`` und gilt
+# prozessweit über alle Sessions, zusammen mit dem Agenturpfad; das frühere
+# DETAIL_PARALLEL galt je Tool-Aufruf und baute jedes Mal einen neuen Pool.
+
+# Hop 1 vorwärmen: direkt nach einer erfolgreichen Auth holt ``kunden_auth`` die
+# Adresse im Hintergrund, damit der erste buchungen_tool-Aufruf im Chat nicht die
+# ~0,5s von Hop 1 zahlt. Abschaltbar (TOURONE_PREFETCH=0), weil es TourOne-Last
+# pro eingeloggtem Seitenaufruf ist und nicht pro Frage.
+PREFETCH_HOP1 = os.getenv("TOURONE_PREFETCH", "1") != "0"
+# Wie lange ein vorgewärmter Hop 1 auf seine erste Frage wartet. Er überbrückt
+# nur die Lücke zwischen Chat-Öffnen und erster Frage und wird beim ersten
+# Lesen verbraucht (warm_take): jede weitere Frage holt Hop 1 frisch, eine
+# neue Buchung steht also nicht bis zu fünf Minuten lang aus.
+WARM_TTL = 5 * 60
+
+# kunden_id -> (adresse, ablauf). Nach IDENTITÄT geschlüsselt, nicht nach
+# session_id: gelesen wird nur im Tool, das per Closure an genau diese kunden_id
+# gebunden ist. Geräumt wird über session_binding (on_drop), sobald die Session,
+# die dafür gebürgt hat, sie loslässt — unbind, Ablauf, andere Identität.
+_warm: dict[str, tuple[object, float]] = {}
 
 # Grobe Liste braucht keinen Hop 2 (nur Hop-1-Daten), ist also billig — und seit
 # der Owner-Entscheidung 2026-07-30 auch ungedeckelt. Der frühere OVERVIEW_CAP=25
@@ -326,49 +348,123 @@ def _detail_block(emb: dict, buchung: dict, heute: str) -> str:
     return "\n".join(zeilen)
 
 
-def _hop2_alle(ausgewaehlt: list) -> list:
-    """Hop 2 für JEDE ausgewählte Buchung, nebenläufig, in Eingangsreihenfolge.
+def _ist_warm(cache: dict, key: str) -> bool:
+    entry = cache.get(key)
+    return entry is not None and time.time() < entry[1]
 
-    Ein Fehler pro Buchung wird zu ``None`` und lässt die übrigen unberührt: eine
-    einzelne kaputte Buchung darf nicht die ganze Antwort kosten.
 
-    Nebenläufig, weil die Deckelung weg ist — sequenziell wäre die Wartezeit
-    linear in der Buchungszahl (~0,15s je Hop 2). ``DETAIL_PARALLEL`` begrenzt
-    nur die gleichzeitigen Requests gegen TourOne, nicht die Gesamtzahl.
+def warm_take(cache: dict, key: str):
+    """Vorgewärmten Hop 1 für ``key`` entnehmen, oder ``None`` (nie geholt /
+    abgelaufen / schon verbraucht). Einmalig: der Eintrag ist danach weg."""
+    entry = cache.pop(key, None)
+    if entry is None or time.time() >= entry[1]:
+        return None
+    return entry[0]
+
+
+def warm_prefetch(cache: dict, key: str, hole, still_bound, label: str) -> None:
+    """``hole()`` im Hintergrund ausführen und das Ergebnis unter ``key`` ablegen.
+
+    Kehrt sofort zurück. Läuft über den geteilten TourOne-Pool, zählt also gegen
+    dieselbe prozessweite Schranke wie Hop 2. ``hole`` liefert ``None`` für
+    alles, was nicht gecacht werden soll; Fehler werden nie gecacht.
+
+    ``still_bound(ablegen)`` entscheidet, ob das Ergebnis noch landen darf — es
+    ruft ``ablegen`` nur, wenn die Session beim Eintreffen noch an ``key``
+    gebunden ist (``session_binding.if_bound``). Eine Auth, die inzwischen
+    überholt oder per unbind beendet wurde, wärmt also nichts mehr vor.
     """
-    if not ausgewaehlt:
-        return []
+    if not PREFETCH_HOP1 or not key or _ist_warm(cache, key):
+        # Schon warm: das Widget re-authentisiert bei JEDEM Seitenaufruf, derselbe
+        # Kunde soll dabei nicht jedes Mal Hop 1 auslösen.
+        return
 
-    def hole(eingebettet: dict):
+    def lauf():
         try:
-            return _tourone_get(
-                "/get/buchung",
-                {"vorgangsNummer": eingebettet["vorgang"]},
-                timeout=TIMEOUT,
-            )
+            wert = hole()
         except Exception as e:
-            print(f"[kundendaten] buchung lookup failed: {e}")
-            return None
+            print(f"[{label}] prefetch failed: {type(e).__name__}")
+            return
+        if wert is None:
+            return
+
+        def ablegen():
+            jetzt = time.time()
+            for k in [k for k, (_, ablauf) in cache.items() if ablauf <= jetzt]:
+                del cache[k]
+            cache[key] = (wert, jetzt + WARM_TTL)
+
+        still_bound(ablegen)
+
+    fanout.submit("tourone", lauf)
+
+
+def _hole_adresse(kunden_id: str):
+    return _tourone_get("/get/adresse", {"kundennummer": kunden_id}, timeout=TIMEOUT)
+
+
+def prefetch_hop1(kunden_id: str, still_bound) -> None:
+    """Hop 1 dieses Kunden vorwärmen (siehe :func:`warm_prefetch`)."""
+
+    def hole():
+        adresse = _hole_adresse(kunden_id)
+        # Nur Treffer: "unbekannte ID" (Liste) soll beim ersten Tool-Aufruf
+        # frisch nachgefragt werden, nicht fünf Minuten lang feststehen.
+        return adresse if isinstance(adresse, dict) else None
+
+    warm_prefetch(_warm, kunden_id, hole, still_bound, "kundendaten")
+
 
-    if len(ausgewaehlt) == 1:  # kein Pool für einen einzelnen Request
-        return [hole(ausgewaehlt[0])]
-    with ThreadPoolExecutor(
-        max_workers=min(DETAIL_PARALLEL, len(ausgewaehlt))
-    ) as pool:
-        return list(pool.map(hole, ausgewaehlt))
+def drop_warm(kunden_id: str) -> None:
+    """Vorgewärmten Hop 1 verwerfen — ``on_drop`` des kunden_auth-Stores."""
+    _warm.pop(kunden_id, None)
+
+
+def _gehoert_kunde(detail: dict, kunden_id: str) -> bool:
+    """Die gebündelte Detailzeile gehört dieser Kundennummer, oder sie entfällt.
+
+    Im Einzelabruf bindet die ``vorgangsNummer`` aus der eigenen Hop-1-Zeile;
+    gebündelt antwortet TourOne mit Zeilen, die erst über ihr eigenes
+    ``vorgang``-Feld zugeordnet werden — diese Prüfung macht die Zugehörigkeit
+    dort unabhängig nachweisbar. Fehlt ``adrKundenNr``, wird verworfen
+    (``str(None) != kunden_id``), wie bei G3 im Agenturpfad: ein umbenanntes
+    Feld fällt hörbar auf, statt ungeprüft durchzulaufen.
+    """
+    return str(detail.get("adrKundenNr")).strip() == str(kunden_id).strip()
+
+
+def _hop2_alle(ausgewaehlt: list, kunden_id: str) -> list:
+    """Hop 2 für JEDE ausgewählte Buchung, nebenläufig, in Eingangsreihenfolge.
+
+    Ein Fehler pro Buchung wird zu ``None`` und lässt die übrigen unberührt: eine
+    einzelne kaputte Buchung darf nicht die ganze Antwort kosten.
+
+    Nebenläufig, weil die Deckelung weg ist — sequenziell wäre die Wartezeit
+    linear in der Buchungszahl (~0,15s je Hop 2). Der geteilte Pool
+    (``fanout``) begrenzt nur die gleichzeitigen Requests gegen TourOne —
+    prozessweit, nicht je Aufruf —, nicht die Gesamtzahl.
+    """
+    # Gebündelt (vorgangsNummer[]), wenn der Startup-Probe es freigegeben hat,
+    # sonst je Buchung über den geteilten Pool — siehe hop2_batch.
+    return hop2_batch.hole_details(
+        [eingebettet["vorgang"] for eingebettet in ausgewaehlt],
+        lambda path, params: _tourone_get(path, params, timeout=TIMEOUT),
+        "kundendaten",
+        gehoert=lambda detail: _gehoert_kunde(detail, kunden_id),
+    )
 
 
 def fetch_buchungen_text(
     kunden_id: str, auswahl: str = "alle", anzahl: int = 0, details: bool = False
 ) -> str:
     """Hole und formatiere die (ausgewählten) Buchungen des Kunden. Wirft nie."""
-    try:
-        adresse = _tourone_get(
-            "/get/adresse", {"kundennummer": kunden_id}, timeout=TIMEOUT
-        )
-    except Exception as e:
-        print(f"[kundendaten] adresse lookup failed: {e}")
-        return FEHLER_TEXT
+    adresse = warm_take(_warm, kunden_id)
+    if adresse is None:
+        try:
+            adresse = _hole_adresse(kunden_id)
+        except Exception as e:
+            print(f"[kundendaten] adresse lookup failed: {e}")
+            return FEHLER_TEXT
 
     # Kontrakt: unbekannte ID → leere Liste, Treffer → Objekt (beides HTTP 200).
     if not isinstance(adresse, dict):
@@ -411,7 +507,7 @@ def fetch_buchungen_text(
 
     bloecke: list[str] = []
     fehler_gesehen = False
-    for eingebettet, buchung in zip(ausgewaehlt, _hop2_alle(ausgewaehlt)):
+    for eingebettet, buchung in zip(ausgewaehlt, _hop2_alle(ausgewaehlt, kunden_id)):
         if buchung is None:
             fehler_gesehen = True
             continue
@@ -0,0 +1,89 @@
+"""Section index of a site page: its markdown split at the in-page anchors.
+
+The website tool description sends the model to anchors like ``#reiseverlauf``
+or ``#leistungen``, but the tool dropped the fragment and returned the whole
+page every time — a trip page's full markdown for a question about one part of
+it. Now each page is split ONCE, when it is first converted:
+
+    page HTML ──► split() ──► {title, markdown (the whole page, as before),
+                               intro, sections: anchor -> markdown}
+                  cached per HTML string, which get_chamaeleon_website_html
+                  already caches per path
+
+A marker is put in front of every element that carries one of
+SECTION_ANCHORS (``id="…"`` or ``<a name="…">``) inside the main content;
+the markdown is split at the markers, so a section runs up to the next anchor
+in page order.
+"""
+
+import re
+from typing import TypedDict
+
+from bs4 import Tag
+from cachetools.func import ttl_cache
+
+import html_engine
+
+# The anchors the website tool description names, in their usual page order.
+SECTION_ANCHORS = (
+    "uebersicht",
+    "reiseverlauf",
+    "reisedetails",
+    "leistungen",
+    "termine",
+    "unterkuenfte",
+    "zusatzprogramme",
+)
+
+_MARKER = re.compile(r"⟦(\w+)⟧")
+
+
+class PageSections(TypedDict):
+    title: str
+    markdown: str  # the whole main content
+    intro: str  # what comes before the first anchor
+    sections: dict[str, str]  # anchor -> markdown, in page order
+
+
+def _main(soup) -> Tag | None:
+    return soup.find("main") or soup.find("div", class_="main") or soup.find("body")
+
+
+@ttl_cache(maxsize=256, ttl=86400)
+def split(html: str) -> PageSections:
+    soup = html_engine.parse(html)
+    title = soup.find("title")
+    main = _main(soup)
+    page: PageSections = {
+        "title": title.get_text(strip=True) if title else "Titel nicht gefunden",
+        "markdown": html_engine.to_markdown(main),
+        "intro": "",
+        "sections": {},
+    }
+    if main is None:
+        return page
+
+    marked = False
+    for anchor in SECTION_ANCHORS:
+        element = main.find(id=anchor) or main.find("a", attrs={"name": anchor})
+        if element is not None:
+            element.insert_before(f"⟦{anchor}⟧")
+            marked = True
+    if not marked:
+        page["intro"] = page["markdown"]
+        return page
+
+    parts = _MARKER.split(html_engine.to_markdown(main))
+    page["intro"] = parts[0].strip()
+    for anchor, text in zip(parts[1::2], parts[2::2]):
+        page["sections"][anchor] = text.strip()
+    return page
+
+
+def toc(page: PageSections) -> str:
+    """One line naming the sections the tool can return on their own."""
+    if not page["sections"]:
+        return ""
+    return "Abschnitte dieser Seite (einzeln abrufbar): " + ", ".join(
+        f"#{anchor}" for anchor in page["sections"]
+    )
@@ -0,0 +1,56 @@
+"""Lookups over the sitemap's trip paths, built once per sitemap version.
+
+``find_trip_site`` used to scan every trip path for a substring, and link
+detection asked ``link in trip_sites`` of a list. Both now go through a
+:class:`PathIndex`, which agent_base rebuilds in ``apply_sitemap``:
+
+    exact membership        ──► frozenset
+    "first path containing" ──► suffix array of all paths
+                                + range-minimum over the matching paths' positions
+
+A substring of a path is a prefix of one of its suffixes, so the suffixes that
+start with the needle are one contiguous, binary-searchable run of the sorted
+array. The answer is the match that comes first in sitemap order — the
+smallest path number in that run, which a sparse table gives in O(1).
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Iterable
+
+# Sorts after every character a sitemap path can contain.
+_AFTER_ALL = "\U0010ffff"
+
+
+class PathIndex:
+    def __init__(self, paths: Iterable[str]):
+        self.paths = list(paths)
+        self.exact = frozenset(self.paths)
+        suffixes = sorted(
+            (path[i:], n) for n, path in enumerate(self.paths) for i in range(len(path))
+        )
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        # _min[k][i]: the smallest path number among suffixes i .. i + 2**k - 1
+        self._min = [[n for _, n in suffixes]]
+        span = 1
+        while 2 * span <= len(suffixes):
+            prev = self._min[-1]
+            self._min.append([min(prev[i], prev[i + span]) for i in range(len(prev) - span)])
+            span *= 2
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.exact
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def first_containing(self, needle: str) -> str | None:
+        """The first path (in sitemap order) that contains ``needle``, else ``None``."""
+        if not needle:
+            return self.paths[0] if self.paths else None
+        lo = bisect_left(self._suffixes, needle)
+        hi = bisect_right(self._suffixes, needle + _AFTER_ALL, lo)
+        if lo == hi:
+            return None
+        k = (hi - lo).bit_length() - 1
+        level = self._min[k]
+        return self.paths[min(level[lo], level[hi - (1 << k)])]
@@ -0,0 +1,90 @@
+"""Preview metadata per trip page: ``<title>`` and ``og:image``, by URL path.
+
+A recommendation preview needs two strings from a trip page's ``<head>``. It
+used to get them by running BeautifulSoup's pure-Python ``html.parser`` over
+the whole page (hundreds of KB of body markup) for every link in every reply.
+Now the two strings are read ONCE per page, by a head-only extractor, and kept
+here:
+
+    travel_index build ──► _fetch_widget_code(path) ──► record(path, html)
+        (fetches every sitemap trip page anyway)
+    a preview for a page not indexed yet ──► full parse (recommendations) ──► put()
+
+    make_recommendation_preview ──► get(path): a dict lookup
+
+The extractor feeds only the text up to ``</head>`` to a stdlib
+``HTMLParser`` and stops at the first ``<body>``; entities are decoded like
+BeautifulSoup decodes them, so both paths yield the same strings.
+"""
+
+import re
+from html.parser import HTMLParser
+from typing import TypedDict
+
+
+class PageMeta(TypedDict):
+    title: str  # <title> text, stripped, entities decoded
+    image: str | None  # og:image content
+
+
+_HEAD_END = re.compile(r"</head\s*>|<body[\s>]", re.IGNORECASE)
+
+
+class _HeadParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: list[str] | None = None
+        self.in_title = False
+        self.image: str | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title" and self.title is None:
+            self.title = []
+            self.in_title = True
+        elif tag == "meta" and self.image is None:
+            attrs = dict(attrs)
+            if attrs.get("property") == "og:image" and attrs.get("content") is not None:
+                self.image = attrs["content"]
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self.in_title = False
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title.append(data)
+
+
+def extract_head(html: str) -> PageMeta | None:
+    """Title and og:image from the page head; ``None`` if there is no ``<title>``."""
+    end = _HEAD_END.search(html)
+    parser = _HeadParser()
+    parser.feed(html[: end.start()] if end else html)
+    parser.close()
+    if parser.title is None:
+        return None
+    return {"title": "".join(parser.title).strip(), "image": parser.image}
+
+
+# path -> metadata. Filled from worker threads of the index build and from
+# request greenlets; single-key dict writes need no lock.
+_index: dict[str, PageMeta] = {}
+
+
+def record(path: str, html: str) -> None:
+    """Index a fetched page (no-op when its head has no title)."""
+    meta = extract_head(html)
+    if meta is not None:
+        _index[path] = meta
+
+
+def put(path: str, meta: PageMeta) -> None:
+    _index[path] = meta
+
+
+def get(path: str) -> PageMeta | None:
+    return _index.get(path)
+
+
+def size() -> int:
+    return len(_index)
@@ -0,0 +1,283 @@
+"""HTTP cache for the site proxy (app.proxy), stdlib only.
+
+The catch-all proxy used to sit behind ``functools.cache``: the first response
+for a path was kept forever, with no size bound, whatever the method, query
+string or upstream headers said. This is a small shared cache in the sense of
+RFC 9111 instead:
+
+    request ──► storable_request()?  no ──► straight to upstream
+                    │ yes (GET, no Authorization, no Cookie)
+                    ▼
+                lookup(method, path, query, headers)
+                    ├─ fresh               ──► served from memory
+                    ├─ stale, has validator ──► conditional GET upstream
+                    │                             304 ──► refresh(), serve stored body
+                    │                             200 ──► store() replaces it
+                    └─ miss                 ──► GET upstream ──► store() if storable
+
+Keys are method + path + query plus the request headers the upstream response
+``Vary``-ed on (the names are remembered per URL, so the lookup knows which
+ones to read). Freshness comes from ``Cache-Control`` (``s-maxage``,
+``max-age``) or ``Expires``, else the usual 10 % of the Last-Modified age,
+capped. Responses that set cookies, are ``private``/``no-store``, ``Vary: *``
+or carry a status outside CACHEABLE_STATUS are never stored.
+
+Entries are LRU-evicted by body bytes. Not thread-safe on its own, but all
+callers run on the gevent hub of the one worker: no method yields.
+"""
+
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import TypedDict
+
+# The heuristically cacheable statuses (RFC 9110 §15.1). Others are not stored
+# even with a max-age: a 5xx the site sent during a deploy must not stick.
+CACHEABLE_STATUS = {200, 203, 204, 300, 301, 308, 404, 405, 410, 414}
+
+# Upstream headers kept with an entry: a 304 may omit them, and only updates
+# what it does send (RFC 9111 §4.3.4).
+POLICY_HEADERS = ("Cache-Control", "Expires", "Last-Modified", "ETag")
+
+# Heuristic freshness (no max-age/Expires, but Last-Modified) is capped here.
+HEURISTIC_MAX_SECONDS = 3600
+
+
+class CachedResponse(TypedDict):
+    status: int
+    headers: list[tuple[str, str]]  # as served to the client
+    body: bytes
+    policy: dict[str, str]  # POLICY_HEADERS as upstream last sent them
+    stored_at: float
+    expires_at: float
+
+
+def _directives(headers) -> dict[str, str | None]:
+    out: dict[str, str | None] = {}
+    for part in (headers.get("Cache-Control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            out[name.lower()] = value.strip('"') or None
+    return out
+
+
+def _http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _seconds(value: str | None) -> int | None:
+    try:
+        return max(int(value), 0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def storable_request(method: str, headers) -> bool:
+    """Only plain GETs are looked up; credentials bypass the cache (RFC 9111 §3.5).
+
+    Cookies count as credentials: the proxy forwards them, so the site may
+    answer per visitor without saying so in ``Vary``.
+    """
+    if method != "GET" or "Authorization" in headers or "Cookie" in headers:
+        return False
+    return "no-store" not in _directives(headers)
+
+
+def freshness_lifetime(headers, now: float) -> float | None:
+    """Seconds the response may be served without asking upstream.
+
+    ``None`` means it must not be stored at all; ``0`` means store, but
+    revalidate before every use.
+    """
+    cc = _directives(headers)
+    if "no-store" in cc or "private" in cc:
+        return None
+    if "no-cache" in cc:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if (seconds := _seconds(cc.get(name))) is not None:
+            return seconds
+    if "Expires" in headers:
+        # An invalid Expires ("0", "-1") means already expired.
+        expires = _http_date(headers.get("Expires"))
+        date = _http_date(headers.get("Date")) or now
+        return max(expires - date, 0) if expires is not None else 0
+    if (modified := _http_date(headers.get("Last-Modified"))) is not None:
+        date = _http_date(headers.get("Date")) or now
+        return min(max(date - modified, 0) / 10, HEURISTIC_MAX_SECONDS)
+    return 0
+
+
+def _age(headers) -> float:
+    return _seconds(headers.get("Age")) or 0
+
+
+def _policy(headers) -> dict[str, str]:
+    return {name: headers[name] for name in POLICY_HEADERS if headers.get(name)}
+
+
+def _vary(headers) -> tuple[str, ...] | None:
+    """Lower-cased header names the response varies on; ``None`` for ``Vary: *``."""
+    names = tuple(
+        sorted({n.strip().lower() for n in (headers.get("Vary") or "").split(",") if n.strip()})
+    )
+    return None if "*" in names else names
+
+
+class ProxyCache:
+    def __init__(self, max_bytes: int, max_entry_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+        # URL -> the header names its response varies on, and how many
+        # variants of it are stored (the name list goes with the last one).
+        self._vary: dict[tuple, tuple[str, ...]] = {}
+        self._variants: dict[tuple, int] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "stored": 0,
+            "evictions": 0,
+            "bytes": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, url: tuple, headers, names: tuple[str, ...]) -> tuple:
+        return (*url, tuple(headers.get(n) for n in names))
+
+    def lookup(
+        self, method: str, path: str, query: str, headers, now: float | None = None
+    ) -> tuple[CachedResponse | None, bool]:
+        """The stored response for this request and whether it is still fresh."""
+        url = (method, path, query)
+        names = self._vary.get(url)
+        entry = None if names is None else self._entries.get(self._key(url, headers, names))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None, False
+        self._entries.move_to_end(self._key(url, headers, names))
+        fresh = (time.time() if now is None else now) < entry["expires_at"]
+        if fresh:
+            self.stats["hits"] += 1
+        return entry, fresh
+
+    def validators(self, entry: CachedResponse | None) -> dict[str, str]:
+        """Conditional headers that ask upstream whether ``entry`` is still current."""
+        policy = entry["policy"] if entry else {}
+        out = {}
+        if "ETag" in policy:
+            out["If-None-Match"] = policy["ETag"]
+        if "Last-Modified" in policy:
+            out["If-Modified-Since"] = policy["Last-Modified"]
+        return out
+
+    def refresh(self, entry: CachedResponse, upstream_headers, now: float | None = None) -> None:
+        """Upstream answered 304: the stored body is current for a new lifetime."""
+        now = time.time() if now is None else now
+        entry["policy"].update(_policy(upstream_headers))
+        lifetime = freshness_lifetime(
+            {**entry["policy"], "Date": upstream_headers.get("Date")}, now
+        )
+        entry["stored_at"] = now
+        entry["expires_at"] = now + (lifetime or 0) - _age(upstream_headers)
+        self.stats["revalidated"] += 1
+
+    def admits(self, method: str, status: int, upstream_headers, now: float) -> bool:
+        """Whether a response with these headers would be stored — decided
+        before its body is read, so a streamed response knows whether to keep
+        a copy at all."""
+        if method != "GET" or status not in CACHEABLE_STATUS:
+            return False
+        if "Set-Cookie" in upstream_headers:
+            return False
+        length = _seconds(upstream_headers.get("Content-Length"))
+        if length is not None and length > self.max_entry_bytes:
+            return False
+        lifetime = freshness_lifetime(upstream_headers, now)
+        if lifetime is None or _vary(upstream_headers) is None:
+            return False
+        # Stale at once and nothing to revalidate with: storing would not save
+        # a single upstream request.
+        return lifetime > 0 or bool(
+            upstream_headers.get("ETag") or upstream_headers.get("Last-Modified")
+        )
+
+    def store(
+        self,
+        method: str,
+        path: str,
+        query: str,
+        request_headers,
+        status: int,
+        upstream_headers,
+        headers: list[tuple[str, str]],
+        body: bytes,
+        now: float | None = None,
+        encoded: bool = True,
+    ) -> bool:
+        """Keep the response if upstream allows it; ``False`` if it was not storable.
+
+        ``upstream_headers`` decide the policy; ``headers``/``body`` are what
+        the proxy actually serves (after its own rewriting). ``encoded``: the
+        body is in the coding negotiated from ``Accept-Encoding`` — kept per
+        coding, whatever upstream's ``Vary`` says; a decoded body serves all.
+        """
+        now = time.time() if now is None else now
+        if not self.admits(method, status, upstream_headers, now):
+            return False
+        if len(body) > self.max_entry_bytes:
+            return False
+        lifetime = freshness_lifetime(upstream_headers, now) or 0
+        names = {*(_vary(upstream_headers) or ())} - {"accept-encoding"}
+        names = tuple(sorted(names | {"accept-encoding"} if encoded else names))
+        policy = _policy(upstream_headers)
+
+        url = (method, path, query)
+        if url in self._vary and self._vary[url] != names:
+            self._drop_url(url)  # stored under the old Vary: unreachable now
+        self._vary[url] = names
+        key = self._key(url, request_headers, names)
+        self._discard(key)
+        self._variants[url] = self._variants.get(url, 0) + 1
+        self._entries[key] = {
+            "status": status,
+            "headers": list(headers),
+            "body": body,
+            "policy": policy,
+            "stored_at": now,
+            "expires_at": now + lifetime - _age(upstream_headers),
+        }
+        self.stats["bytes"] += len(body)
+        self.stats["stored"] += 1
+        while self.stats["bytes"] > self.max_bytes and len(self._entries) > 1:
+            self._discard(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+        return True
+
+    def _discard(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.stats["bytes"] -= len(entry["body"])
+        url = key[:3]
+        self._variants[url] -= 1
+        if not self._variants[url]:
+            del self._variants[url], self._vary[url]
+
+    def _drop_url(self, url: tuple) -> None:
+        for key in [k for k in self._entries if k[:3] == url]:
+            self._discard(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._vary.clear()
+        self._variants.clear()
+        self.stats["bytes"] = 0
@@ -0,0 +1,114 @@
+"""Content-coding negotiation for the site proxy (app.proxy).
+
+The proxy used to strip ``Content-Encoding`` and serve every body decoded —
+assets at full size, and rewritten HTML as plain UTF-8. Now:
+
+    client Accept-Encoding ──► negotiate() ──► "br" | "gzip" | "identity"
+                                                │
+                     upstream is asked for exactly that coding
+                                                │
+        ┌───────────────────────────────────────┴──────────────────────┐
+        ▼                                                              ▼
+    assets: upstream's bytes pass through              HTML: decoded, rewritten
+    untouched, Content-Encoding and                    (proxy_stream), then
+    Content-Length kept                                compress_stream() per chunk,
+                                                       or — served from the proxy
+                                                       cache — VariantCache: each
+                                                       page compressed once per coding
+
+Brotli needs the ``brotli`` package (pinned in _requirements.txt, the image
+Docker builds); without it only gzip is offered.
+"""
+
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Smaller bodies are not worth the header and the CPU.
+MIN_BYTES = 1024
+
+# Streamed HTML is compressed as it goes, so these are the fast levels; a page
+# served from the cache is compressed once per coding and may take longer.
+STREAM_LEVEL = {"gzip": 6, "br": 5}
+STORED_LEVEL = {"gzip": 9, "br": 9}
+
+
+def negotiate(accept_encodings) -> str:
+    """The coding to ask upstream for and to serve: the client's best of CODINGS.
+
+    ``accept_encodings`` is werkzeug's parsed ``request.accept_encodings``
+    (quality values and ``*`` honoured); ties go to brotli.
+    """
+    return accept_encodings.best_match(CODINGS) or "identity"
+
+
+def compress(body: bytes, coding: str, level: int | None = None) -> bytes:
+    if coding == "br":
+        return brotli.compress(
+            body, mode=brotli.MODE_TEXT, quality=level or STORED_LEVEL["br"]
+        )
+    if coding == "gzip":
+        compressor = zlib.compressobj(level or STORED_LEVEL["gzip"], zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    return body
+
+
+def compress_stream(chunks: Iterable[bytes], coding: str) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk.
+
+    Every input chunk is flushed through, so the client can render what
+    upstream has sent so far instead of waiting for the compressor's window.
+    """
+    if coding == "identity":
+        yield from chunks
+        return
+    if coding == "br":
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=STREAM_LEVEL["br"])
+        for chunk in chunks:
+            if out := compressor.process(chunk) + compressor.flush():
+                yield out
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(STREAM_LEVEL["gzip"], zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if out := compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH):
+            yield out
+    yield compressor.flush()
+
+
+class VariantCache:
+    """Compressed copies of bodies, keyed by content digest and coding.
+
+    Keyed by content rather than URL: a revalidated page that did not change
+    keeps its variants, a changed one simply misses. LRU by compressed bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._variants: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "bytes": 0}
+
+    def get(self, body: bytes, coding: str) -> bytes:
+        key = (hashlib.blake2b(body, digest_size=16).digest(), coding)
+        variant = self._variants.get(key)
+        if variant is not None:
+            self._variants.move_to_end(key)
+            self.stats["hits"] += 1
+            return variant
+        self.stats["misses"] += 1
+        variant = compress(body, coding)
+        if len(variant) <= self.max_bytes:
+            self._variants[key] = variant
+            self.stats["bytes"] += len(variant)
+            while self.stats["bytes"] > self.max_bytes:
+                _, dropped = self._variants.popitem(last=False)
+                self.stats["bytes"] -= len(dropped)
+        return variant
@@ -0,0 +1,105 @@
+"""Streaming pieces of the site proxy (app.proxy): a pooled upstream session,
+a chunk-wise text rewrite and a tee into the proxy cache.
+
+The proxy used to fetch every page with a one-off ``requests.request`` (new TCP
++ TLS handshake each time), wait for the whole body, and for HTML decode and
+re-encode it in full before sending the first byte. Now:
+
+    upstream ──► session (keep-alive pool) ──► iter_content(CHUNK_BYTES)
+                   │
+                   ├─ HTML ──► replace_stream(): ISO-8859-1 in, UTF-8 out,
+                   │           one chunk at a time
+                   └─ else ──► as is
+                   │
+                   ├─ storable (proxy_cache) ──► tee(): a copy is kept, up to
+                   │                              the cache's entry limit, and
+                   │                              stored when the body is complete
+                   ▼
+                client (chunked, first byte as soon as upstream sends it)
+
+Memory per request is one chunk plus the rewrite's look-behind — except for
+responses the cache keeps anyway.
+"""
+
+import codecs
+import http.cookiejar
+from typing import Callable, Iterable, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Upstream pages with a Content-Length are read in blocks of this size, so it
+# bounds the time to first byte as much as the memory per request.
+CHUNK_BYTES = 16 * 1024
+
+# Keep-alive connections to the site. Not a limit: with every pooled connection
+# busy, urllib3 opens another and drops it afterwards (pool_block=False).
+POOL_SIZE = 32
+
+
+def new_session() -> requests.Session:
+    """A session for proxying on behalf of MANY clients.
+
+    Its cookie jar refuses everything: a ``Set-Cookie`` meant for one visitor
+    must never ride along on the next visitor's request. Each request forwards
+    the client's own ``Cookie`` header instead.
+    """
+    session = requests.Session()
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    session.trust_env = False
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def replace_stream(
+    chunks: Iterable[bytes], old: str, new: str, encoding: str = "ISO-8859-1"
+) -> Iterator[bytes]:
+    """``bytes.decode(encoding).replace(old, new).encode()``, chunk by chunk.
+
+    Holds back the last ``len(old) - 1`` characters of each chunk, so a match
+    split across two chunks is still found; the output equals the one-shot
+    replace on the whole body.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    keep = len(old) - 1
+    tail = ""
+    for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        limit = len(text) - keep  # a match starting before this fits in ``text``
+        out = []
+        pos = 0
+        while (i := text.find(old, pos)) != -1 and i < limit:
+            out += (text[pos:i], new)
+            pos = i + len(old)
+        cut = max(pos, limit)
+        out.append(text[pos:cut])
+        tail = text[cut:]
+        if body := "".join(out):
+            yield body.encode("utf-8")
+    if tail := (tail + decoder.decode(b"", final=True)).replace(old, new):
+        yield tail.encode("utf-8")
+
+
+def tee(
+    chunks: Iterable[bytes], limit: int, on_complete: Callable[[bytes], None]
+) -> Iterator[bytes]:
+    """Pass ``chunks`` through; hand the whole body to ``on_complete`` at the end.
+
+    Only if the body stayed within ``limit`` bytes and was read to the end — a
+    client that disconnects mid-body leaves nothing behind.
+    """
+    kept: list[bytes] | None = []
+    size = 0
+    for chunk in chunks:
+        if kept is not None:
+            size += len(chunk)
+            if size <= limit:
+                kept.append(chunk)
+            else:
+                kept = None
+        yield chunk
+    if kept is not None:
+        on_complete(b"".join(kept))
+
@@ -13,9 +13,9 @@ The rejection is rendered per endpoint, because flask-limiter rejects in
   Kunden-Modus binding is cleared**. Skipping that unbind would make the
   endpoint fail open, which is exploitable from a shared egress IP.
 
-In-memory storage is correct only with a single worker process
-(WEB_CONCURRENCY=1, as deployed); with more workers the counters would not be
-shared.
+The counters live in process memory (``memory://``) for the single-worker
+deploy. With ``SHARED_STATE`` set they live in shared_state's SQLite file,
+which every worker process opens, so a limit holds per client across workers.
 
 Usage from app.py::
 
@@ -36,7 +36,8 @@ from flask_limiter import Limiter, RateLimitExceeded
 from flask_limiter.util import get_remote_address
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-from db_logging import log_messages, log_queue
+import shared_state
+from db_logging import log_queue
 
 MESSAGE_LIMIT = "200 per hour"
 
@@ -120,7 +121,7 @@ def _log_rejected_turn() -> None:
         if session_id and messages:
             rejected = dict(messages[-1])
             rejected["timestamp"] = time.time()
-            log_queue.put(lambda: log_messages(session_id, [rejected]))
+            log_queue.put((session_id, [rejected]))
     except Exception as exc:  # never let audit logging break the response
         print(f"Error logging rate-limited request: {exc}")
 
@@ -168,7 +169,7 @@ def init_app(app) -> Limiter:
         key_func=get_remote_address,
         app=app,
         default_limits=[],
-        storage_uri="memory://",
+        storage_uri=shared_state.limiter_uri(),
         # Global 200/h für ALLE Routen (Owner-Entscheidung 2026-08-02, hebt die
         # Kunden-Routen mit an). Grund für die Anhebung von 100 auf 200: ein
         # Agentur-Counter sitzt hinter EINER Büro-NAT — mehrere Reiseprofis
@@ -1,10 +1,18 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import TypedDict
+import queue
+import time
+from typing import Iterator, TypedDict
 
 from bs4 import BeautifulSoup
 
+import fanout
+import preview_index
+
 from agent_base import BASE_URL, find_trip_site, get_chamaeleon_website_html
 
+# All previews of one reply together, not per preview: a slow site costs the
+# reply at most this much, however many links it has.
+PREVIEW_DEADLINE_SECONDS = 5.0
+
 
 class RecommendationPreview(TypedDict):
     url: str
@@ -20,57 +28,102 @@ def make_recommendation_preview(recommendation: str) -> RecommendationPreview |
     The information we need is the trip title and the head image URL.
     """
 
-    try:
-        target = ""
-        if "#" in recommendation:
-            recommendation, _target = recommendation.split("#")
-            target = "#" + _target
-        site = find_trip_site(recommendation)
-    except ValueError:
-        print(f"Warning: No site found for recommendation '{recommendation}'")
-        return None  # No site found for the recommendation
+    target = ""
+    if "#" in recommendation:
+        recommendation, _target = recommendation.split("#")
+        target = "#" + _target
+
+    # Detected links are sitemap trip paths already: one dict lookup. Anything
+    # else (a partial path) is resolved against the sitemap first.
+    meta = preview_index.get(recommendation)
+    site = recommendation
+    if meta is None:
+        try:
+            site = find_trip_site(recommendation)
+        except ValueError:
+            print(f"Warning: No site found for recommendation '{recommendation}'")
+            return None  # No site found for the recommendation
+        meta = preview_index.get(site)
 
     try:
-        html = get_chamaeleon_website_html(site)
-        soup = BeautifulSoup(html, "html.parser")
+        if meta is None:
+            meta = _parse_page_meta(site)
+            preview_index.put(site, meta)
 
-        title_text = soup.find("title").get_text(strip=True).split("-")[0].strip()  # type: ignore
+        title_text = meta["title"].split("-")[0].strip()
         if len(title_text.split()) > 5:
             title_text = recommendation.split("/")[-1].replace("-ALL", "")
-        image_url: str = soup.find("meta", property="og:image")["content"]  # type: ignore
+        if not meta["image"]:
+            raise ValueError("no og:image")
 
         return {
             "url": BASE_URL + site + target,
             "title": title_text,
-            "image": image_url,
+            "image": meta["image"],
         }
     except Exception as e:
         print(f"Error creating preview for {recommendation}: {e}")
         return None
 
 
-def make_recommendation_previews_async(recommendations):
-    """
-    Create recommendation previews in parallel using ThreadPoolExecutor
+def _parse_page_meta(site: str) -> preview_index.PageMeta:
+    """The pre-index path: fetch the page and parse all of it."""
+    html = get_chamaeleon_website_html(site)
+    soup = BeautifulSoup(html, "html.parser")
+    image = soup.find("meta", property="og:image")
+    return {
+        "title": soup.find("title").get_text(strip=True),  # type: ignore
+        "image": image["content"] if image else None,  # type: ignore
+    }
+
+
+class PreviewStage:
+    """The link previews of one reply, built on the shared ``previews`` pool.
+
+    ``start`` submits each link as soon as it is known and returns at once;
+    ``ready`` then yields every preview the moment it is built, until all are
+    done or the stage's single deadline has passed. Previews still running
+    then finish on the pool and are dropped.
     """
-    if not recommendations:
-        return []
-
-    with ThreadPoolExecutor(max_workers=min(len(recommendations), 8)) as executor:
-        # Submit all preview generation tasks
-        future_to_rec = {
-            executor.submit(make_recommendation_preview, rec): rec
-            for rec in recommendations
-        }
 
-        previews = []
-        for future in future_to_rec:
+    def __init__(self, deadline: float = PREVIEW_DEADLINE_SECONDS):
+        self.deadline = deadline
+        self._results: queue.Queue = queue.Queue()
+        self._started: set[str] = set()
+        self._expires_at: float | None = None
+
+    def start(self, recommendations) -> None:
+        if self._expires_at is None:
+            self._expires_at = time.monotonic() + self.deadline
+        for rec in recommendations:
+            if rec not in self._started:
+                self._started.add(rec)
+                fanout.submit("previews", self._build, rec)
+
+    def _build(self, recommendation: str) -> None:
+        try:
+            preview = make_recommendation_preview(recommendation)
+        except Exception as e:
+            print(f"Error creating preview for {recommendation}: {e}")
+            preview = None
+        self._results.put(preview)
+
+    def ready(self) -> Iterator[RecommendationPreview]:
+        pending = len(self._started)
+        while pending:
+            remaining = self._expires_at - time.monotonic()
             try:
-                preview = future.result(timeout=5)  # 5 second timeout per preview
-                if preview:
-                    previews.append(preview)
-            except Exception as e:
-                rec = future_to_rec[future]
-                print(f"Error creating preview for {rec}: {e}")
-
-        return previews
+                preview = self._results.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                print(f"Warning: {pending} recommendation previews missed the deadline")
+                return
+            pending -= 1
+            if preview:
+                yield preview
+
+
+def make_recommendation_previews_async(recommendations) -> list[RecommendationPreview]:
+    """All previews that are ready within the deadline, in completion order."""
+    stage = PreviewStage()
+    stage.start(recommendations)
+    return list(stage.ready())
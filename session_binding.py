@@ -24,7 +24,24 @@ but NOT the unbind → verify → bind sequence:
 
 Same shared browser, same stored session_id, no attacker — just latency
 ordering. So an auth claims a generation up front and may only write its result
-if nothing superseded it. Newest auth wins, always.
+if nothing superseded it. Newest auth wins, always. With several worker
+processes (``shared``, see shared_state) the same race runs between processes,
+and the same check settles it: the store lock is then a write transaction on
+the file they share.
+
+A store can also carry an ``on_drop`` callback: anything keyed by the IDENTITY
+rather than the session (the prefetched Hop 1 in kundendaten/agenturdaten) has
+to be thrown away when the session that vouched for it lets go of it. It fires
+when a binding is unbound, expires on resolve, or is superseded — i.e. a newer
+auth for the same session commits a DIFFERENT outcome. A re-auth that lands on
+the same identity again is not a drop: the widget re-auths on every page view,
+and treating that as one would refetch on every click.
+
+Expired bindings are evicted by :func:`sweep` in O(expired) — through a lazy
+min-heap of expiries in process memory, through the indexed ``expires`` column
+in the shared file — rather than only when their session comes back, which
+sessions that never return would not. :func:`start_sweeper` runs it every
+SWEEP_INTERVAL_SECONDS; :func:`gauges` reports the size of a store.
 
 This store never logs. Every log line lives in the calling module, because only
 it knows which identity kind ("kunden_auth" / "agentur_auth") is being talked
@@ -32,28 +49,75 @@ about, and a shared line would either lie or need a label passed through six
 call sites.
 """
 
+import heapq
 import threading
 import time
 
+# How often start_sweeper() evicts expired bindings. Between sweeps an expired
+# binding is still never served: resolve() checks the expiry itself.
+SWEEP_INTERVAL_SECONDS = 300
+
 
-def new_store(ttl) -> dict:
+def new_store(ttl, on_drop=None, shared=None, name: str = "") -> dict:
     """A fresh binding store.
 
     ``ttl`` is seconds, either a number or a zero-argument callable. A callable
     is read **at bind time**, so a module constant stays the single source of
     truth even if it is reassigned after the store is built — snapshotting it
     here would silently freeze the value taken at import.
+
+    ``on_drop(identity)`` runs UNDER the store lock, so it is ordered against
+    :func:`if_bound`. It must be cheap and must not call back into the store.
+
+    ``shared`` (a :class:`shared_state.SharedState`) keeps the maps in the
+    SQLite file every worker process opens, under ``name``; the lock is then a
+    write transaction on that file, so every rule below holds across processes.
+    ``on_drop`` still fires only in the process that dropped the binding — the
+    prefetch it clears is per process, and is only ever served to a session
+    that still resolves to its identity (``if_bound``).
     """
+    if shared is not None:
+        counters = shared.map(f"{name}:counters")
+        counters.setdefault("seq", 0)
+        counters.setdefault("evicted", 0)
+        return {
+            "name": name,
+            "ttl": ttl,
+            "bindings": shared.map(f"{name}:bindings", expires_of=lambda entry: entry[1]),
+            # No heap: the bindings' expires column is indexed (sweep).
+            "expiries": None,
+            "inflight": shared.map(f"{name}:inflight"),
+            "replaced": shared.map(f"{name}:replaced"),
+            "on_drop": on_drop,
+            "counters": counters,
+            "lock": shared.lock,
+            # Read-only paths: ordered within the process, no write transaction.
+            "local_lock": shared.local_lock,
+        }
+    lock = threading.Lock()
     return {
+        "name": name,
         "ttl": ttl,
-        # session_id -> (identity, expiry_epoch). In-memory, single-worker deploy
-        # (see rate_limit.py); cleared on restart → fail closed, widget re-auths.
+        # session_id -> (identity, expiry_epoch). In process memory: one worker
+        # only (SHARED_STATE=off); cleared on restart → fail closed, re-auth.
         "bindings": {},
+        # Lazy min-heap of (expiry_epoch, session_id), one entry per write. An
+        # entry whose binding was since rewritten or removed is stale and
+        # skipped when it surfaces (as in chat_sessions.SessionStore).
+        "expiries": [],
         # session_id -> generation of the auth currently in flight for it.
         # Entries are removed the moment an auth settles, so this never grows.
         "inflight": {},
-        "seq": 0,
-        "lock": threading.Lock(),
+        # session_id -> identity that begin() took off this session, until the
+        # auth settles. Lets commit() tell "re-auth, same person" from "someone
+        # else now" without keeping the old binding readable in between.
+        "replaced": {},
+        "on_drop": on_drop,
+        # "seq": the last generation handed out; "evicted": expired bindings
+        # removed so far (by sweep or by resolve).
+        "counters": {"seq": 0, "evicted": 0},
+        "lock": lock,
+        "local_lock": lock,
     }
 
 
@@ -62,6 +126,37 @@ def _expiry(store: dict) -> float:
     return time.time() + (ttl() if callable(ttl) else ttl)
 
 
+def _put(store: dict, session_id: str, identity: str) -> None:
+    """Write a binding with a fresh expiry. Caller holds the lock."""
+    expiry = _expiry(store)
+    store["bindings"][session_id] = (identity, expiry)
+    expiries = store["expiries"]
+    if expiries is None:
+        return
+    heapq.heappush(expiries, (expiry, session_id))
+    # Re-auths on every page view push a new entry each; rebuild once stale
+    # ones dominate, so the heap stays proportional to the live bindings.
+    if len(expiries) > 4 * len(store["bindings"]) + 64:
+        expiries[:] = [(entry[1], sid) for sid, entry in store["bindings"].items()]
+        heapq.heapify(expiries)
+
+
+def _evict(store: dict, session_id: str, identity: str) -> None:
+    """Remove an expired binding. Caller holds the lock."""
+    del store["bindings"][session_id]
+    store["counters"]["evicted"] += 1
+    _dropped(store, identity)
+
+
+def _dropped(store: dict, *identities) -> None:
+    """Fire ``on_drop`` for each non-empty identity. Caller holds the lock."""
+    on_drop = store["on_drop"]
+    if on_drop is None:
+        return
+    for identity in set(filter(None, identities)):
+        on_drop(identity)
+
+
 def unbind(store: dict, session_id: str) -> None:
     """Drop any binding for this session and cancel any auth in flight for it.
 
@@ -79,8 +174,13 @@ def unbind(store: dict, session_id: str) -> None:
     if not session_id:
         return
     with store["lock"]:
-        store["bindings"].pop(session_id, None)
+        entry = store["bindings"].pop(session_id, None)
         store["inflight"].pop(session_id, None)
+        _dropped(
+            store,
+            entry and entry[0],
+            store["replaced"].pop(session_id, None),
+        )
 
 
 def begin(store: dict, session_id: str) -> int:
@@ -94,10 +194,15 @@ def begin(store: dict, session_id: str) -> int:
     if not session_id:
         return 0
     with store["lock"]:
-        store["bindings"].pop(session_id, None)
-        store["seq"] += 1
-        store["inflight"][session_id] = store["seq"]
-        return store["seq"]
+        entry = store["bindings"].pop(session_id, None)
+        # setdefault: two begins before any commit must remember the identity
+        # the session had BEFORE the first, not the nothing between them.
+        if entry:
+            store["replaced"].setdefault(session_id, entry[0])
+        generation = store["counters"]["seq"] + 1
+        store["counters"]["seq"] = generation
+        store["inflight"][session_id] = generation
+        return generation
 
 
 def commit(store: dict, session_id: str, identity: str, generation: int) -> bool:
@@ -113,8 +218,11 @@ def commit(store: dict, session_id: str, identity: str, generation: int) -> bool
         if store["inflight"].get(session_id) != generation:
             return False
         del store["inflight"][session_id]
+        previous = store["replaced"].pop(session_id, None)
+        if previous != identity:
+            _dropped(store, previous)
         if identity:
-            store["bindings"][session_id] = (identity, _expiry(store))
+            _put(store, session_id, identity)
         return True
 
 
@@ -127,7 +235,10 @@ def bind(store: dict, session_id: str, identity: str) -> None:
     if not session_id or not identity:
         return
     with store["lock"]:
-        store["bindings"][session_id] = (identity, _expiry(store))
+        entry = store["bindings"].get(session_id)
+        if entry and entry[0] != identity:
+            _dropped(store, entry[0])
+        _put(store, session_id, identity)
 
 
 def resolve(store: dict, session_id: str) -> str | None:
@@ -140,6 +251,95 @@ def resolve(store: dict, session_id: str) -> str | None:
             return None
         identity, expiry = entry
         if time.time() >= expiry:
-            del store["bindings"][session_id]
+            _evict(store, session_id, identity)
             return None
         return identity
+
+
+def if_bound(store: dict, session_id: str, identity: str, fn) -> bool:
+    """Run ``fn()`` under the lock iff this session is bound to ``identity`` now.
+
+    For work that finishes AFTER the auth returned — a background prefetch —
+    and may only land if the session still vouches for that identity. Holding
+    the lock orders it against ``on_drop``: either the drop runs first and this
+    refuses, or this runs first and the drop then clears what ``fn`` stored.
+    An auth in flight counts as not bound; its commit will decide.
+
+    Read-only, so it takes the process-local lock, never a write transaction:
+    ``on_drop`` and what ``fn`` stores are both per process anyway.
+    """
+    if not session_id or not identity:
+        return False
+    with store["local_lock"]:
+        if session_id in store["inflight"]:
+            return False
+        entry = store["bindings"].get(session_id)
+        if entry is None or entry[0] != identity or time.time() >= entry[1]:
+            return False
+        fn()
+        return True
+
+
+def sweep(store: dict, now: float | None = None) -> int:
+    """Evict every binding that has expired; returns how many.
+
+    Cost is proportional to what expired, not to the store: the heap (or, when
+    shared, the index) yields expired entries oldest first and stops at the
+    first live one. ``on_drop`` fires for each, as on an expiring resolve.
+    """
+    now = time.time() if now is None else now
+    evicted = 0
+    with store["lock"]:
+        bindings = store["bindings"]
+        expiries = store["expiries"]
+        if expiries is None:
+            due = bindings.expired(now)
+        else:
+            due = []
+            while expiries and expiries[0][0] <= now:
+                expiry, session_id = heapq.heappop(expiries)
+                entry = bindings.get(session_id)
+                if entry is not None and entry[1] == expiry:
+                    due.append((session_id, entry))
+        for session_id, (identity, _) in due:
+            _evict(store, session_id, identity)
+            evicted += 1
+    return evicted
+
+
+def gauges(store: dict) -> dict[str, int]:
+    """Current size of the store: bindings, auths in flight, evictions so far."""
+    with store["local_lock"]:
+        return {
+            "bindings": len(store["bindings"]),
+            "inflight": len(store["inflight"]),
+            "evicted": store["counters"]["evicted"],
+        }
+
+
+_sweeper = None
+
+
+def start_sweeper(*sweeps):
+    """Run each zero-argument ``sweeps`` callable every SWEEP_INTERVAL_SECONDS.
+
+    The callables are the identity modules' own ``sweep()`` wrappers, which
+    log; this module does not. Idempotent per process.
+    """
+    global _sweeper
+    if _sweeper is not None:
+        return _sweeper
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    _sweeper = BackgroundScheduler()
+    for fn in sweeps:
+        _sweeper.add_job(
+            fn,
+            "interval",
+            seconds=SWEEP_INTERVAL_SECONDS,
+            id=f"session-binding-sweep-{fn.__module__}",
+            max_instances=1,
+            coalesce=True,
+        )
+    _sweeper.start()
+    return _sweeper
@@ -0,0 +1,297 @@
+"""State shared by every worker process: rate-limit counters, session bindings.
+
+Rate limiting counted in flask-limiter's ``memory://`` storage and the Kunden/
+Agentur bindings lived in plain dicts (session_binding), so each gunicorn worker
+had its own: a second worker would double every limit and not know a session
+the first one had verified. That pinned the deploy to ``WEB_CONCURRENCY=1``.
+Both now live in one SQLite file in WAL mode, which every worker on the host
+opens:
+
+    flask-limiter ──► storage_uri "sqlite:///<path>" ──► SqliteStorage ──► limits table
+    session_binding store ──► SharedMap views ─────────────────────────► kv table
+                              store["lock"] = a write transaction
+                              (BEGIN IMMEDIATE: one writer across ALL processes)
+
+``store["lock"]`` keeps its meaning — everything session_binding does under it
+(begin, commit, the generation check, if_bound) is one transaction, so
+"newest auth wins" holds across processes exactly as it did across greenlets.
+
+Opt-in: ``SHARED_STATE`` names the file (e.g. ``.shared_state.sqlite3``) and
+is needed only for ``WEB_CONCURRENCY > 1``. Unset (or ``off``) keeps both in
+process memory, which is what the single-worker deploy runs. Each process
+must open its own connection: import the app in the worker (gunicorn's
+default), not before the fork (``--preload``).
+
+The worker is gevent: a blocking sqlite busy-wait would stall every greenlet
+of the process, not just the one waiting. So the connection never waits
+inside sqlite (``timeout=0``); a busy database is retried with ``time.sleep``
+— cooperative under gevent — for at most BUSY_TIMEOUT_SECONDS. Reads run
+outside any write transaction (WAL readers never wait for the writer).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterator, MutableMapping
+
+from limits.storage import Storage
+
+SHARED_STATE = os.getenv("SHARED_STATE", "").strip() or "off"
+
+# How long a write waits for another process's transaction, in short sleeps.
+BUSY_TIMEOUT_SECONDS = 2.0
+
+_SCHEMA = """
+create table if not exists kv (
+    ns      text not null,
+    key     text not null,
+    value   text not null,
+    expires real,
+    primary key (ns, key)
+);
+create index if not exists kv_expires on kv (ns, expires) where expires is not null;
+create table if not exists limits (
+    key     text primary key,
+    count   integer not null,
+    expires real not null
+);
+create index if not exists limits_expires on limits (expires);
+"""
+
+
+def _busy(e: sqlite3.OperationalError) -> bool:
+    return "locked" in str(e) or "busy" in str(e)
+
+
+def _retrying(fn):
+    """``fn()``, retried with cooperative sleeps while the database is busy."""
+    deadline = time.monotonic() + BUSY_TIMEOUT_SECONDS
+    delay = 0.001
+    while True:
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not _busy(e) or time.monotonic() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+class _Transaction:
+    """``with state.lock:`` — one write transaction, serialised across processes."""
+
+    def __init__(self, state: "SharedState"):
+        self._state = state
+
+    def __enter__(self):
+        self._state._lock.acquire()
+        try:
+            _retrying(lambda: self._state._db.execute("BEGIN IMMEDIATE"))
+        except BaseException:
+            self._state._lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _retrying(lambda: self._state._db.execute("ROLLBACK" if exc_type else "COMMIT"))
+        finally:
+            self._state._lock.release()
+        return False
+
+
+class SharedState:
+    def __init__(self, path: str):
+        self.path = path
+        # One connection per process. Re-entrant: map operations run inside a
+        # transaction that the same greenlet/thread already holds.
+        # ``local_lock`` alone orders work within this process without a write
+        # transaction (session_binding's if_bound and gauges).
+        self._lock = self.local_lock = threading.RLock()
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=0
+        )
+        _retrying(lambda: self._db.execute("PRAGMA journal_mode=WAL"))
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        _retrying(lambda: self._db.executescript(_SCHEMA))
+        self.lock = _Transaction(self)
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return _retrying(lambda: self._db.execute(sql, params))
+
+    def map(self, ns: str, expires_of: Callable[[object], float] | None = None) -> "SharedMap":
+        return SharedMap(self, ns, expires_of)
+
+
+def _decode(value: str):
+    decoded = json.loads(value)
+    # Stored tuples come back as tuples, as the in-memory dicts hold them.
+    return tuple(decoded) if isinstance(decoded, list) else decoded
+
+
+class SharedMap(MutableMapping):
+    """A dict-like view of one namespace of the kv table.
+
+    ``expires_of(value)`` fills the indexed ``expires`` column, so expired
+    entries can be found without a scan (see :meth:`expired`).
+    """
+
+    def __init__(self, state: SharedState, ns: str, expires_of=None):
+        self._state = state
+        self.ns = ns
+        self._expires_of = expires_of
+
+    def __getitem__(self, key):
+        row = self._state.execute(
+            "select value from kv where ns = ? and key = ?", (self.ns, key)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return _decode(row[0])
+
+    def __setitem__(self, key, value):
+        expires = self._expires_of(value) if self._expires_of else None
+        self._state.execute(
+            "insert or replace into kv (ns, key, value, expires) values (?, ?, ?, ?)",
+            (self.ns, key, json.dumps(value), expires),
+        )
+
+    def __delitem__(self, key):
+        if not self._state.execute(
+            "delete from kv where ns = ? and key = ?", (self.ns, key)
+        ).rowcount:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return (
+            self._state.execute(
+                "select 1 from kv where ns = ? and key = ?", (self.ns, key)
+            ).fetchone()
+            is not None
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._state.execute("select key from kv where ns = ?", (self.ns,)).fetchall()
+        return iter([key for (key,) in rows])
+
+    def __len__(self) -> int:
+        return self._state.execute("select count(*) from kv where ns = ?", (self.ns,)).fetchone()[0]
+
+    def setdefault(self, key, default=None):
+        # One statement, not get-then-set: workers booting together must not
+        # reset a value another one has already moved on from.
+        expires = self._expires_of(default) if self._expires_of else None
+        self._state.execute(
+            "insert or ignore into kv (ns, key, value, expires) values (?, ?, ?, ?)",
+            (self.ns, key, json.dumps(default), expires),
+        )
+        return self[key]
+
+    def clear(self) -> None:
+        self._state.execute("delete from kv where ns = ?", (self.ns,))
+
+    def discard_expired(self, now: float) -> int:
+        """Delete entries whose ``expires`` has passed — an index range scan."""
+        return self._state.execute(
+            "delete from kv where ns = ? and expires is not null and expires <= ?",
+            (self.ns, now),
+        ).rowcount
+
+    def expired(self, now: float) -> list[tuple[str, object]]:
+        """Entries whose ``expires`` has passed, oldest first — an index range scan."""
+        rows = self._state.execute(
+            "select key, value from kv where ns = ? and expires is not null and expires <= ?"
+            " order by expires",
+            (self.ns, now),
+        ).fetchall()
+        return [(key, _decode(value)) for key, value in rows]
+
+
+_states: dict[str, SharedState] = {}
+_states_lock = threading.Lock()
+
+
+def open_state(path: str) -> SharedState:
+    """The process's one SharedState for ``path``."""
+    path = os.path.abspath(path)
+    with _states_lock:
+        state = _states.get(path)
+        if state is None:
+            state = _states[path] = SharedState(path)
+        return state
+
+
+def get() -> SharedState | None:
+    """The configured shared state, or ``None`` for ``SHARED_STATE=off``."""
+    if SHARED_STATE == "off":
+        return None
+    return open_state(SHARED_STATE)
+
+
+def limiter_uri() -> str:
+    """flask-limiter ``storage_uri`` for the configured state."""
+    if SHARED_STATE == "off":
+        return "memory://"
+    return "sqlite:///" + os.path.abspath(SHARED_STATE)
+
+
+class SqliteStorage(Storage):
+    """flask-limiter / limits storage on the shared SQLite file (fixed window)."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._state = open_state(uri[len("sqlite://") :])
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        with self._state.lock:
+            # Windows that have run out, through the index: O(expired).
+            self._state.execute("delete from limits where expires <= ?", (now,))
+            row = self._state.execute(
+                "select count from limits where key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._state.execute(
+                    "insert into limits (key, count, expires) values (?, ?, ?)",
+                    (key, amount, now + expiry),
+                )
+                return amount
+            self._state.execute(
+                "update limits set count = count + ? where key = ?", (amount, key)
+            )
+            return row[0] + amount
+
+    def get(self, key: str) -> int:
+        row = self._state.execute(
+            "select count from limits where key = ? and expires > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._state.execute(
+            "select expires from limits where key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._state.execute("select 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int | None:
+        with self._state.lock:
+            return self._state.execute("delete from limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._state.execute("delete from limits where key = ?", (key,))
@@ -0,0 +1,116 @@
+"""Coalesce concurrent identical fetches into one, gevent-aware.
+
+With up to 1000 connections on one gevent worker (see session_binding), a
+burst on one page used to mean N identical requests to www.chamaeleon-reisen.de
+— every caller missed the same cache at the same moment and fetched on its own.
+A :class:`Group` lets the first caller of a key (the *leader*) do the work while
+every later caller of the same key (a *follower*) waits for it:
+
+    caller 1 ──► begin(key): leader ──► fetch ──► end(key, result | error)
+    caller 2 ──► begin(key): follower ──► wait ─────────┤
+    caller 3 ──► begin(key): follower ──► wait ─────────┘  same result / error
+
+Errors reach every waiter: the leader's exception is raised in each follower
+too. A follower waits at most ``timeout`` seconds — a stuck leader then costs
+it one uncoalesced call of its own, never an error (``do``) — and the key is
+free again the moment the leader ends, so nothing here caches: callers keep
+their own caches (proxy_cache, ttl_cache) and use a group only for the miss.
+
+The lock and event are ``threading`` ones, i.e. greenlet primitives once
+gevent has patched the worker; a follower waiting costs no OS thread.
+"""
+
+import threading
+from typing import Callable, Hashable, TypeVar
+
+R = TypeVar("R")
+
+
+class Timeout(Exception):
+    """A follower gave up waiting for its leader.
+
+    Its own type, not ``TimeoutError``: a leader's socket timeout is shared
+    with the followers as an ERROR and must not be mistaken for this.
+    """
+
+
+class Flight:
+    def __init__(self):
+        self._done = threading.Event()
+        self._result: object = None
+        self._error: BaseException | None = None
+
+    def wait(self, timeout: float):
+        """The leader's result; its exception re-raised; :class:`Timeout` after ``timeout``."""
+        if not self._done.wait(timeout):
+            raise Timeout(f"singleflight leader still busy after {timeout}s")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Group:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[Hashable, Flight] = {}
+        self.stats = {"leaders": 0, "followers": 0, "errors": 0, "timeouts": 0}
+
+    def begin(self, key: Hashable) -> tuple[Flight, bool]:
+        """Join the flight for ``key``; ``True`` if the caller leads it and must :meth:`end` it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.stats["followers"] += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.stats["leaders"] += 1
+            return flight, True
+
+    def end(
+        self,
+        key: Hashable,
+        flight: Flight,
+        result: object = None,
+        error: BaseException | None = None,
+    ) -> None:
+        """Release every follower of ``flight``. Idempotent."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if flight._done.is_set():
+                return
+            flight._result, flight._error = result, error
+            if error is not None:
+                self.stats["errors"] += 1
+        flight._done.set()
+
+    def wait(self, flight: Flight, timeout: float):
+        try:
+            return flight.wait(timeout)
+        except Timeout:
+            self.stats["timeouts"] += 1
+            raise
+
+    def do(self, key: Hashable, fn: Callable[[], R], timeout: float) -> R:
+        """``fn()``, but at most one call per ``key`` at a time; the rest share it."""
+        flight, leader = self.begin(key)
+        if not leader:
+            try:
+                return self.wait(flight, timeout)
+            except Timeout:
+                return fn()
+        try:
+            result = fn()
+        except Exception as e:
+            self.end(key, flight, error=e)
+            raise
+        except BaseException:
+            # Killed (GreenletExit, KeyboardInterrupt): not the followers' to re-raise.
+            self.end(key, flight, error=RuntimeError("singleflight leader aborted"))
+            raise
+        self.end(key, flight, result=result)
+        return result
+
+    def __len__(self) -> int:
+        """Flights in progress."""
+        return len(self._flights)
@@ -24,10 +24,16 @@ cannot run DDL):
     -- service-role key bypasses RLS; no public policies on purpose.
 """
 
+import time
+
 from db_logging import supabase  # single initialised client for the process
 
 TABLE = "sitemap_versions"
 
+# Bumped by every successful save: the admin view's HTTP validator (dashboard).
+generation = 0
+saved_at = time.time()
+
 
 def load_latest() -> dict | None:
     """The newest version row ({sitemap_text, source, created_at}) or None."""
@@ -53,8 +59,11 @@ def save_version(text: str, source: str, summary: dict | None = None) -> bool:
         row["added"] = summary.get("added") or []
         row["dropped"] = summary.get("dropped_404") or []
         row["kept"] = summary.get("kept_despite_absent") or []
+    global generation, saved_at
     try:
         supabase.table(TABLE).insert(row).execute()
+        generation += 1
+        saved_at = time.time()
         return True
     except Exception as e:
         print(f"[sitemap-store] save failed: {e}")
@@ -25,7 +25,8 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from bs4 import BeautifulSoup
+
+import html_engine
 
 BASE_URL = "https://www.chamaeleon-reisen.de"
 LIVE_SITEMAP_PATH = "/Sitemap"
@@ -70,10 +71,9 @@ def fetch_live_sitemap(timeout: int = 20) -> set[str]:
     )
     resp.raise_for_status()
     html = resp.content.decode("ISO-8859-1")
-    soup = BeautifulSoup(html, "html.parser")
     paths: set[str] = set()
-    for a in soup.find_all("a", href=True):
-        path = _normalize(a["href"])
+    for href in html_engine.links(html):
+        path = _normalize(href)
         if path and path != "/":
             paths.add(path)
     return paths
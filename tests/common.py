@@ -1,3 +1,13 @@
+import os
 from sys import path
 
 path.append(".")
+
+# Keine Hintergrund-Abrufe gegen TourOne aus Auth-Tests: eine erfolgreiche Auth
+# würde sonst Hop 1 vorwärmen (kundendaten.PREFETCH_HOP1). Tests, die genau das
+# prüfen, schalten es gezielt ein.
+os.environ.setdefault("TOURONE_PREFETCH", "0")
+
+# Kein Spool-File im Arbeitsverzeichnis aus Tests: db_logging würde beim Import
+# eins anlegen. tests/test_db_logging.py prüft den Spool mit tmp_path.
+os.environ.setdefault("CHAT_LOG_SPOOL", "off")
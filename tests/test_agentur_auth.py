@@ -199,6 +199,59 @@ def test_abgelaufene_bindung_wird_beim_lesen_entfernt():
     assert "alt" not in store["bindings"]
 
 
+def test_sweep_entfernt_nur_abgelaufene_bindungen_und_zaehlt_sie():
+    """Sessions, die nie wiederkommen, bleiben nicht für die Prozesslaufzeit liegen."""
+    ttl = [100]
+    gedroppt = []
+    store = session_binding.new_store(lambda: ttl[0], on_drop=gedroppt.append)
+    session_binding.bind(store, "lebt", "id-1")
+    ttl[0] = -1
+    session_binding.bind(store, "weg-1", "id-2")
+    session_binding.bind(store, "weg-2", "id-3")
+    assert session_binding.sweep(store) == 2
+    assert list(store["bindings"]) == ["lebt"]
+    assert sorted(gedroppt) == ["id-2", "id-3"]
+    assert session_binding.gauges(store) == {"bindings": 1, "inflight": 0, "evicted": 2}
+    assert session_binding.sweep(store) == 0
+
+
+def test_sweep_ueberspringt_veraltete_heap_eintraege():
+    """Eine neu gebundene Session darf nicht mit seinem alten Ablauf fallen."""
+    ttl = [-1]
+    store = session_binding.new_store(lambda: ttl[0])
+    session_binding.bind(store, "s", "id-1")
+    ttl[0] = 100
+    session_binding.bind(store, "s", "id-1")  # Re-Auth: neuer Ablauf
+    assert session_binding.sweep(store) == 0
+    assert session_binding.resolve(store, "s") == "id-1"
+
+
+def test_sweep_kostet_nur_die_abgelaufenen():
+    ttl = [-1]
+    store = session_binding.new_store(lambda: ttl[0])
+    session_binding.bind(store, "alt", "id")
+    ttl[0] = 100
+    for i in range(1000):
+        session_binding.bind(store, f"s{i}", "id")
+    vorher = len(store["expiries"])
+    assert session_binding.sweep(store) == 1
+    assert len(store["expiries"]) == vorher - 1  # nur der eine Eintrag angefasst
+
+
+def test_heap_waechst_nicht_mit_jeder_re_auth():
+    store = session_binding.new_store(100)
+    for _ in range(10_000):
+        session_binding.bind(store, "s", "id-1")
+    assert len(store["expiries"]) <= 4 * len(store["bindings"]) + 64
+
+
+def test_gauges_zaehlen_laufende_auths():
+    store = session_binding.new_store(60)
+    session_binding.begin(store, "s")
+    assert session_binding.gauges(store)["inflight"] == 1
+    assert aa.binding_gauges().keys() == {"bindings", "inflight", "evicted"}
+
+
 def test_die_dicts_werden_nie_ersetzt_nur_mutiert():
     """Genau das macht die Modul-Aliase in kunden_auth/agentur_auth sicher."""
     store = session_binding.new_store(60)
@@ -355,3 +408,65 @@ def test_die_bindung_ist_waehrend_ss_php_schon_geloest(monkeypatch):
     assert gesehen["waehrend"] is None, "Vor-Agentur war während ss.php noch gebunden"
     assert aa.resolve("clear-first-agt") == "22222"
     aa.unbind("clear-first-agt")
+
+
+def test_on_drop_bei_unbind_ablauf_und_anderer_identitaet():
+    import time
+
+    gedroppt = []
+    store = session_binding.new_store(60, on_drop=gedroppt.append)
+
+    gen = session_binding.begin(store, "s")
+    session_binding.commit(store, "s", "id-1", gen)
+    # Re-Auth auf dieselbe Identität ist kein Drop.
+    gen = session_binding.begin(store, "s")
+    session_binding.commit(store, "s", "id-1", gen)
+    assert gedroppt == []
+
+    gen = session_binding.begin(store, "s")
+    session_binding.commit(store, "s", "id-2", gen)
+    assert gedroppt == ["id-1"]
+
+    session_binding.unbind(store, "s")
+    assert gedroppt == ["id-1", "id-2"]
+
+    store["bindings"]["alt"] = ("id-3", time.time() - 1)
+    session_binding.resolve(store, "alt")
+    assert gedroppt[-1] == "id-3"
+
+
+def test_on_drop_wenn_auth_nach_begin_per_unbind_abbricht():
+    """begin hat die alte Bindung schon genommen — unbind muss sie trotzdem melden."""
+    gedroppt = []
+    store = session_binding.new_store(60, on_drop=gedroppt.append)
+    session_binding.bind(store, "s", "id-1")
+    gen = session_binding.begin(store, "s")
+    session_binding.unbind(store, "s")
+    assert gedroppt == ["id-1"]
+    assert session_binding.commit(store, "s", "id-1", gen) is False
+    assert store["replaced"] == {}
+
+
+def test_if_bound_nur_bei_aktueller_bindung_ohne_laufende_auth():
+    store = session_binding.new_store(60)
+    gelaufen = []
+    session_binding.bind(store, "s", "id-1")
+    assert session_binding.if_bound(store, "s", "id-1", lambda: gelaufen.append(1))
+    assert not session_binding.if_bound(store, "s", "id-2", lambda: gelaufen.append(2))
+    session_binding.begin(store, "s")
+    assert not session_binding.if_bound(store, "s", "id-1", lambda: gelaufen.append(3))
+    assert gelaufen == [1]
+
+
+def test_vorgewaermte_agenturseite_durchlaeuft_weiter_g3(monkeypatch):
+    """Der Cache hält die ROHE Hop-1-Seite; G3 prüft bei jedem Lesen neu."""
+    import time
+
+    import agenturdaten as ad
+
+    fremd = {"0": {"ACTION": {"AgenturNummer": "99999"}}, "anzahl": 1}
+    monkeypatch.setattr(ad, "_warm", {"12345": (fremd, time.time() + 60)})
+    monkeypatch.setattr(
+        ad, "_tourone_get", lambda *a, **kw: (_ for _ in ()).throw(AssertionError)
+    )
+    assert ad.fetch_buchungen_text("12345") == ad.G3_FEHLER_TEXT
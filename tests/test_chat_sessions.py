@@ -0,0 +1,149 @@
+"""Tests for the chat session store (chat_sessions.py): both expiry horizons
+and the history byte budget. Pure in-memory, no Supabase."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import os
+import tracemalloc
+
+from chat_sessions import SessionStore, pack_history, unpack_history
+
+
+def _msg(text):
+    return {"role": "user", "content": text, "timestamp": 1.0}
+
+
+def _store(budget=10_000):
+    return SessionStore(session_ttl=100, history_ttl=10, history_budget=budget)
+
+
+def test_history_expires_after_inactivity_but_the_session_stays():
+    store = _store()
+    store.add("s", "row", created_at=0, last_active=0, history=[_msg("a")])
+    store.prune(now=5)
+    assert store.history("s") == [_msg("a")]
+    store.prune(now=11)
+    assert store.history("s") is None
+    assert "s" in store
+    assert store.stats["bytes"] == 0
+    assert store.stats["history_expired"] == 1
+
+
+def test_touch_postpones_history_expiry():
+    store = _store()
+    store.add("s", "row", created_at=0, last_active=0, history=[_msg("a")])
+    store.touch("s", now=8)
+    store.prune(now=11)  # the entry from add() surfaces stale and is skipped
+    assert store.history("s") is not None
+    store.prune(now=19)
+    assert store.history("s") is None
+
+
+def test_session_expires_after_its_creation_horizon():
+    store = _store()
+    store.add("old", "r1", created_at=0, last_active=0)
+    store.add("new", "r2", created_at=50, last_active=50)
+    store.touch("old", now=99)  # activity does not extend the row horizon
+    store.prune(now=100)
+    assert "old" not in store and "new" in store
+    assert store.stats["sessions_expired"] == 1
+
+
+def test_over_budget_evicts_the_least_recently_used_history():
+    one = len(pack_history([_msg("x" * 100)]))
+    store = _store(budget=2 * one)
+    for sid in ("a", "b", "c"):
+        store.add(sid, sid, created_at=0, last_active=0)
+    store.set_history("a", [_msg("x" * 100)])
+    store.set_history("b", [_msg("x" * 100)])
+    assert store.history("a")  # a is now more recent than b
+    store.set_history("c", [_msg("x" * 100)])
+    assert store.history("b") is None
+    assert store.history("a") and store.history("c")
+    assert store.stats["evictions"] == 1
+    assert store.stats["bytes"] == 2 * one
+
+
+def test_extend_recharges_the_merged_history():
+    store = _store()
+    store.add("s", "row", created_at=0, last_active=0, history=[_msg("a")])
+    store.extend_history("s", [_msg("b")])
+    assert store.stats["bytes"] == len(pack_history([_msg("a"), _msg("b")]))
+    assert store.history("s") == [_msg("a"), _msg("b")]
+
+
+def test_a_chatty_session_does_not_grow_the_heap_without_bound():
+    store = _store()
+    store.add("s", "row", created_at=0, last_active=0)
+    for i in range(10_000):
+        store.touch("s", now=i / 1000)
+    assert len(store._history_heap) < 100
+
+
+def test_resident_memory_stays_near_the_budget():
+    budget = 200_000
+    store = _store(budget=budget)
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        for i in range(500):
+            sid = f"s{i}"
+            store.add(sid, sid, created_at=0, last_active=0)
+            # Incompressible-ish: the budget must hold on real bytes, not on
+            # what zlib makes of repeated characters.
+            store.set_history(sid, [_msg(f"{i}-" + os.urandom(1000).hex())])
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert store.stats["bytes"] <= budget
+    # ~1 MB of histories went in; only the budget (plus metadata) stays.
+    assert used - base < 4 * budget
+
+
+# --- compact encoding ---------------------------------------------------------
+
+
+def _turns(n):
+    """A realistic history: user/assistant turns on trip pages plus previews."""
+    out = []
+    for i in range(n):
+        url = f"https://www.chamaeleon-reisen.de/Asien/Vietnam/Mekong-{i % 3}"
+        out.append({"role": "user", "content": f"Frage {i} zur Reise?", "url": url,
+                    "timestamp": 1760785200.0 + i})
+        out.append({"role": "assistant", "content": "Gern! " * 80, "url": url,
+                    "timestamp": 1760785201.0 + i})
+        out.append({"role": "recommendation_previews", "url": url,
+                    "timestamp": 1760785202.0 + i,
+                    "content": [{"url": url, "title": "Mekong", "image": url + ".jpg",
+                                 "description": "Flusslandschaften " * 10}] * 3})
+    return out
+
+
+def test_pack_roundtrip_and_interned_urls():
+    history = _turns(4)
+    back = unpack_history(pack_history(history))
+    assert back == history
+    assert back[0]["url"] is back[1]["url"]  # one string object per URL
+
+
+def _traced(build) -> int:
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        kept = build()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert kept
+    return after - before
+
+
+def test_encoded_histories_cost_a_fraction_of_the_dicts():
+    import json
+
+    sessions, turns = 100, 6
+    raw = [json.dumps(_turns(turns)) for _ in range(sessions)]  # built untraced
+    per_dicts = _traced(lambda: [json.loads(r) for r in raw]) / sessions
+    per_blob = _traced(lambda: [pack_history(json.loads(r)) for r in raw]) / sessions
+    print(f"bytes/session: dicts {per_dicts:.0f}, encoded {per_blob:.0f}")
+    assert per_blob * 5 < per_dicts
@@ -0,0 +1,108 @@
+"""Tests for the local chat log spool (chat_spool.py). SQLite in tmp_path."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+from chat_spool import ChatSpool, turn_key
+
+
+def _msg(text, ts):
+    return {"role": "user", "content": text, "timestamp": ts}
+
+
+def test_turns_survive_reopening_until_acked(tmp_path):
+    path = str(tmp_path / "spool.sqlite3")
+    ids = ChatSpool(path).add([("s", [_msg("a", 1.0)]), ("t", [_msg("b", 2.0)])])
+    spool = ChatSpool(path)
+    assert [(sid, m) for _, sid, m in spool.pending()] == [
+        ("s", [_msg("a", 1.0)]),
+        ("t", [_msg("b", 2.0)]),
+    ]
+    spool.ack(ids[:1])
+    assert [sid for _, sid, _ in spool.pending()] == ["t"]
+    assert [sid for _, sid, _ in spool.pending(exclude={ids[1]})] == []
+
+
+def test_a_key_is_spooled_once(tmp_path):
+    spool = ChatSpool(str(tmp_path / "spool.sqlite3"))
+    first, again = spool.add([("s", [_msg("a", 1.0)]), ("s", [_msg("a", 1.0)])])
+    assert first is not None and again is None
+    assert len(spool) == 1
+
+
+def test_key_is_session_and_newest_timestamp():
+    assert turn_key("s", [_msg("a", 1.0), _msg("b", 2.5)]) == "s:2.5"
+    # Without stamps the content decides, so distinct turns cannot collide.
+    a = turn_key("s", [{"role": "user", "content": "a"}])
+    b = turn_key("s", [{"role": "user", "content": "b"}])
+    assert a != b
+
+
+def test_buried_turns_leave_pending_and_keep_their_error(tmp_path):
+    path = str(tmp_path / "spool.sqlite3")
+    spool = ChatSpool(path)
+    ids = spool.add([("s", [_msg("a", 1.0)]), ("s", [_msg("b", 2.0)])])
+    spool.bury(ids[:1], "APIError: invalid input syntax")
+    assert [m for _, _, m in spool.pending()] == [[_msg("b", 2.0)]]
+    reopened = ChatSpool(path)
+    assert reopened.dead() == 1 and len(reopened) == 1
+    row = reopened._db.execute("SELECT session_id, error FROM dead_turns").fetchone()
+    assert row == ("s", "APIError: invalid input syntax")
+
+
+# --- one spool per process -------------------------------------------------------
+
+
+def _hold(base, ready, release):
+    from chat_spool import open_process_spool
+
+    spool = open_process_spool(base)  # owned for as long as it is referenced
+    spool.add([("a", [_msg("a", 1.0)])])
+    ready.set()
+    release.wait(30)
+
+
+def _write_and_exit(base):
+    from chat_spool import open_process_spool
+
+    open_process_spool(base).add([("b", [_msg("b", 2.0)])])
+
+
+def _adopt(base, out):
+    from chat_spool import open_process_spool
+
+    spool = open_process_spool(base)
+    out.put(sorted(sid for _, sid, _ in spool.pending()))
+
+
+def _run(ctx, target, *args):
+    p = ctx.Process(target=target, args=args)
+    p.start()
+    p.join(30)
+    assert p.exitcode == 0
+
+
+def test_each_process_replays_only_its_own_and_orphaned_spools(tmp_path):
+    import glob
+    import multiprocessing
+
+    base = str(tmp_path / "spool.sqlite3")
+    ctx = multiprocessing.get_context("spawn")
+    ready, release, out = ctx.Event(), ctx.Event(), ctx.Queue()
+    holder = ctx.Process(target=_hold, args=(base, ready, release))
+    holder.start()
+    assert ready.wait(30)
+    ChatSpool(base).add([("legacy", [_msg("l", 0.5)])])  # the single-file layout
+
+    _run(ctx, _write_and_exit, base)  # exits with "b" still spooled
+    _run(ctx, _adopt, base, out)
+    # The live worker's turn stays with it; the dead one's and the legacy file's move.
+    assert out.get(timeout=10) == ["b", "legacy"]
+
+    release.set()
+    holder.join(30)
+    _run(ctx, _adopt, base, out)
+    assert out.get(timeout=10) == ["a", "b", "legacy"]
+    spools = [
+        p for p in glob.glob(base + "*") if not p.endswith(("-wal", "-shm", ".lock"))
+    ]
+    assert len(spools) == 1  # only the last adopter's file is left
@@ -0,0 +1,496 @@
+"""Tests for the dashboard: month cache on hourly rollups, chat list and detail.
+
+Supabase is stubbed: ``chat_rollups`` and ``chats`` are plain lists, and every
+table read is recorded so the tests can assert that counts never touch chats.
+"""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import pytest
+
+import dashboard
+import db_logging
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+_DONE = {"id": 1, "watermark": "2025-01-01T00:00:00+00:00", "counted_until": None, "done": True}
+
+
+class _StubClient:
+    def __init__(self, rollups=(), chats=(), rollups_missing=False, backfill=_DONE):
+        self.tables = {
+            db_logging.ROLLUP_TABLE: list(rollups),
+            "chats": list(chats),
+            dashboard.BACKFILL_TABLE: [dict(backfill)] if backfill else [],
+        }
+        self.rollups_missing = rollups_missing
+        self.reads = []
+        self.merged = []  # the p_rows of every merge_chat_rollups call
+        self.fail_merge_after = None
+
+    def rpc(self, name, params):
+        stub = self
+        assert name == dashboard.BACKFILL_RPC
+
+        class R:
+            def execute(self):
+                if stub.fail_merge_after is not None and len(stub.merged) >= stub.fail_merge_after:
+                    raise RuntimeError("connection reset")
+                stub.merged.append(params["p_rows"])
+                table = stub.tables[db_logging.ROLLUP_TABLE]
+                for row in params["p_rows"]:
+                    old = next((r for r in table if r["bucket"] == row["bucket"]), None)
+                    if old is None:
+                        table.append(dict(row))
+                        continue
+                    old["chats"] = max(old["chats"], row["chats"])
+                    old["user_messages"] = max(old["user_messages"], row["user_messages"])
+                table.sort(key=lambda r: r["bucket"])
+
+        return R()
+
+    def table(self, name):
+        stub = self
+
+        class Q:
+            def __init__(self):
+                self.start, self.end, self.since, self.until = 0, None, None, None
+                self.write = None
+
+            def select(self, *a):
+                return self
+
+            def eq(self, column, value):
+                self.eq_id = value
+                return self
+
+            def limit(self, n):
+                return self
+
+            def gte(self, column, value):
+                self.column, self.since = column, value
+                return self
+
+            def lt(self, column, value):
+                self.column, self.until = column, value
+                return self
+
+            def order(self, *a, **k):
+                return self
+
+            def range(self, start, end):
+                self.start, self.end = start, end
+                return self
+
+            def upsert(self, row, ignore_duplicates=False):
+                assert ignore_duplicates  # only the backfill state row
+                self.write = ("insert", row)
+                return self
+
+            def update(self, values):
+                self.write = ("update", values)
+                return self
+
+            def execute(self):
+                stub.reads.append(name)
+                if name != "chats" and stub.rollups_missing:
+                    raise RuntimeError(f"PGRST205 relation {name} does not exist")
+                rows = stub.tables[name]
+                if self.write and self.write[0] == "insert":
+                    if not rows:
+                        rows.append({"counted_until": None, "done": False, **self.write[1]})
+                    return _Result([])
+                if getattr(self, "eq_id", None):
+                    rows = [r for r in rows if r["id"] == self.eq_id]
+                if self.write:
+                    for row in rows:
+                        row.update(self.write[1])
+                    return _Result(rows)
+                if self.since:
+                    rows = [r for r in rows if r[self.column] >= self.since]
+                if self.until:
+                    rows = [r for r in rows if r[self.column] < self.until]
+                end = len(rows) if self.end is None else self.end + 1
+                return _Result(rows[self.start : end])
+
+        return Q()
+
+
+def _rollup(bucket, chats, users):
+    return {"bucket": bucket, "chats": chats, "user_messages": users}
+
+
+def _chat(ts, users):
+    return {
+        "id": ts,
+        "session_id": None,
+        "timestamp": ts,
+        "messages": [{"role": "user", "content": "x"}] * users,
+    }
+
+
+@pytest.fixture(autouse=True)
+def _not_backfilled_yet(monkeypatch):
+    monkeypatch.setattr(dashboard, "_backfilled", False)
+
+
+@pytest.fixture()
+def cache(monkeypatch):
+    def make(stub):
+        monkeypatch.setattr(dashboard, "supabase", stub)
+        c = dashboard.MonthCache()
+        c.load_all()
+        return c
+
+    return make
+
+
+def test_counts_come_from_rollups_only(cache):
+    stub = _StubClient(
+        rollups=[
+            _rollup("2025-09-01T09:00:00+00:00", 2, 3),
+            _rollup("2025-09-03T14:00:00+00:00", 1, 5),
+            _rollup("2025-10-06T09:00:00+00:00", 1, 0),
+        ]
+    )
+    c = cache(stub)
+    assert "chats" not in stub.reads
+    assert c.total_chats == 4 and c.total_user_messages == 8
+    assert c.hourly_counts[9] == 3 and c.hourly_counts[14] == 1
+    september = c._cache["2025-09"]
+    assert september["total_chats"] == 3
+    assert [d["count"] for d in september["daily_counts"]] == [2, 0, 1]
+    assert september["weekday_counts"][0]["count"] == 2  # 2025-09-01 is a Monday
+
+
+def _backfill(watermark="2025-10-01T00:00:00+00:00", counted_until=None):
+    return {"id": 1, "watermark": watermark, "counted_until": counted_until, "done": False}
+
+
+def test_empty_rollup_table_is_backfilled_from_chats(cache):
+    stub = _StubClient(
+        chats=[
+            _chat("2025-09-01T09:10:00+00:00", 2),
+            _chat("2025-09-01T09:50:00+00:00", 1),
+            _chat("2025-09-02T10:00:00+00:00", 1),
+        ],
+        backfill=_backfill(),
+    )
+    c = cache(stub)
+    assert c.from_rollups
+    assert c.total_chats == 3 and c.total_user_messages == 4
+    assert stub.tables[db_logging.ROLLUP_TABLE] == [
+        _rollup("2025-09-01T09:00:00+00:00", 2, 3),
+        _rollup("2025-09-02T10:00:00+00:00", 1, 1),
+    ]
+    assert stub.tables[dashboard.BACKFILL_TABLE][0]["done"]
+
+
+def test_first_boot_sets_the_watermark(cache):
+    stub = _StubClient(chats=[_chat("2025-09-01T09:10:00+00:00", 2)], backfill=None)
+    c = cache(stub)
+    (state,) = stub.tables[dashboard.BACKFILL_TABLE]
+    assert state["done"] and state["watermark"] > "2025-09-01"
+    assert c.total_chats == 1
+
+
+def test_backfill_keeps_the_bumps_of_a_table_that_was_not_empty(cache):
+    """The log writer bumped before the first backfill: nothing is lost or doubled."""
+    stub = _StubClient(
+        rollups=[
+            # One of the two 09:00 chats was logged (and bumped) after the
+            # rollups went live, with a later turn of the other one.
+            _rollup("2025-09-01T09:00:00+00:00", 1, 2),
+            # After the watermark: bumped only, the backfill does not count it.
+            _rollup("2025-10-01T08:00:00+00:00", 1, 1),
+        ],
+        chats=[
+            _chat("2025-09-01T09:10:00+00:00", 2),
+            _chat("2025-09-01T09:50:00+00:00", 1),
+            _chat("2025-10-01T08:30:00+00:00", 1),
+        ],
+        backfill=_backfill(),
+    )
+    c = cache(stub)
+    assert stub.tables[db_logging.ROLLUP_TABLE] == [
+        _rollup("2025-09-01T09:00:00+00:00", 2, 3),
+        _rollup("2025-10-01T08:00:00+00:00", 1, 1),
+    ]
+    assert c.total_chats == 3 and c.total_user_messages == 4
+
+
+def test_backfill_merges_page_by_page_without_splitting_an_hour(cache, monkeypatch):
+    monkeypatch.setattr(dashboard, "_ROLLUP_PAGE_SIZE", 2)
+    chats = [_chat(f"2025-09-01T09:{m:02d}:00+00:00", 1) for m in range(0, 50, 10)]
+    chats += [_chat("2025-09-01T10:05:00+00:00", 2), _chat("2025-09-02T11:00:00+00:00", 1)]
+    stub = _StubClient(chats=chats, backfill=_backfill())
+    c = cache(stub)
+    assert all(len(rows) <= 2 for rows in stub.merged)
+    assert stub.tables[db_logging.ROLLUP_TABLE] == [
+        _rollup("2025-09-01T09:00:00+00:00", 5, 5),
+        _rollup("2025-09-01T10:00:00+00:00", 1, 2),
+        _rollup("2025-09-02T11:00:00+00:00", 1, 1),
+    ]
+    assert c.total_chats == 7
+
+
+def test_interrupted_backfill_counts_from_chats_and_resumes(cache, monkeypatch):
+    monkeypatch.setattr(dashboard, "_ROLLUP_PAGE_SIZE", 1)
+    stub = _StubClient(
+        chats=[
+            _chat("2025-09-01T09:10:00+00:00", 1),
+            _chat("2025-09-02T09:10:00+00:00", 1),
+            _chat("2025-09-03T09:10:00+00:00", 1),
+        ],
+        backfill=_backfill(),
+    )
+    stub.fail_merge_after = 1
+    c = cache(stub)
+    assert not c.from_rollups and c.total_chats == 3
+    state = stub.tables[dashboard.BACKFILL_TABLE][0]
+    assert not state["done"] and state["counted_until"] == "2025-09-02T09:00:00+00:00"
+
+    stub.fail_merge_after = None
+    monkeypatch.setattr(dashboard, "_backfilled", False)
+    c = cache(stub)
+    assert c.from_rollups and c.total_chats == 3
+    assert stub.merged[1][0]["bucket"] == "2025-09-02T09:00:00+00:00"  # resumed
+    assert [r["chats"] for r in stub.tables[db_logging.ROLLUP_TABLE]] == [1, 1, 1]
+
+
+def test_missing_rollup_table_counts_from_chats(cache):
+    stub = _StubClient(chats=[_chat("2025-09-01T09:10:00+00:00", 2)], rollups_missing=True)
+    c = cache(stub)
+    assert not c.from_rollups
+    assert c.total_chats == 1 and c.total_user_messages == 2
+    assert stub.merged == []
+
+
+def test_current_month_refresh_reads_only_its_rollups(cache, monkeypatch):
+    month = dashboard.month_key(dashboard.MonthCache.current_month_start())
+    stub = _StubClient(
+        rollups=[
+            _rollup("2025-09-01T09:00:00+00:00", 2, 2),
+            _rollup(f"{month}-01T08:00:00+00:00", 1, 1),
+        ]
+    )
+    c = cache(stub)
+    stub.tables[db_logging.ROLLUP_TABLE].append(_rollup(f"{month}-01T09:00:00+00:00", 1, 4))
+    stub.reads.clear()
+    c.update_current_month()
+    assert stub.reads == [db_logging.ROLLUP_TABLE]
+    assert c.total_chats == 4 and c.total_user_messages == 7
+    assert c._cache[month]["total_chats"] == 2
+
+
+def test_month_rollover_counts_each_month_once(cache, monkeypatch):
+    from datetime import datetime
+
+    now = [datetime(2026, 9, 1)]
+    monkeypatch.setattr(dashboard.MonthCache, "current_month_start", staticmethod(lambda: now[0]))
+    stub = _StubClient(rollups=[_rollup("2026-09-10T09:00:00+00:00", 5, 5)])
+    c = cache(stub)
+    assert c.total_chats == 5
+    # October's first chats land before the cache notices the new month.
+    stub.tables[db_logging.ROLLUP_TABLE].append(_rollup("2026-10-01T08:00:00+00:00", 3, 3))
+    now[0] = datetime(2026, 10, 1)
+    c.current_month_rollover()
+    assert c.current_month == "2026-10"
+    assert c._cache["2026-09"]["total_chats"] == 5
+    assert c._cache["2026-10"]["total_chats"] == 3
+    assert c.total_chats == 8 and c.total_user_messages == 8
+    assert sum(c.hourly_counts) == 8
+
+
+# --- chat list / detail -------------------------------------------------------
+
+
+def _new_chat(row_id, ts):
+    return {
+        "id": row_id,
+        "session_id": f"sess-{row_id}",
+        "timestamp": ts,
+        "messages": [
+            {"role": "user", "content": "Hallo", "timestamp": 100.0},
+            {"role": "assistant", "content": "<p>Hi</p>", "timestamp": 130.0},
+        ],
+    }
+
+
+def test_month_chats_stream_summaries_without_bodies(monkeypatch):
+    import json
+
+    chats = [_new_chat(f"r{i}", "2025-09-02T10:00:00+00:00") for i in range(5)]
+    monkeypatch.setattr(dashboard, "supabase", _StubClient(chats=chats))
+    monkeypatch.setattr(dashboard, "_CHAT_PAGE_SIZE", 2)
+    parts = list(dashboard.stream_chat_summaries("2025-09"))
+    assert len(parts) > 3  # written page by page, not as one blob
+    summaries = json.loads("".join(parts))
+    assert [s["row_id"] for s in summaries] == [f"r{i}" for i in range(5)]
+    first = summaries[0]
+    assert "messages" not in first
+    assert first["id"] == "sess-r0"
+    assert first["message_count"] == 2 and first["user_message_count"] == 1
+    assert first["duration_seconds"] == 30.0
+
+
+def test_shifted_pages_do_not_repeat_a_chat(monkeypatch):
+    import json
+
+    chats = [_new_chat(f"r{i}", "2025-09-02T10:00:00+00:00") for i in range(3)]
+    stub = _StubClient(chats=chats)
+    monkeypatch.setattr(dashboard, "supabase", stub)
+    monkeypatch.setattr(dashboard, "_CHAT_PAGE_SIZE", 2)
+    stream = dashboard.stream_chat_summaries("2025-09")
+    out = [next(stream), next(stream)]  # "[" and the first summary
+    stub.tables["chats"].insert(0, _new_chat("new", "2025-09-30T10:00:00+00:00"))
+    out += list(stream)
+    ids = [s["row_id"] for s in json.loads("".join(out))]
+    assert len(ids) == len(set(ids))
+
+
+def test_chat_detail_carries_the_transcript(monkeypatch):
+    chat = _new_chat("r1", "2025-09-02T10:00:00+00:00")
+    monkeypatch.setattr(dashboard, "supabase", _StubClient(chats=[chat]))
+    detail = dashboard.fetch_chat("r1")
+    assert detail["messages"] == chat["messages"]
+    assert detail["row_id"] == "r1"
+    assert dashboard.fetch_chat("missing") is None
+
+
+# --- aggregation: NumPy vs row by row ------------------------------------------
+
+
+def _synthetic_chats(n, seed=7):
+    """``n`` chats over a few months with odd hours, offsets and user counts."""
+    import random
+
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        ts = 1756684800 + rng.randrange(0, 120 * 86400)  # from 2025-09-01 UTC
+        iso = dashboard.datetime.fromtimestamp(ts, dashboard.timezone.utc).isoformat()
+        if i % 5 == 0:
+            iso = iso.replace("+00:00", f".{rng.randrange(10**6):06d}+00:00")
+        out.append(_chat(iso, rng.randrange(0, 4)))
+    return out
+
+
+@pytest.mark.skipif(dashboard.np is None, reason="NumPy not installed")
+def test_vectorised_rollups_match_the_row_by_row_ones():
+    chats = _synthetic_chats(2000)
+    assert dashboard._rollups_from_chats_np(chats) == dashboard._rollups_from_chats_py(chats)
+
+
+@pytest.mark.skipif(dashboard.np is None, reason="NumPy not installed")
+def test_vectorised_histograms_match_the_row_by_row_ones():
+    rollups = dashboard._rollups_from_chats_py(_synthetic_chats(2000))
+    rollups.append(_rollup("2025-09-30T23:00:00+00:00", 0, 2))  # users, no chats
+    by_month: dict = {}
+    for row in rollups:
+        by_month.setdefault(row["bucket"][:7], []).append(row)
+    for rows in by_month.values():
+        assert dashboard._month_histograms_np(rows) == dashboard._month_histograms_py(rows)
+
+
+@pytest.mark.skipif(dashboard.np is None, reason="NumPy not installed")
+def test_foreign_offsets_fall_back_to_row_parsing():
+    chats = [_chat("2025-09-01T01:30:00+02:00", 1), _chat("2025-08-31T23:10:00Z", 2)]
+    assert dashboard._rollups_from_chats_np(chats) == [
+        _rollup("2025-08-31T23:00:00+00:00", 2, 3)
+    ]
+
+
+# --- HTTP caching ---------------------------------------------------------------
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    import base64
+    import os
+
+    from flask import Flask
+
+    monkeypatch.setattr(dashboard, "_responses", {})
+    app = Flask("dashboard_test", root_path=os.path.dirname(dashboard.__file__))
+    for route, view_func, *rest in dashboard.routes:
+        app.add_url_rule(route, view_func=view_func, methods=rest[0] if rest else ["GET"])
+    token = base64.b64encode(
+        f"{dashboard.API_USERNAME}:{dashboard.API_PASSWORD}".encode()
+    ).decode()
+    c = app.test_client()
+    c.environ_base["HTTP_AUTHORIZATION"] = f"Basic {token}"
+    return c
+
+
+def _fresh_cache(monkeypatch, rollups):
+    monkeypatch.setattr(dashboard, "supabase", _StubClient(rollups=rollups))
+    c = dashboard.MonthCache()
+    c.load_all()
+    monkeypatch.setattr(dashboard, "month_cache", c)
+    return c
+
+
+def test_unchanged_dashboard_is_a_bodiless_304(client, monkeypatch):
+    _fresh_cache(monkeypatch, [_rollup("2025-09-01T09:00:00+00:00", 2, 3)])
+    built = []
+    real = dashboard._dashboard_payload
+    monkeypatch.setattr(dashboard, "_dashboard_payload", lambda: built.append(1) or real())
+
+    first = client.get("/api/dashboard")
+    assert first.status_code == 200 and first.json["total_chats"] == 2
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"') and "Last-Modified" in first.headers
+
+    again = client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert built == [1]  # served from the kept body, not rebuilt
+
+
+def test_changed_month_gets_a_new_etag(client, monkeypatch):
+    c = _fresh_cache(monkeypatch, [_rollup("2025-09-01T09:00:00+00:00", 2, 3)])
+    etag = client.get("/api/dashboard/2025-09").headers["ETag"]
+
+    c.compute_month([_rollup("2025-09-01T09:00:00+00:00", 2, 3)], "2025-09")
+    assert client.get("/api/dashboard/2025-09", headers={"If-None-Match": etag}).status_code == 304
+
+    c.compute_month([_rollup("2025-09-01T09:00:00+00:00", 3, 3)], "2025-09")
+    changed = client.get("/api/dashboard/2025-09", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json["total_chats"] == 3
+
+
+def test_index_html_is_gzipped_and_revalidated(client):
+    import gzip
+
+    page = client.get("/dashboard", headers={"Accept-Encoding": "gzip"})
+    assert page.status_code == 200
+    assert page.headers["Content-Encoding"] == "gzip"
+    assert page.headers["Vary"] == "Accept-Encoding"
+    with open("static/dashboard/index.html", "rb") as f:
+        assert gzip.decompress(page.data) == f.read()
+    plain = client.get("/dashboard")
+    assert "Content-Encoding" not in plain.headers
+    again = client.get(
+        "/dashboard",
+        headers={"If-None-Match": page.headers["ETag"], "Accept-Encoding": "gzip"},
+    )
+    assert again.status_code == 304
+
+
+def test_sitemap_etag_follows_the_text_and_the_saves(client, monkeypatch):
+    import agent_base
+    import sitemap_store
+
+    monkeypatch.setattr(sitemap_store, "recent_versions", lambda: [])
+    etag = client.get("/admin/sitemap").headers["ETag"]
+    assert client.get("/admin/sitemap", headers={"If-None-Match": etag}).status_code == 304
+
+    monkeypatch.setattr(agent_base, "sitemap", agent_base.sitemap + "\n/Neu/Reise")
+    assert client.get("/admin/sitemap", headers={"If-None-Match": etag}).status_code == 200
+    etag = client.get("/admin/sitemap").headers["ETag"]
+    monkeypatch.setattr(sitemap_store, "generation", sitemap_store.generation + 1)
+    assert client.get("/admin/sitemap", headers={"If-None-Match": etag}).status_code == 200
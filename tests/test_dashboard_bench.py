@@ -0,0 +1,59 @@
+"""Benchmark: dashboard aggregation over 500k synthetic chats, NumPy vs row by row.
+
+Not part of the default suite. Run by hand:
+
+    RUN_BENCH=1 pytest tests/test_dashboard_bench.py -s
+
+Times both paths of ``rollups_from_chats`` (the full-table pass of a backfill
+or of running without the rollup table) and of ``month_histograms``, and
+checks they agree.
+"""
+
+import os
+import time
+
+import pytest
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import dashboard
+from test_dashboard import _synthetic_chats
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_BENCH") != "1" or dashboard.np is None,
+    reason="benchmark - set RUN_BENCH=1 (needs NumPy)",
+)
+
+N_CHATS = 500_000
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def test_aggregation_benchmark():
+    chats = _synthetic_chats(N_CHATS)
+
+    fast, t_fast = _timed(dashboard._rollups_from_chats_np, chats)
+    slow, t_slow = _timed(dashboard._rollups_from_chats_py, chats)
+    assert fast == slow
+    print(
+        f"\nrollups_from_chats ({N_CHATS} chats → {len(fast)} buckets): "
+        f"numpy {t_fast:.2f}s, python {t_slow:.2f}s ({t_slow / t_fast:.1f}x)"
+    )
+
+    months: dict = {}
+    for row in fast:
+        months.setdefault(row["bucket"][:7], []).append(row)
+    t_fast = t_slow = 0.0
+    for rows in months.values():
+        a, dt = _timed(dashboard._month_histograms_np, rows)
+        b, ds = _timed(dashboard._month_histograms_py, rows)
+        assert a == b
+        t_fast, t_slow = t_fast + dt, t_slow + ds
+    print(
+        f"month_histograms ({len(months)} months): "
+        f"numpy {t_fast * 1000:.1f}ms, python {t_slow * 1000:.1f}ms"
+    )
@@ -0,0 +1,490 @@
+"""Tests for chat persistence (db_logging: log_messages and the log writer).
+
+Supabase is stubbed — no network, no real DB. The module-level session store is
+swapped for an empty one per test so nothing loaded at import leaks in.
+"""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import pytest
+
+import db_logging
+
+
+# --- stub supabase client ------------------------------------------------------
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _StubTable:
+    def __init__(self, client, name):
+        self._c = client
+        self._name = name
+        self._op = None
+
+    def insert(self, row):
+        self._op = ("insert", row)
+        return self
+
+    def update(self, payload):
+        self._op = ("update", payload)
+        return self
+
+    def select(self, *a, **k):
+        self._op = ("select", None)
+        return self
+
+    def eq(self, *a, **k):
+        return self
+
+    def contains(self, column, value):
+        self._op = ("lookup", value)
+        return self
+
+    def limit(self, n):
+        return self
+
+    def execute(self):
+        op, arg = self._op
+        self._c.calls.append((op, arg))
+        if op == "insert":
+            return _Result([{"id": "row-1", **arg}])
+        if op == "lookup":
+            return _Result(list(self._c.logged))
+        if op == "select":
+            return _Result([{"session_id": "s", "messages": list(self._c.stored)}])
+        return _Result([])
+
+
+class _StubRpc:
+    def __init__(self, client, name, params):
+        self._c, self._name, self._params = client, name, params
+
+    def execute(self):
+        if self._name == db_logging.ROLLUP_RPC:
+            self._c.calls.append(("rollup", self._params))
+            return _Result(None)
+        self._c.calls.append(("rpc", self._params))
+        if self._c.rpc_missing:
+            raise RuntimeError(
+                "{'code': 'PGRST202', 'message': 'Could not find the function'}"
+            )
+        return _Result(1)
+
+
+class _StubClient:
+    def __init__(self, stored=(), rpc_missing=False, logged=()):
+        self.calls = []
+        self.stored = list(stored)
+        self.rpc_missing = rpc_missing
+        self.logged = list(logged)  # rows the idempotency lookup finds
+
+    def table(self, name):
+        return _StubTable(self, name)
+
+    def rpc(self, name, params):
+        return _StubRpc(self, name, params)
+
+
+def _msg(role, text, ts=1.0):
+    return {"role": role, "content": text, "timestamp": ts}
+
+
+@pytest.fixture()
+def db(monkeypatch):
+    def make(rollups=False, **kw):
+        stub = _StubClient(**kw)
+        monkeypatch.setattr(db_logging, "supabase", stub)
+        monkeypatch.setattr(db_logging, "_store", db_logging._new_store())
+        monkeypatch.setattr(db_logging, "CHAT_LOG_MODE", "append")
+        monkeypatch.setattr(db_logging, "_append_unavailable", False)
+        monkeypatch.setattr(db_logging, "_rollups_unavailable", rollups is False)
+        return stub
+
+    return make
+
+
+# --- append mode ---------------------------------------------------------------
+
+
+def test_new_session_inserts_the_full_row(db):
+    stub = db()
+    db_logging.log_messages("s", [_msg("user", "hi")])
+    assert stub.calls == [("insert", {"session_id": "s", "messages": [_msg("user", "hi")]})]
+
+
+def test_follow_up_turn_sends_only_the_new_messages(db):
+    stub = db()
+    db_logging.log_messages("s", [_msg("user", "a"), _msg("assistant", "b")])
+    db_logging.log_messages("s", [_msg("user", "c")])
+    op, params = stub.calls[-1]
+    assert op == "rpc"
+    assert params == {"p_id": "row-1", "p_messages": [_msg("user", "c")]}
+    # The row holds the history; append mode keeps no second copy in memory.
+    assert "history" not in db_logging._store.sessions["s"]
+
+
+def test_pruned_history_is_not_read_back_to_append(db):
+    stub = db()
+    db_logging.log_messages("s", [_msg("user", "a")])
+    db_logging._store.drop_history("s")
+    db_logging.log_messages("s", [_msg("user", "b")])
+    assert [op for op, _ in stub.calls] == ["insert", "rpc"]
+    assert "history" not in db_logging._store.sessions["s"]
+
+
+def test_a_session_moving_to_another_worker_appends_to_its_row(db, monkeypatch, tmp_path):
+    from shared_state import SharedState
+
+    stub = db()
+    rows = SharedState(str(tmp_path / "state.sqlite3")).map("chat_rows")
+    monkeypatch.setattr(db_logging, "_shared_rows", rows)
+    db_logging.log_messages("s", [_msg("user", "a")])  # worker A inserts
+    monkeypatch.setattr(db_logging, "_store", db_logging._new_store())  # worker B
+    db_logging.log_messages("s", [_msg("user", "b")])
+    assert [op for op, _ in stub.calls] == ["insert", "rpc"]
+    assert stub.calls[-1][1]["p_id"] == "row-1"
+
+
+def test_missing_rpc_falls_back_to_a_full_rewrite(db):
+    stub = db(rpc_missing=True, stored=[_msg("user", "a")])
+    db_logging.log_messages("s", [_msg("user", "a")])
+    db_logging.log_messages("s", [_msg("user", "b")])
+    assert stub.calls[-1] == ("update", {"messages": [_msg("user", "a"), _msg("user", "b")]})
+    assert db_logging._append_unavailable
+    # Rewrite mode from here on: the history is cached again.
+    assert len(db_logging._store.history("s")) == 2
+    # ...and stops trying the RPC for the rest of the process.
+    db_logging.log_messages("s", [_msg("user", "c")])
+    assert [op for op, _ in stub.calls].count("rpc") == 1
+
+
+def test_rewrite_mode_still_reads_a_pruned_history(db, monkeypatch):
+    stub = db(stored=[_msg("user", "a")])
+    monkeypatch.setattr(db_logging, "CHAT_LOG_MODE", "rewrite")
+    db_logging.log_messages("s", [_msg("user", "a")])
+    db_logging._store.drop_history("s")
+    db_logging.log_messages("s", [_msg("user", "b")])
+    assert [op for op, _ in stub.calls] == ["insert", "select", "update"]
+    assert stub.calls[-1][1]["messages"] == [_msg("user", "a"), _msg("user", "b")]
+
+
+# --- dashboard rollups ---------------------------------------------------------
+
+
+def test_rollups_count_the_chat_once_and_every_user_message(db):
+    stub = db(rollups=True)
+    db_logging.log_messages("s", [_msg("user", "a"), _msg("assistant", "b")])
+    db_logging.log_messages("s", [_msg("user", "c"), _msg("assistant", "d")])
+    bumps = [params for op, params in stub.calls if op == "rollup"]
+    assert [(b["p_chats"], b["p_user_messages"]) for b in bumps] == [(1, 1), (0, 1)]
+    # Both land in the hour the chat started in.
+    assert bumps[0]["p_bucket"] == bumps[1]["p_bucket"]
+    assert bumps[0]["p_bucket"].endswith(":00:00+00:00")
+
+
+def test_failed_rollup_bump_does_not_fail_the_turn(db, monkeypatch):
+    stub = db(rollups=True)
+
+    def broken(name, params):
+        if name == db_logging.ROLLUP_RPC:
+            raise RuntimeError("timeout")
+        return _StubRpc(stub, name, params)
+
+    monkeypatch.setattr(stub, "rpc", broken)
+    db_logging.log_messages("s", [_msg("user", "a")])
+    assert "s" in db_logging._store
+
+
+# --- log writer ----------------------------------------------------------------
+
+
+def _run_worker(monkeypatch):
+    """Start a private _log_worker; returns its stop(timeout) function."""
+    import threading
+
+    monkeypatch.setattr(db_logging, "log_queue", db_logging.LogQueue(maxsize=100))
+    thread = threading.Thread(target=db_logging._log_worker, daemon=True)
+
+    def stop(timeout=2.0):
+        monkeypatch.setattr(db_logging, "_drain_deadline", db_logging.time.time() + timeout)
+        db_logging.log_queue.put(db_logging._STOP)
+        thread.join(timeout + 1)
+        assert not thread.is_alive()
+
+    thread.start()
+    return stop
+
+
+@pytest.fixture()
+def writer(monkeypatch):
+    """Run a private _log_worker against a fresh queue and a recording writer."""
+    written = []
+    monkeypatch.setattr(db_logging, "_spool", None)
+    monkeypatch.setattr(db_logging, "LOG_FLUSH_SECONDS", 0.05)
+    monkeypatch.setattr(db_logging, "log_stats", dict.fromkeys(db_logging.log_stats, 0))
+    monkeypatch.setattr(db_logging, "_already_logged", lambda sid, msgs: False)
+    monkeypatch.setattr(
+        db_logging, "log_messages", lambda sid, msgs: written.append((sid, list(msgs)))
+    )
+    return written, _run_worker(monkeypatch)
+
+
+def test_turns_of_one_session_are_coalesced_into_one_write(writer):
+    written, stop = writer
+    db_logging.log_queue.put(("a", [_msg("user", "1")]))
+    db_logging.log_queue.put(("b", [_msg("user", "x")]))
+    db_logging.log_queue.put(("a", [_msg("assistant", "2")]))
+    stop()
+    assert written == [
+        ("a", [_msg("user", "1"), _msg("assistant", "2")]),
+        ("b", [_msg("user", "x")]),
+    ]
+
+
+def test_time_trigger_flushes_without_shutdown(writer):
+    written, stop = writer
+    db_logging.log_queue.put(("a", [_msg("user", "1")]))
+    for _ in range(100):
+        if written:
+            break
+        db_logging.time.sleep(0.01)
+    assert written == [("a", [_msg("user", "1")])]
+    stop()
+
+
+def test_a_failing_session_does_not_hold_up_the_others(writer, monkeypatch):
+    written, stop = writer
+    attempts = []
+
+    def flaky(sid, msgs):
+        if sid == "bad" and len(attempts) < 1:
+            attempts.append(sid)
+            raise RuntimeError("db blip")
+        written.append((sid, list(msgs)))
+
+    monkeypatch.setattr(db_logging, "log_messages", flaky)
+    db_logging.log_queue.put(("bad", [_msg("user", "1")]))
+    db_logging.log_queue.put(("good", [_msg("user", "x")]))
+    for _ in range(100):
+        if written:
+            break
+        db_logging.time.sleep(0.01)
+    # "bad" is now backing off for 2s; "good" went out anyway.
+    assert written == [("good", [_msg("user", "x")])]
+    db_logging.log_queue.put(("bad", [_msg("assistant", "2")]))
+    stop()  # the drain forces the retry, with the later turn behind the first
+    assert written[-1] == ("bad", [_msg("user", "1"), _msg("assistant", "2")])
+    assert db_logging.log_stats["retried"] == 1
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(db_logging, "_spool", None)
+    monkeypatch.setattr(db_logging, "log_stats", dict.fromkeys(db_logging.log_stats, 0))
+    q = db_logging.LogQueue(maxsize=1)
+    q.put(("a", []))
+    q.put(("b", []))  # would block forever with a plain bounded Queue
+    assert q.qsize() == 1
+    assert db_logging.log_stats["dropped"] == 1
+
+
+# --- spool ---------------------------------------------------------------------
+
+
+@pytest.fixture()
+def spooled(monkeypatch, tmp_path):
+    """Writer setup with a real spool file; ``fail`` makes every write raise."""
+    from chat_spool import ChatSpool
+
+    state = {"fail": False, "written": []}
+
+    def write(sid, msgs):
+        if state["fail"]:
+            raise RuntimeError("supabase down")
+        state["written"].append((sid, list(msgs)))
+
+    path = str(tmp_path / "spool.sqlite3")
+    monkeypatch.setattr(db_logging, "_spool", ChatSpool(path))
+    monkeypatch.setattr(db_logging, "LOG_FLUSH_SECONDS", 0.01)
+    monkeypatch.setattr(db_logging, "log_stats", dict.fromkeys(db_logging.log_stats, 0))
+    monkeypatch.setattr(db_logging, "_already_logged", lambda sid, msgs: False)
+    monkeypatch.setattr(db_logging, "log_messages", write)
+    state["path"] = path
+    return state
+
+
+def test_outage_keeps_turns_on_disk_and_a_restart_replays_them(spooled, monkeypatch):
+    from chat_spool import ChatSpool
+
+    spooled["fail"] = True
+    stop = _run_worker(monkeypatch)
+    db_logging.log_queue.put(("s", [_msg("user", "a", ts=1.0)]))
+    db_logging.log_queue.put(("s", [_msg("assistant", "b", ts=2.0)]))
+    stop(timeout=0.1)
+    assert spooled["written"] == []
+    assert db_logging.log_stats["failed"] == 0  # never given up with a spool
+
+    # "Restart": a new process opens the same file, Supabase is back.
+    spooled["fail"] = False
+    monkeypatch.setattr(db_logging, "_spool", ChatSpool(spooled["path"]))
+    _run_worker(monkeypatch)()
+    assert spooled["written"] == [("s", [_msg("user", "a", 1.0), _msg("assistant", "b", 2.0)])]
+    assert len(db_logging._spool) == 0
+
+
+class _APIError(Exception):
+    """Shape of postgrest.APIError: the SQLSTATE in ``code``."""
+
+    def __init__(self, code):
+        super().__init__(f"Error {code}")
+        self.code = code
+
+
+def test_a_permanent_error_moves_the_turn_to_dead_turns(spooled, monkeypatch):
+    def write(sid, msgs):
+        if any(m["content"] == "kaputt" for m in msgs):
+            raise _APIError("22P02")  # invalid input syntax: never succeeds
+        spooled["written"].append((sid, list(msgs)))
+
+    monkeypatch.setattr(db_logging, "log_messages", write)
+    stop = _run_worker(monkeypatch)
+    db_logging.log_queue.put(("s", [_msg("user", "kaputt", ts=1.0)]))
+    for _ in range(100):
+        if db_logging.log_stats["dead"]:
+            break
+        db_logging.time.sleep(0.01)
+    db_logging.log_queue.put(("s", [_msg("user", "weiter", ts=2.0)]))
+    stop()
+    assert db_logging.log_stats["dead"] == 1 and db_logging.log_stats["retried"] == 0
+    assert spooled["written"] == [("s", [_msg("user", "weiter", 2.0)])]
+    assert len(db_logging._spool) == 0 and db_logging._spool.dead() == 1
+
+
+def test_a_transient_error_is_buried_only_after_the_attempt_limit(spooled, monkeypatch):
+    monkeypatch.setattr(db_logging, "LOG_SPOOL_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(db_logging, "LOG_RETRY_MAX_SECONDS", 0.01)
+    spooled["fail"] = True
+    stop = _run_worker(monkeypatch)
+    db_logging.log_queue.put(("s", [_msg("user", "a", ts=1.0)]))
+    for _ in range(300):
+        if db_logging.log_stats["dead"]:
+            break
+        db_logging.time.sleep(0.01)
+    stop(timeout=0.1)
+    assert db_logging.log_stats["retried"] == 1 and db_logging.log_stats["dead"] == 1
+    assert db_logging._spool.pending() == [] and db_logging._spool.dead() == 1
+
+
+def test_replayed_turn_already_in_chats_is_not_written_again(spooled, monkeypatch):
+    db_logging._spool.add([("s", [_msg("user", "a", ts=1.0)])])
+    monkeypatch.setattr(db_logging, "_already_logged", lambda sid, msgs: True)
+    _run_worker(monkeypatch)()
+    assert spooled["written"] == []
+    assert db_logging.log_stats["duplicates"] == 1
+    assert len(db_logging._spool) == 0
+
+
+def test_same_turn_twice_is_spooled_and_written_once(spooled, monkeypatch):
+    stop = _run_worker(monkeypatch)
+    db_logging.log_queue.put(("s", [_msg("user", "a", ts=1.0)]))
+    db_logging.log_queue.put(("s", [_msg("user", "a", ts=1.0)]))
+    stop()
+    assert spooled["written"] == [("s", [_msg("user", "a", 1.0)])]
+
+
+def test_full_queue_spools_instead_of_dropping(spooled):
+    q = db_logging.LogQueue(maxsize=1)
+    q.put(("a", [_msg("user", "1")]))
+    q.put(("b", [_msg("user", "2", ts=2.0)]))
+    assert db_logging.log_stats["dropped"] == 0
+    assert [sid for _, sid, _ in db_logging._spool.pending()] == ["b"]
+    assert db_logging._overflowed.is_set()
+    db_logging._overflowed.clear()
+
+
+def test_lost_insert_answer_does_not_create_a_second_row(db, monkeypatch):
+    """The idempotency lookup finds the row and the retry becomes a no-op."""
+    monkeypatch.setattr(db_logging, "_spool", None)
+    stub = db(logged=[{"id": "row-1", "timestamp": "2026-10-19T10:00:00+00:00"}])
+    entry = {"turns": [{"messages": [_msg("user", "a")], "spool_id": None}],
+             "due_at": 0.0, "attempt": 1, "check": True}
+    db_logging._write("s", entry)
+    assert [op for op, _ in stub.calls] == ["lookup"]
+    assert db_logging._store.get("s")["db_id"] == "row-1"
+    db_logging.log_messages("s", [_msg("user", "b", ts=2.0)])
+    assert stub.calls[-1][0] == "rpc"  # appended to the found row, no INSERT
+
+
+# --- boot: metadata only -------------------------------------------------------
+
+
+class _BootStub:
+    """``chats`` that answers metadata selects, paged, and records the columns."""
+
+    def __init__(self, rows, projection_ok=True):
+        self.rows = rows
+        self.projection_ok = projection_ok
+        self.selected = []
+
+    def table(self, name):
+        stub = self
+
+        class Q:
+            def select(self, columns):
+                self.columns = columns
+                self.start, self.end = 0, None
+                stub.selected.append(columns)
+                return self
+
+            def gte(self, *a):
+                return self
+
+            def order(self, *a, **k):
+                return self
+
+            def limit(self, n):
+                self.end = n - 1
+                return self
+
+            def range(self, start, end):
+                self.start, self.end = start, end
+                return self
+
+            def execute(self):
+                if "->" in self.columns and not stub.projection_ok:
+                    raise RuntimeError("PGRST100 failed to parse select")
+                return _Result(stub.rows[self.start : self.end + 1])
+
+        return Q()
+
+
+def _boot(monkeypatch, stub):
+    monkeypatch.setattr(db_logging, "supabase", stub)
+    monkeypatch.setattr(db_logging, "_store", db_logging._new_store())
+    monkeypatch.setattr(db_logging, "_BOOT_PAGE_SIZE", 2)
+    db_logging._load_sessions_from_db()
+
+
+def test_boot_never_downloads_message_bodies(monkeypatch):
+    rows = [
+        {"id": f"r{i}", "session_id": f"s{i}", "timestamp": "2025-10-18T10:00:00+00:00",
+         "last_ts": "1760785200.5"}
+        for i in range(5)
+    ]
+    stub = _BootStub(rows)
+    _boot(monkeypatch, stub)
+    assert all("messages," not in c and not c.endswith("messages") for c in stub.selected)
+    assert list(db_logging._store.sessions) == [f"s{i}" for i in range(5)]  # all pages
+    s0 = db_logging._store.sessions["s0"]
+    assert "history" not in s0
+    assert s0["last_active"] == 1760785200.5
+
+
+def test_boot_falls_back_to_row_timestamps_without_the_projection(monkeypatch):
+    rows = [{"id": "r", "session_id": "s", "timestamp": "2026-10-18T10:00:00+00:00"}]
+    _boot(monkeypatch, _BootStub(rows, projection_ok=False))
+    session = db_logging._store.sessions["s"]
+    assert session["created_at"] == session["last_active"]
@@ -0,0 +1,92 @@
+"""Tests for the shared fan-out pool (fanout.py).
+
+Runs without gevent patching, so the thread backend is what is exercised; the
+bound is the same object either way.
+"""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import threading
+import time
+
+import fanout
+
+
+def test_results_keep_input_order():
+    def slow_for_small(n):
+        time.sleep(0.01 * (5 - n))
+        return n * 10
+
+    assert fanout.fan_out("tourone", slow_for_small, range(5)) == [0, 10, 20, 30, 40]
+
+
+def test_empty_input_builds_nothing():
+    assert fanout.fan_out("tourone", lambda x: x, []) == []
+
+
+def test_pool_is_reused_across_calls():
+    fanout.fan_out("tourone", lambda x: x, [1])
+    first = fanout._pools["tourone"]
+    fanout.fan_out("tourone", lambda x: x, [1, 2])
+    assert fanout._pools["tourone"] is first
+
+
+def test_limit_is_global_across_concurrent_callers():
+    """Several 'sessions' fanning out at once never exceed the pool size together."""
+    lock = threading.Lock()
+    state = {"now": 0, "max": 0}
+
+    def task(_):
+        with lock:
+            state["now"] += 1
+            state["max"] = max(state["max"], state["now"])
+        time.sleep(0.02)
+        with lock:
+            state["now"] -= 1
+
+    callers = [
+        threading.Thread(target=fanout.fan_out, args=("tourone", task, range(6)))
+        for _ in range(5)
+    ]
+    for t in callers:
+        t.start()
+    for t in callers:
+        t.join()
+    assert state["max"] <= fanout.TOURONE_PARALLEL
+    assert state["max"] > 1  # still concurrent
+
+
+def test_exception_reaches_the_caller():
+    def boom(x):
+        raise ValueError(x)
+
+    try:
+        fanout.fan_out("tourone", boom, [1])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_without_gevent_patching_threads_are_used():
+    assert not fanout.gevent_active()
+
+
+def test_submit_returns_before_the_task_runs():
+    started, release = threading.Event(), threading.Event()
+    done = []
+
+    def task(x):
+        started.set()
+        release.wait(1)
+        done.append(x)
+
+    fanout.submit("tourone", task, 7)
+    assert started.wait(1)
+    assert done == []
+    release.set()
+    for _ in range(100):
+        if done:
+            break
+        time.sleep(0.01)
+    assert done == [7]
@@ -0,0 +1,197 @@
+"""Tests for batched Hop 2 (hop2_batch.py).
+
+TourOne is replaced by a local stub that can answer either way: with
+``vorgangsNummer[]`` support (row container, like reiseliste) or without it.
+No live requests.
+"""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import hop2_batch
+
+
+def _detail(vorgang, agt="12345"):
+    return {"vorgang": vorgang, "agtNr": agt, "status": "OK"}
+
+
+class StubTourOne:
+    """Local ``/get/buchung`` with optional ``vorgangsNummer[]`` support."""
+
+    def __init__(self, batch=True, known=None, extra_rows=()):
+        self.batch = batch
+        self.known = known  # None = every vorgang exists
+        self.extra_rows = list(extra_rows)
+        self.calls = []
+
+    def _one(self, vorgang):
+        if self.known is not None and vorgang not in self.known:
+            return None
+        return _detail(vorgang)
+
+    def __call__(self, path, params):
+        assert path == "/get/buchung"
+        self.calls.append(dict(params))
+        if "vorgangsNummer[]" in params:
+            if not self.batch:
+                raise RuntimeError("400 Bad Request")
+            rows = [r for r in map(self._one, params["vorgangsNummer[]"]) if r]
+            rows += self.extra_rows
+            page = {str(i): r for i, r in enumerate(rows)}
+            page["anzahl"] = len(rows)
+            return page
+        return self._one(params["vorgangsNummer"]) or []
+
+
+def _batching(monkeypatch, on=True):
+    monkeypatch.setattr(hop2_batch, "_supported", on)
+
+
+# --- probe --------------------------------------------------------------------
+
+
+def _probing(monkeypatch, vorgaenge=("1001", "1002")):
+    monkeypatch.setattr(hop2_batch, "BATCH_MODE", "auto")
+    monkeypatch.setattr(hop2_batch, "_supported", None)
+    monkeypatch.setattr(hop2_batch, "PROBE_VORGAENGE", vorgaenge)
+
+
+def test_probe_detects_support(monkeypatch):
+    _probing(monkeypatch)
+    stub = StubTourOne(batch=True)
+    assert hop2_batch.probe(stub) is True
+    assert stub.calls == [{"vorgangsNummer[]": ["1001", "1002"]}]
+
+
+def test_probe_says_no_on_error_or_ambiguous_answer(monkeypatch):
+    _probing(monkeypatch)
+    assert hop2_batch.probe(StubTourOne(batch=False)) is False
+    # An empty list is also what an endpoint ignoring the array might answer.
+    assert hop2_batch.probe(lambda path, params: []) is False
+    # Rows for vorgänge nobody asked for: the param was ignored.
+    fremd = StubTourOne(batch=True, extra_rows=[_detail("4711")])
+    assert hop2_batch.probe(fremd) is False
+    assert hop2_batch._supported is False
+
+
+def test_probe_says_no_to_an_empty_or_partial_container(monkeypatch):
+    _probing(monkeypatch)
+    # all() over no rows was a yes: an empty container proves nothing.
+    assert hop2_batch.probe(StubTourOne(batch=True, known=set())) is False
+    # Only the first number honoured, as a scalar param would be.
+    assert hop2_batch.probe(StubTourOne(batch=True, known={"1001"})) is False
+    assert hop2_batch._supported is False
+
+
+def test_probe_without_known_vorgaenge_does_not_call(monkeypatch):
+    _probing(monkeypatch, vorgaenge=())
+    stub = StubTourOne(batch=True)
+    assert hop2_batch.probe(stub) is False
+    assert stub.calls == []
+
+
+def test_mode_off_never_probes(monkeypatch):
+    monkeypatch.setattr(hop2_batch, "BATCH_MODE", "off")
+    monkeypatch.setattr(hop2_batch, "_supported", None)
+    stub = StubTourOne()
+    assert hop2_batch.probe(stub) is False
+    assert stub.calls == []
+
+
+# --- hole_details -------------------------------------------------------------
+
+
+def test_unprobed_takes_one_request_per_vorgang(monkeypatch):
+    _batching(monkeypatch, None)
+    stub = StubTourOne()
+    out = hop2_batch.hole_details(["1", "2", "3"], stub, "test")
+    assert [d["vorgang"] for d in out] == ["1", "2", "3"]
+    assert sorted(c["vorgangsNummer"] for c in stub.calls) == ["1", "2", "3"]
+
+
+def test_batched_is_one_request_in_input_order(monkeypatch):
+    _batching(monkeypatch)
+    stub = StubTourOne()
+    out = hop2_batch.hole_details(["3", "1", "2"], stub, "test")
+    assert [d["vorgang"] for d in out] == ["3", "1", "2"]
+    assert stub.calls == [{"vorgangsNummer[]": ["3", "1", "2"]}]
+
+
+def test_batched_chunks_at_batch_size(monkeypatch):
+    _batching(monkeypatch)
+    stub = StubTourOne()
+    vorgaenge = [str(i) for i in range(hop2_batch.BATCH_SIZE + 3)]
+    out = hop2_batch.hole_details(vorgaenge, stub, "test")
+    assert [d["vorgang"] for d in out] == vorgaenge
+    assert sorted(len(c["vorgangsNummer[]"]) for c in stub.calls) == [
+        3,
+        hop2_batch.BATCH_SIZE,
+    ]
+
+
+def test_missing_row_falls_back_to_a_single_fetch(monkeypatch):
+    _batching(monkeypatch)
+    stub = StubTourOne(known={"1"})
+    out = hop2_batch.hole_details(["1", "2"], stub, "test")
+    assert out[0]["vorgang"] == "1"
+    assert out[1] == []  # the single endpoint's own "not found"
+    assert {"vorgangsNummer": "2"} in stub.calls
+
+
+def test_failed_batch_falls_back_to_fan_out(monkeypatch):
+    _batching(monkeypatch)
+    stub = StubTourOne(batch=False)
+    out = hop2_batch.hole_details(["1", "2"], stub, "test")
+    assert [d["vorgang"] for d in out] == ["1", "2"]
+
+
+def test_row_for_an_unrequested_vorgang_never_reaches_the_caller(monkeypatch):
+    _batching(monkeypatch)
+    stub = StubTourOne(extra_rows=[_detail("9999", agt="99999")])
+    out = hop2_batch.hole_details(["1"], stub, "test")
+    assert out == [_detail("1")]
+
+
+def test_refused_batched_row_is_a_failure_not_a_refetch(monkeypatch):
+    _batching(monkeypatch)
+    stub = StubTourOne()
+    out = hop2_batch.hole_details(["1", "2"], stub, "test", gehoert=lambda r: r["vorgang"] != "2")
+    assert out == [_detail("1"), None]
+    assert len(stub.calls) == 1
+
+
+def test_empty_vorgang_is_never_batched(monkeypatch):
+    """A row without ``vorgang`` must not "match" an empty request."""
+    _batching(monkeypatch)
+    stub = StubTourOne(extra_rows=[{"agtNr": "99999"}])
+    hop2_batch.hole_details(["1", ""], stub, "test")
+    assert stub.calls[0] == {"vorgangsNummer[]": ["1"]}
+    assert {"vorgangsNummer": ""} in stub.calls
+
+
+def test_batched_rows_still_pass_g3_one_by_one(monkeypatch):
+    """Batching changes the transport, not the per-row agency check."""
+    import agenturdaten
+
+    _batching(monkeypatch)
+    eigene = {
+        "ACTION": {"AgenturNummer": "12345", "VorgangsNummer": "1"},
+        "LEISTUNGEN": [],
+    }
+    fremde = dict(eigene, ACTION={"AgenturNummer": "12345", "VorgangsNummer": "2"})
+
+    def tourone(path, params=None, **kw):
+        if path == "/get/buchungLeistungenListe":
+            return {
+                "0": {"vorgangsNummer": "1", "buchungLeistungen": eigene},
+                "1": {"vorgangsNummer": "2", "buchungLeistungen": fremde},
+                "anzahl": 2,
+            }
+        return {
+            "0": _detail("1"),
+            "1": _detail("2", agt="99999"),
+            "anzahl": 2,
+        }
+
+    monkeypatch.setattr(agenturdaten, "_tourone_get", tourone)
+    text = agenturdaten.fetch_buchungen_text("12345", details=True)
+    assert "nicht leer" in text  # vorgang 2's detail was rejected by G3
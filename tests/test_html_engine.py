@@ -0,0 +1,68 @@
+"""Tests for the HTML engines (html_engine.py) and the tools that use them."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import markdownify
+import pytest
+
+import html_engine
+
+PAGE = """<!DOCTYPE html><html><head><title>Namibia &amp; Botswana - Reise</title></head>
+<body><header><nav><a href="/Afrika">Afrika</a> <a href='/Vision'>Vision</a></nav></header>
+<main><h1>Etosha Reise</h1><p>Erleben Sie <b>Namibia</b> &ndash; mit <i>Freunden</i>.<br>Neue Zeile</p>
+<ul><li>Tag 1: Windhoek</li><li>Tag 2: Etosha</li></ul>
+<table><tr><th>Datum</th><th>Preis</th></tr><tr><td>01.02.</td><td>2.999 &euro;</td></tr></table>
+
+
+<div id="reiseverlauf"><h2>Reiseverlauf</h2><p>Text <a href="/Afrika/Namibia#termine">Termine</a></p></div>
+<img src="a.jpg" alt="Bild">
+</main><footer>&copy; 2026</footer></body></html>"""
+
+needs_lxml = pytest.mark.skipif(html_engine.lxml is None, reason="lxml not installed")
+
+
+def test_html_parser_engine_is_the_former_path():
+    main = html_engine.parse(PAGE, "html.parser").find("main")
+    assert html_engine.to_markdown(main, "html.parser") == markdownify.markdownify(str(main)).strip()
+
+
+@needs_lxml
+def test_engines_agree_on_markdown_title_and_links():
+    out = {}
+    for engine in html_engine.ENGINES:
+        soup = html_engine.parse(PAGE, engine)
+        out[engine] = (
+            soup.find("title").get_text(strip=True),
+            html_engine.to_markdown(soup.find("main"), engine),
+            html_engine.links(PAGE, engine),
+        )
+    assert out["lxml"] == out["html.parser"]
+    title, markdown, links = out["lxml"]
+    assert title == "Namibia & Botswana - Reise"
+    assert "\n\n\n" not in markdown and "| 01.02. | 2.999 € |" in markdown
+    assert links == ["/Afrika", "/Vision", "/Afrika/Namibia#termine"]
+
+
+@needs_lxml
+def test_lxml_links_fall_back_on_documents_lxml_refuses():
+    xml_decl = '<?xml version="1.0" encoding="ISO-8859-1"?><html><a href="/x">x</a></html>'
+    assert html_engine.links(xml_decl, "lxml") == ["/x"]
+    assert html_engine.links("", "lxml") == []
+
+
+@pytest.mark.parametrize("engine", html_engine.ENGINES)
+def test_website_tool_with_either_engine(engine, monkeypatch):
+    if engine == "lxml" and html_engine.lxml is None:
+        pytest.skip("lxml not installed")
+    import agent_base
+    import travel_index
+
+    monkeypatch.setattr(html_engine, "ENGINE", engine)
+    monkeypatch.setattr(agent_base, "get_chamaeleon_website_html", lambda path: PAGE)
+    monkeypatch.setattr(travel_index, "get_termine_markdown", lambda path: "")
+    result = agent_base.chamaeleon_website_tool_base("/Afrika/Namibia/Etosha-ALL")
+    assert result.startswith("# Namibia & Botswana - Reise\n")
+    assert "Erleben Sie **Namibia** – mit *Freunden*." in result
+
+    page = agent_base.markdownify_page_html(PAGE.replace("<main>", "<main><script>alert(1)</script>"))
+    assert "alert" not in page and "Tag 2: Etosha" in page
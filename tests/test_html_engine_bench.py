@@ -0,0 +1,100 @@
+"""Benchmark: both HTML engines over a saved corpus of sitemap pages.
+
+Not part of the default suite. Run by hand:
+
+    RUN_BENCH=1 pytest tests/test_html_engine_bench.py -s
+
+The corpus is ``.html_corpus/`` in the repo root (git-ignored). When it is
+empty the first run saves ``HTML_CORPUS_PAGES`` (default 60) pages of the
+sitemap into it; later runs measure the same files. For every page, each
+engine does what chamaeleon_website_tool_base does — parse, find ``<main>``,
+convert to markdown — and the run reports time, peak traced memory and the
+pages whose markdown differs, with the first lines of each diff. A page whose
+markdown differs fails the run unless it is listed in KNOWN_DIFFERENCES.
+"""
+
+import difflib
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import html_engine
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_BENCH") != "1" or html_engine.lxml is None,
+    reason="benchmark - set RUN_BENCH=1 (needs lxml)",
+)
+
+CORPUS = Path(__file__).resolve().parent.parent / ".html_corpus"
+
+# Corpus pages (file stems) whose markdown may differ between the engines,
+# each with the reason. Empty: lxml has to give the same text everywhere.
+KNOWN_DIFFERENCES: dict[str, str] = {}
+
+
+def _corpus() -> dict[str, str]:
+    CORPUS.mkdir(exist_ok=True)
+    if not any(CORPUS.glob("*.html")):
+        import agent_base
+
+        paths = agent_base.all_sites[:: max(len(agent_base.all_sites) // int(os.getenv("HTML_CORPUS_PAGES", "60")), 1)]
+        for path in paths:
+            try:
+                html = agent_base._fetch_website_html(path)
+            except Exception as e:
+                print(f"skip {path}: {e}")
+                continue
+            name = path.strip("/").replace("/", "__") or "index"
+            (CORPUS / f"{name}.html").write_text(html, encoding="utf-8")
+    pages = {p.stem: p.read_text(encoding="utf-8") for p in sorted(CORPUS.glob("*.html"))}
+    if not pages:
+        pytest.skip("empty corpus and the site is unreachable")
+    return pages
+
+
+def _convert(html: str, engine: str) -> str:
+    soup = html_engine.parse(html, engine)
+    main = soup.find("main") or soup.find("div", class_="main") or soup.find("body")
+    return html_engine.to_markdown(main, engine)
+
+
+def _run(pages: dict[str, str], engine: str) -> tuple[dict[str, str], float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = {name: _convert(html, engine) for name, html in pages.items()}
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def test_engine_benchmark():
+    pages = _corpus()
+    size = sum(len(html) for html in pages.values())
+    results = {engine: _run(pages, engine) for engine in html_engine.ENGINES}
+
+    print(f"\n{len(pages)} pages, {size / 1e6:.1f} MB of HTML")
+    for engine, (_, elapsed, peak) in results.items():
+        print(f"  {engine:12} {elapsed:6.2f}s  peak {peak / 1e6:6.1f} MB")
+
+    fast, slow = results["lxml"][0], results["html.parser"][0]
+    differing = [name for name in pages if fast[name] != slow[name]]
+    print(f"  markdown differs on {len(differing)} of {len(pages)} pages")
+    for name in differing[:5]:
+        diff = difflib.unified_diff(
+            slow[name].splitlines(), fast[name].splitlines(), "html.parser", "lxml", n=0, lineterm=""
+        )
+        print(f"  --- {name}")
+        for line in list(diff)[2:12]:
+            print(f"    {line}")
+    assert [name for name in differing if name not in KNOWN_DIFFERENCES] == []
+
+    start = time.perf_counter()
+    hrefs = {engine: [html_engine.links(html, engine) for html in pages.values()] for engine in html_engine.ENGINES}
+    assert hrefs["lxml"] == hrefs["html.parser"]
+    print(f"  links: identical on every page ({time.perf_counter() - start:.2f}s for both engines)")
@@ -14,7 +14,10 @@ import common as _  # noqa: F401  (adds repo root to sys.path)
 
 import time
 
+import pytest
+
 import kunden_auth as ka
+import session_binding
 
 # --- fixtures ----------------------------------------------------------------
 
@@ -88,6 +91,25 @@ def _patch_get(monkeypatch, resp=None, exc=None, spy=None):
     monkeypatch.setattr(ka.requests, "get", fake_get)
 
 
+@pytest.fixture(params=["memory", "shared"])
+def backend(request, monkeypatch, tmp_path):
+    """Both binding/limiter backends; returns the limiter storage URI.
+
+    "shared" is what SHARED_STATE=<file> runs: the store's maps in SQLite and
+    every write a transaction.
+    """
+    if request.param == "memory":
+        return "memory://"
+    from shared_state import SharedState
+
+    path = str(tmp_path / "state.sqlite3")
+    store = session_binding.new_store(
+        lambda: ka.BINDING_TTL, on_drop=ka.drop_warm, shared=SharedState(path), name="kunden"
+    )
+    monkeypatch.setattr(ka, "_store", store)
+    return "sqlite:///" + path
+
+
 # --- extraction --------------------------------------------------------------
 
 
@@ -372,7 +394,7 @@ def test_extract_ignores_an_unindented_injected_key():
     assert ka.extract_kundennr(hostile) == ""
 
 
-def test_authenticate_runs_the_sequence_in_the_safe_order(monkeypatch):
+def test_authenticate_runs_the_sequence_in_the_safe_order(monkeypatch, backend):
     """The route's security properties ARE this ordering, so test it directly.
 
     A mutation run showed the view could clear the binding *after* ss.php, or
@@ -406,7 +428,7 @@ def test_authenticate_runs_the_sequence_in_the_safe_order(monkeypatch):
         assert ka.authenticate(body) == (False, None)
 
 
-def test_binding_is_cleared_before_ss_php_is_called(monkeypatch):
+def test_binding_is_cleared_before_ss_php_is_called(monkeypatch, backend):
     """The clear must happen BEFORE verification, not merely before the commit.
 
     Checking only the end state is not enough — a mutation that moves
@@ -568,7 +590,7 @@ def test_coerce_json_body_recovers_a_text_plain_body():
         assert ka.coerce_json_body(None, hostile) == {}
 
 
-def test_rate_limited_auth_still_clears_the_binding(monkeypatch):
+def test_rate_limited_auth_still_clears_the_binding(monkeypatch, backend):
     """Regression: a 429 on /kunde/auth must NOT fail open.
 
     flask-limiter rejects in before_request, so the view body — and with it the
@@ -590,7 +612,7 @@ def test_rate_limited_auth_still_clears_the_binding(monkeypatch):
         key_func=get_remote_address,
         app=app,
         default_limits=[],
-        storage_uri="memory://",
+        storage_uri=backend,
         enabled=True,
     )
     app.register_error_handler(RateLimitExceeded, rate_limit._on_rate_limit)
@@ -625,3 +647,89 @@ def test_rate_limited_auth_still_clears_the_binding(monkeypatch):
     )
     assert resp.status_code == 429
     assert ka.resolve("nat-victim-textplain") is None
+
+
+# --- Hop-1 prefetch -----------------------------------------------------------
+
+
+def _prefetch_on(monkeypatch, adresse=None):
+    """Enable the prefetch, run it inline, and count Hop-1 calls."""
+    import kundendaten as kd
+
+    calls = []
+
+    def fake_get(path, params, timeout=20):
+        calls.append(params["kundennummer"])
+        return adresse if adresse is not None else {"buchungen": []}
+
+    monkeypatch.setattr(kd, "PREFETCH_HOP1", True)
+    monkeypatch.setattr(kd, "_warm", {})
+    monkeypatch.setattr(kd, "_tourone_get", fake_get)
+    monkeypatch.setattr(kd.fanout, "submit", lambda name, fn, *a: fn(*a))
+    monkeypatch.setattr(ka, "verify_meinchamaeleon_session", lambda *a: "999999999")
+    return kd, calls
+
+
+def test_successful_auth_warms_hop1_for_the_first_tool_call(monkeypatch):
+    kd, calls = _prefetch_on(monkeypatch)
+    ka.authenticate({"session_id": "warm-1", "phpsessid": SID})
+    assert calls == ["999999999"]
+
+    kd.fetch_buchungen_text("999999999")
+    assert calls == ["999999999"], "the tool call paid for Hop 1 again"
+
+
+def test_the_warm_entry_serves_only_the_first_tool_call(monkeypatch):
+    """A booking made after the prefetch shows up on the very next question."""
+    kd, calls = _prefetch_on(monkeypatch)
+    ka.authenticate({"session_id": "warm-6", "phpsessid": SID})
+    kd.fetch_buchungen_text("999999999")
+    assert kd._warm == {}
+    kd.fetch_buchungen_text("999999999")
+    assert calls == ["999999999", "999999999"]
+
+
+def test_reauth_as_the_same_customer_keeps_the_warm_entry(monkeypatch):
+    """The widget re-auths on every page view — that must not refetch each time."""
+    kd, calls = _prefetch_on(monkeypatch)
+    ka.authenticate({"session_id": "warm-2", "phpsessid": SID})
+    ka.authenticate({"session_id": "warm-2", "phpsessid": SID})
+    assert calls == ["999999999"]
+    assert "999999999" in kd._warm
+
+
+def test_unbind_and_a_failed_reauth_drop_the_warm_entry(monkeypatch):
+    kd, _ = _prefetch_on(monkeypatch)
+    ka.authenticate({"session_id": "warm-3", "phpsessid": SID})
+    ka.unbind("warm-3")
+    assert kd._warm == {}
+
+    ka.authenticate({"session_id": "warm-3", "phpsessid": SID})
+    monkeypatch.setattr(ka, "verify_meinchamaeleon_session", lambda *a: None)
+    ka.authenticate({"session_id": "warm-3", "phpsessid": SID})
+    assert kd._warm == {}
+
+
+def test_prefetch_landing_after_unbind_is_discarded(monkeypatch):
+    """A slow Hop 1 must not warm a customer the session already let go of."""
+    kd, _ = _prefetch_on(monkeypatch)
+
+    def slow_get(path, params, timeout=20):
+        ka.unbind("warm-4")  # the user logged out while TourOne was answering
+        return {"buchungen": []}
+
+    monkeypatch.setattr(kd, "_tourone_get", slow_get)
+    ka.authenticate({"session_id": "warm-4", "phpsessid": SID})
+    assert kd._warm == {}
+
+
+def test_prefetch_failure_is_not_cached(monkeypatch):
+    kd, _ = _prefetch_on(monkeypatch)
+
+    def boom(*a, **kw):
+        raise RuntimeError("TourOne down")
+
+    monkeypatch.setattr(kd, "_tourone_get", boom)
+    authenticated, _ = ka.authenticate({"session_id": "warm-5", "phpsessid": SID})
+    assert authenticated
+    assert kd._warm == {}
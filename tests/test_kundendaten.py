@@ -460,6 +460,32 @@ def test_detail_teilerfolg_zeigt_verfuegbare(monkeypatch):
     assert "keine Details laden" in text
 
 
+def test_gebuendelt_fremde_detailzeile_wird_verworfen(monkeypatch):
+    """Gebündelter Hop 2: eine Zeile mit fremder adrKundenNr erscheint nie."""
+    import hop2_batch
+
+    monkeypatch.setattr(hop2_batch, "_supported", True)
+    eigene = dict(volle_buchung(vorgang="126001", titel="Eigene Reise"), adrKundenNr=999999999)
+    fremde = dict(volle_buchung(vorgang="126002", titel="Fremde Reise"), adrKundenNr=111111111)
+    calls = fake_tourone(
+        monkeypatch,
+        {
+            "/get/adresse": adresse_mit(
+                [eingebettete_buchung("126001"), eingebettete_buchung("126002")]
+            ),
+            "/get/buchung": {"0": eigene, "1": fremde, "anzahl": 2},
+        },
+    )
+    text = kd.fetch_buchungen_text("999999999", auswahl="alle", details=True)
+    assert "Eigene Reise" in text
+    assert "Fremde Reise" not in text and "111111111" not in text
+    assert "keine Details laden" in text
+    # Verworfen heißt gescheitert, nicht "fehlt": kein Einzelabruf hinterher.
+    assert [c["params"] for c in calls if c["path"] == "/get/buchung"] == [
+        {"vorgangsNummer[]": ["126001", "126002"]}
+    ]
+
+
 # --- make_buchungen_tool ------------------------------------------------------
 
 
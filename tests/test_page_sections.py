@@ -0,0 +1,72 @@
+"""Tests for the per-page section index (page_sections.py) and the website
+tool's #fragment handling."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import pytest
+
+import agent_base
+import page_sections
+
+PAGE = """<html><head><title>Etosha - Reise</title></head><body>
+<nav><a href="#reiseverlauf">Reiseverlauf</a> <a href="#leistungen">Leistungen</a></nav>
+<main>
+<h1>Etosha</h1><p>Namibia in 14 Tagen.</p>
+<section id="reiseverlauf"><h2>Reiseverlauf</h2><p>Tag 1: Windhoek</p><p>Tag 2: Etosha</p></section>
+<section id="reisedetails"><h2>Reisedetails</h2>
+  <div id="leistungen"><h3>Leistungen</h3><ul><li>Flug</li><li>Safari</li></ul></div>
+</section>
+<h2><a name="unterkuenfte"></a>Unterkünfte</h2><p>Lodge am Park</p>
+</main></body></html>"""
+
+
+def test_split_at_anchors_in_page_order():
+    page = page_sections.split(PAGE)
+    assert page["title"] == "Etosha - Reise"
+    assert list(page["sections"]) == ["reiseverlauf", "reisedetails", "leistungen", "unterkuenfte"]
+    assert page["intro"] == "Etosha\n======\n\nNamibia in 14 Tagen."
+    assert "Tag 2: Etosha" in page["sections"]["reiseverlauf"]
+    assert "Safari" not in page["sections"]["reisedetails"]  # up to the nested anchor
+    assert "* Safari" in page["sections"]["leistungen"]
+    assert "Lodge am Park" in page["sections"]["unterkuenfte"]
+    # The whole page is the unmarked conversion, as before.
+    assert "⟦" not in page["markdown"] and "Tag 1: Windhoek" in page["markdown"]
+
+
+def test_split_is_built_once_per_page():
+    assert page_sections.split(PAGE) is page_sections.split(PAGE)
+
+
+def test_page_without_anchors():
+    page = page_sections.split("<title>Vision</title><main><p>Text</p></main>")
+    assert page["sections"] == {} and page["intro"] == "Text"
+    assert page_sections.toc(page) == ""
+
+
+@pytest.fixture()
+def website(monkeypatch):
+    import travel_index
+
+    monkeypatch.setattr(agent_base, "get_chamaeleon_website_html", lambda path: PAGE)
+    monkeypatch.setattr(travel_index, "get_termine_markdown", lambda path: "## Termine\n\n| 01.02. |")
+
+
+def test_fragment_returns_the_section_and_a_toc(website):
+    out = agent_base.chamaeleon_website_tool_base("/Afrika/Namibia/Etosha-ALL#leistungen")
+    whole = agent_base.chamaeleon_website_tool_base("/Afrika/Namibia/Etosha-ALL")
+    assert out.startswith("# Etosha - Reise\n")
+    assert "#reiseverlauf, #reisedetails, #leistungen, #unterkuenfte" in out
+    assert "* Safari" in out and "Tag 1: Windhoek" not in out and "| 01.02. |" not in out
+    assert len(out) < len(whole)
+    assert "Tag 1: Windhoek" in whole and whole.endswith("| 01.02. |")
+
+
+def test_termine_fragment_without_a_termine_section(website):
+    out = agent_base.chamaeleon_website_tool_base("/Afrika/Namibia/Etosha-ALL#termine")
+    assert out.endswith("| 01.02. |") and "Tag 1: Windhoek" not in out
+
+
+def test_unknown_fragment_falls_back_to_the_whole_page(website):
+    out = agent_base.chamaeleon_website_tool_base("/Afrika/Namibia/Etosha-ALL#gibtsnicht")
+    assert "Abschnitt #gibtsnicht gibt es auf dieser Seite nicht" in out
+    assert "Tag 1: Windhoek" in out and out.endswith("| 01.02. |")
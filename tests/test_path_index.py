@@ -0,0 +1,70 @@
+"""Tests for the trip path index (path_index.py) behind find_trip_site and
+detect_recommendation_links."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import random
+
+import pytest
+
+import agent_base
+from path_index import PathIndex
+
+
+def _linear(paths, needle):
+    """The former find_trip_site scan."""
+    return next((p for p in paths if needle in p), None)
+
+
+def test_first_containing_matches_the_linear_scan_on_the_sitemap():
+    paths = agent_base.trip_sites
+    index = PathIndex(paths)
+    rng = random.Random(7)
+    needles = ["/", "-ALL", "Namibia", "/Afrika/Namibia", "Etosha", "gibtsnicht", "a"]
+    for path in rng.sample(paths, 40):
+        i = rng.randrange(len(path))
+        needles += [path, path[i:], path[: i + 1], path[i : i + rng.randint(1, 12)]]
+    for needle in needles:
+        assert index.first_containing(needle) == _linear(paths, needle), needle
+
+
+def test_first_containing_prefers_sitemap_order_and_handles_edges():
+    index = PathIndex(["/b/xa", "/a/x", "/a/xa"])
+    assert index.first_containing("xa") == "/b/xa"
+    assert index.first_containing("/a/x") == "/a/x"
+    assert index.first_containing("/a/xa") == "/a/xa"
+    assert index.first_containing("/c") is None
+    assert PathIndex([]).first_containing("/a") is None
+    assert "/a/x" in index and "/a" not in index
+
+
+def test_find_trip_site_uses_the_index():
+    assert agent_base.find_trip_site("Namibia") == _linear(agent_base.trip_sites, "Namibia")
+    with pytest.raises(ValueError):
+        agent_base.find_trip_site("/gibtsnicht")
+    with pytest.raises(ValueError):
+        agent_base.find_trip_site("")
+
+
+def test_detect_recommendation_links():
+    trip = agent_base.trip_sites[0]
+    other = agent_base.trip_sites[1]
+    reply = (
+        f"Schau dir [die Reise](https://www.chamaeleon-reisen.de{trip}) an, "
+        f"Termine unter {other}#termine, aber nicht /Afrika oder {trip}-Extra."
+    )
+    assert agent_base.detect_recommendation_links(reply) == {trip, f"{other}#termine"}
+    assert agent_base.detect_recommendation_links("") == set()
+
+
+def test_apply_sitemap_rebuilds_the_index():
+    original = agent_base.sitemap
+    try:
+        agent_base.apply_sitemap("## Reiseziele\n/Afrika/Neuland\n/Afrika/Neuland/Testreise-ALL\n## Nachhaltigkeit\n")
+        assert agent_base.find_trip_site("Testreise") == "/Afrika/Neuland/Testreise-ALL"
+        assert agent_base.detect_recommendation_links("/Afrika/Neuland/Testreise-ALL") == {
+            "/Afrika/Neuland/Testreise-ALL"
+        }
+    finally:
+        agent_base.apply_sitemap(original)
+    assert len(agent_base.trip_index) == len(agent_base.trip_sites)
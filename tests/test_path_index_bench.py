@@ -0,0 +1,80 @@
+"""Benchmark: link detection in long replies, path index vs the former scan.
+
+Not part of the default suite. Run by hand:
+
+    RUN_BENCH=1 pytest tests/test_path_index_bench.py -s
+
+The former detection matched ``(?:/[...]+)*`` — empty at every position — and
+checked each candidate against the trip list; the current one matches
+non-empty runs only and checks a set. Both must find the same links.
+"""
+
+import os
+import re
+import time
+
+import pytest
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import agent_base
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_BENCH") != "1", reason="benchmark - set RUN_BENCH=1"
+)
+
+_OLD_PATTERN = re.compile(r"(?:/[a-zA-Z0-9\-\_]+)*")
+
+
+def _detect_old(reply):
+    links = set()
+    for match in _OLD_PATTERN.finditer(reply):
+        link = match.group(0)
+        if link in agent_base.trip_sites:
+            _, end = match.span(0)
+            if reply[end : end + 8] == "#termine":
+                link += "#termine"
+            links.add(link)
+    return links
+
+
+def _reply(n_bytes):
+    trips = agent_base.trip_sites
+    parts, size, i = [], 0, 0
+    while size < n_bytes:
+        part = (
+            f"Die Reise [{trips[i % len(trips)]}](https://www.chamaeleon-reisen.de"
+            f"{trips[i % len(trips)]}) führt durch /Afrika/Namibia und 3/4 der Strecke. "
+        )
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("n_bytes", [10_000, 100_000, 1_000_000])
+def test_detection_benchmark(n_bytes):
+    reply = _reply(n_bytes)
+    start = time.perf_counter()
+    new = agent_base.detect_recommendation_links(reply)
+    t_new = time.perf_counter() - start
+    start = time.perf_counter()
+    old = _detect_old(reply)
+    t_old = time.perf_counter() - start
+    assert new == old
+    print(
+        f"\n{n_bytes} bytes, {len(new)} links: index {t_new * 1000:.1f}ms, "
+        f"former {t_old * 1000:.1f}ms ({t_old / t_new:.1f}x)"
+    )
+
+
+def test_find_trip_site_benchmark():
+    needles = [path[len(path) // 3 :] for path in agent_base.trip_sites]
+    start = time.perf_counter()
+    new = [agent_base.find_trip_site(n) for n in needles]
+    t_new = time.perf_counter() - start
+    start = time.perf_counter()
+    old = [next(p for p in agent_base.trip_sites if n in p) for n in needles]
+    t_old = time.perf_counter() - start
+    assert new == old
+    print(f"\nfind_trip_site x{len(needles)}: index {t_new * 1000:.2f}ms, former {t_old * 1000:.2f}ms")
@@ -0,0 +1,86 @@
+"""Tests for the preview metadata index (preview_index.py) and its use in
+recommendations.make_recommendation_preview. No network."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import pytest
+from bs4 import BeautifulSoup
+
+import preview_index
+
+PAGE = """<!DOCTYPE html><html lang="de"><head>
+<meta charset="iso-8859-1">
+<title>
+  Namibia &amp; Botswana - Etosha-Reise | Chamäleon
+</title>
+<meta property="og:title" content="Etosha">
+<meta property="og:image" content="https://www.chamaeleon-reisen.de/img/etosha.jpg?w=1200&amp;h=630">
+</head><body><title>not this one</title>""" + "<p>Reiseverlauf</p>" * 5000 + "</body></html>"
+
+
+def test_head_extractor_matches_the_full_parse():
+    soup = BeautifulSoup(PAGE, "html.parser")
+    meta = preview_index.extract_head(PAGE)
+    assert meta == {
+        "title": soup.find("title").get_text(strip=True),
+        "image": soup.find("meta", property="og:image")["content"],
+    }
+    assert meta["image"].endswith("w=1200&h=630")
+
+
+def test_head_extractor_without_title_or_image():
+    assert preview_index.extract_head("<html><head></head><body>x</body></html>") is None
+    assert preview_index.extract_head("<title>Nur Titel</title><body>") == {
+        "title": "Nur Titel",
+        "image": None,
+    }
+
+
+@pytest.fixture()
+def recommendations(monkeypatch):
+    import recommendations
+
+    monkeypatch.setattr(preview_index, "_index", {})
+    monkeypatch.setattr(recommendations, "find_trip_site", lambda rec: "/Afrika/Namibia/Etosha-ALL")
+    return recommendations
+
+
+def test_indexed_pages_are_a_dict_lookup(recommendations, monkeypatch):
+    preview_index.record("/Afrika/Namibia/Etosha-ALL", PAGE)
+
+    def no_fetch(site):
+        raise AssertionError("indexed page fetched again")
+
+    monkeypatch.setattr(recommendations, "get_chamaeleon_website_html", no_fetch)
+    monkeypatch.setattr(recommendations, "find_trip_site", no_fetch)
+    preview = recommendations.make_recommendation_preview("/Afrika/Namibia/Etosha-ALL#termine")
+    assert preview == {
+        "url": "https://www.chamaeleon-reisen.de/Afrika/Namibia/Etosha-ALL#termine",
+        "title": "Namibia & Botswana",
+        "image": "https://www.chamaeleon-reisen.de/img/etosha.jpg?w=1200&h=630",
+    }
+
+
+def test_unindexed_pages_fall_back_to_the_full_parse_once(recommendations, monkeypatch):
+    fetched = []
+    monkeypatch.setattr(
+        recommendations, "get_chamaeleon_website_html", lambda site: fetched.append(site) or PAGE
+    )
+    first = recommendations.make_recommendation_preview("/Etosha")
+    second = recommendations.make_recommendation_preview("/Etosha")
+    assert first == second and first["title"] == "Namibia & Botswana"
+    assert fetched == ["/Afrika/Namibia/Etosha-ALL"]
+
+
+def test_travel_index_build_records_the_pages_it_fetches(monkeypatch):
+    import travel_index
+
+    monkeypatch.setattr(preview_index, "_index", {})
+
+    class _Resp:
+        status_code = 200
+        text = PAGE
+
+    monkeypatch.setattr(travel_index.requests, "get", lambda *a, **k: _Resp())
+    travel_index._fetch_widget_code("/Afrika/Namibia/Etosha-ALL")
+    assert preview_index.get("/Afrika/Namibia/Etosha-ALL")["title"].startswith("Namibia")
@@ -0,0 +1,78 @@
+"""Tests for the link-preview stage (recommendations.PreviewStage) and its
+SSE events in app.chat_stream. Previews are faked; no network."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import json
+import queue
+import time
+
+import pytest
+
+import recommendations
+from recommendations import PreviewStage
+
+DELAYS = {"/slow": 0.3, "/fast": 0.0, "/mid": 0.1, "/stuck": 1.0}
+
+
+@pytest.fixture()
+def fake_previews(monkeypatch):
+    started = []
+
+    def preview(rec):
+        started.append((rec, time.monotonic()))
+        time.sleep(DELAYS[rec])
+        if rec == "/broken":
+            raise RuntimeError("kaputt")
+        return {"url": rec, "title": rec.strip("/"), "image": "i.jpg"}
+
+    DELAYS["/broken"] = 0.0
+    monkeypatch.setattr(recommendations, "make_recommendation_preview", preview)
+    return started
+
+
+def test_previews_arrive_in_completion_order(fake_previews):
+    stage = PreviewStage()
+    stage.start(["/slow", "/fast", "/broken", "/mid"])
+    assert [p["url"] for p in stage.ready()] == ["/fast", "/mid", "/slow"]
+
+
+def test_one_deadline_for_the_whole_reply(fake_previews):
+    stage = PreviewStage(deadline=0.4)
+    t0 = time.monotonic()
+    stage.start(["/stuck", "/fast", "/mid"])
+    got = [p["url"] for p in stage.ready()]
+    assert got == ["/fast", "/mid"]
+    assert time.monotonic() - t0 < 0.8  # the deadline, not the stuck preview
+
+
+def test_stage_runs_on_the_shared_pool(fake_previews):
+    import fanout
+
+    for _ in range(2):
+        stage = PreviewStage()
+        stage.start(["/fast"])
+        list(stage.ready())
+    assert "previews" in fanout._pools
+
+
+def test_chat_stream_sends_one_event_per_preview(fake_previews, monkeypatch):
+    import app
+
+    def fake_call_stream(*args):
+        yield {"type": "response", "data": {"reply": "<p>x</p>", "recommendations": ["/slow", "/fast"]}}
+
+    logged = queue.Queue()
+    monkeypatch.setattr(app, "call_stream", fake_call_stream)
+    monkeypatch.setattr(app, "log_queue", logged)
+    resp = app.app.test_client().post(
+        "/chat/stream",
+        json={"session_id": "s1", "messages": [{"role": "user", "content": "Namibia?"}]},
+    )
+    events = [json.loads(line[6:]) for line in resp.get_data(as_text=True).split("\n\n") if line]
+    assert [e["type"] for e in events] == ["response", "recommendation_previews", "recommendation_previews"]
+    assert [e["data"]["recommendation_previews"][0]["url"] for e in events[1:]] == ["/fast", "/slow"]
+
+    _, messages = logged.get_nowait()
+    assert [m["role"] for m in messages] == ["user", "assistant", "recommendation_previews"]
+    assert [p["url"] for p in messages[-1]["content"]] == ["/fast", "/slow"]
@@ -10,7 +10,7 @@ import time
 # Add the bot directory to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import make_recommendation_previews_async
+from recommendations import make_recommendation_previews_async
 
 
 def test_async_previews():
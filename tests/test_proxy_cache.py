@@ -0,0 +1,164 @@
+"""Tests for the site proxy's HTTP cache (proxy_cache.py) and its use in
+app.proxy. Upstream is a fake session; nothing leaves the process."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+from types import SimpleNamespace
+
+import pytest
+from requests.structures import CaseInsensitiveDict
+
+import proxy_cache
+from proxy_cache import ProxyCache, freshness_lifetime
+
+NOW = 1_760_000_000.0
+
+
+def _h(**headers):
+    return CaseInsensitiveDict({k.replace("_", "-"): v for k, v in headers.items()})
+
+
+# --- policy -------------------------------------------------------------------
+
+
+def test_freshness_from_cache_control_expires_and_last_modified():
+    date = "Thu, 09 Oct 2025 08:53:20 GMT"  # == NOW
+    assert freshness_lifetime(_h(Cache_Control="public, max-age=60"), NOW) == 60
+    assert freshness_lifetime(_h(Cache_Control="max-age=60, s-maxage=5"), NOW) == 5
+    assert freshness_lifetime(_h(Cache_Control="no-cache, max-age=60"), NOW) == 0
+    assert freshness_lifetime(_h(Cache_Control="private, max-age=60"), NOW) is None
+    assert freshness_lifetime(_h(Cache_Control="no-store"), NOW) is None
+    assert freshness_lifetime(_h(Date=date, Expires="Thu, 09 Oct 2025 08:55:20 GMT"), NOW) == 120
+    assert freshness_lifetime(_h(Expires="0"), NOW) == 0
+    # 10 % of the Last-Modified age, capped
+    assert freshness_lifetime(_h(Date=date, Last_Modified="Thu, 09 Oct 2025 08:43:20 GMT"), NOW) == 60
+    assert freshness_lifetime(_h(Date=date, Last_Modified="Thu, 01 Jan 2015 00:00:00 GMT"), NOW) == 3600
+    assert freshness_lifetime(_h(), NOW) == 0
+
+
+def _store(cache, upstream, body=b"x", status=200, request=None, path="p", now=NOW):
+    return cache.store("GET", path, "", request or _h(), status, upstream, [], body, now=now)
+
+
+def test_never_stores_cookies_private_vary_star_or_unvalidated_no_cache():
+    cache = ProxyCache(1000)
+    assert not _store(cache, _h(Cache_Control="max-age=60", Set_Cookie="a=b"))
+    assert not _store(cache, _h(Cache_Control="private, max-age=60"))
+    assert not _store(cache, _h(Cache_Control="max-age=60", Vary="*"))
+    assert not _store(cache, _h(Cache_Control="no-cache"))  # nothing to revalidate with
+    assert not _store(cache, _h(Cache_Control="max-age=60"), status=500)
+    assert not cache.store("POST", "p", "", _h(), 200, _h(Cache_Control="max-age=60"), [], b"x")
+    assert len(cache) == 0
+    assert not proxy_cache.storable_request("POST", _h())
+    assert not proxy_cache.storable_request("GET", _h(Authorization="Basic x"))
+    assert not proxy_cache.storable_request("GET", _h(Cookie="session=a"))
+
+
+def test_fresh_then_stale_then_revalidated():
+    cache = ProxyCache(1000)
+    assert _store(cache, _h(Cache_Control="max-age=10", ETag='"v1"'))
+    entry, fresh = cache.lookup("GET", "p", "", _h(), now=NOW + 5)
+    assert fresh and entry["body"] == b"x"
+
+    entry, fresh = cache.lookup("GET", "p", "", _h(), now=NOW + 11)
+    assert entry and not fresh
+    assert cache.validators(entry) == {"If-None-Match": '"v1"'}
+    # The 304 carries no Cache-Control: the stored max-age applies again.
+    cache.refresh(entry, _h(ETag='"v1"'), now=NOW + 11)
+    assert cache.lookup("GET", "p", "", _h(), now=NOW + 20)[1]
+    assert cache.stats["revalidated"] == 1
+
+
+def test_key_includes_query_and_varied_headers():
+    cache = ProxyCache(1000)
+    upstream = _h(Cache_Control="max-age=60", Vary="Accept-Language")
+    _store(cache, upstream, b"de", request=_h(Accept_Language="de"))
+    _store(cache, upstream, b"en", request=_h(Accept_Language="en"))
+    assert cache.lookup("GET", "p", "", _h(Accept_Language="de"), now=NOW)[0]["body"] == b"de"
+    assert cache.lookup("GET", "p", "", _h(Accept_Language="en"), now=NOW)[0]["body"] == b"en"
+    assert cache.lookup("GET", "p", "", _h(Accept_Language="fr"), now=NOW)[0] is None
+    assert cache.lookup("GET", "p", "a=1", _h(Accept_Language="de"), now=NOW)[0] is None
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ProxyCache(max_bytes=250, max_entry_bytes=100)
+    upstream = _h(Cache_Control="max-age=60")
+    assert not _store(cache, upstream, b"x" * 101)  # larger than one entry may be
+    for path in ("a", "b", "c"):
+        _store(cache, upstream, b"x" * 100, path=path)
+    assert cache.lookup("GET", "a", "", _h(), now=NOW)[0] is None
+    assert cache.stats["bytes"] == 200 and cache.stats["evictions"] == 1
+    assert cache._vary.keys() == {("GET", "b", ""), ("GET", "c", "")}
+
+
+# --- app.proxy ----------------------------------------------------------------
+
+
+@pytest.fixture()
+def proxy(monkeypatch):
+    import app
+
+    calls = []
+    replies = []
+
+    def fake_request(method, url, headers, **kwargs):
+        calls.append((method, url, headers))
+        status, upstream, body = replies.pop(0)
+        upstream = _h(**upstream)
+        return SimpleNamespace(
+            status_code=status,
+            headers=upstream,
+            raw=SimpleNamespace(
+                headers=upstream,
+                stream=lambda amt, decode_content: iter([body[:3], body[3:]]),
+            ),
+            iter_content=lambda chunk_size: iter([body[:3], body[3:]]),
+            close=lambda: None,
+        )
+
+    monkeypatch.setattr(app, "_proxy_session", SimpleNamespace(request=fake_request))
+    monkeypatch.setattr(app, "_proxy_cache", ProxyCache(1 << 20))
+    return SimpleNamespace(client=app.app.test_client(), calls=calls, replies=replies)
+
+
+def test_proxy_serves_fresh_gets_from_the_cache(proxy):
+    proxy.replies.append((200, {"Content_Type": "text/css", "Cache_Control": "max-age=60"}, b"a{}"))
+    assert proxy.client.get("/site.css").data == b"a{}"
+    assert proxy.client.get("/site.css").data == b"a{}"
+    assert len(proxy.calls) == 1
+
+    # Another query string is another resource.
+    proxy.replies.append((200, {"Content_Type": "text/css", "Cache_Control": "max-age=60"}, b"b{}"))
+    assert proxy.client.get("/site.css?v=2").data == b"b{}"
+    assert proxy.calls[-1][1].endswith("/site.css?v=2")
+
+
+def test_proxy_revalidates_stale_html_with_the_etag(proxy):
+    page = b'<a href="https://chamaeleon-webbot-production.up.railway.app/x">'
+    proxy.replies.append((200, {"Content_Type": "text/html", "Cache_Control": "no-cache", "ETag": '"p1"'}, page))
+    assert proxy.client.get("/Afrika").data == b'<a href="/x">'
+
+    proxy.replies.append((304, {"ETag": '"p1"'}, b""))
+    again = proxy.client.get("/Afrika", headers={"If-None-Match": '"client"'})
+    assert again.status_code == 200 and again.data == b'<a href="/x">'
+    # Upstream was asked with the cache's validator, not the client's.
+    assert proxy.calls[1][2]["If-None-Match"] == '"p1"'
+
+
+def test_proxy_answers_client_validators_from_the_cache(proxy):
+    proxy.replies.append((200, {"Content_Type": "image/png", "Cache_Control": "max-age=60", "ETag": '"img"'}, b"png"))
+    assert proxy.client.get("/a.png").data == b"png"  # read to the end: stored
+    assert proxy.client.get("/a.png", headers={"If-None-Match": '"img"'}).status_code == 304
+    assert len(proxy.calls) == 1
+
+
+def test_proxy_never_caches_posts_or_cookie_responses(proxy):
+    for _ in range(2):
+        proxy.replies.append((200, {"Content_Type": "text/plain", "Cache_Control": "max-age=60"}, b"ok"))
+        proxy.client.post("/form.php", data=b"x")
+    for _ in range(2):
+        proxy.replies.append(
+            (200, {"Content_Type": "text/plain", "Cache_Control": "max-age=60", "Set_Cookie": "s=1"}, b"ok")
+        )
+        proxy.client.get("/login.php")
+    assert len(proxy.calls) == 4
@@ -0,0 +1,142 @@
+"""Tests for the proxy's content-coding negotiation (proxy_encoding.py) and
+app.proxy against a local HTTP server that compresses like the real site."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import gzip
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from werkzeug.datastructures import Headers
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+import proxy_encoding
+import proxy_stream
+from proxy_cache import ProxyCache
+
+OLD = "https://chamaeleon-webbot-production.up.railway.app"
+
+
+def _accept(value):
+    return Request(EnvironBuilder(headers={"Accept-Encoding": value}).get_environ()).accept_encodings
+
+
+def test_negotiate_honours_quality_and_what_is_installed():
+    assert proxy_encoding.negotiate(_accept("gzip, deflate")) == "gzip"
+    assert proxy_encoding.negotiate(_accept("gzip;q=0, deflate")) == "identity"
+    assert proxy_encoding.negotiate(_accept("")) == "identity"
+    best = "br" if proxy_encoding.brotli else "gzip"
+    assert proxy_encoding.negotiate(_accept("gzip, deflate, br, zstd")) == best
+    assert proxy_encoding.negotiate(_accept("*")) == best
+
+
+def test_compress_stream_flushes_every_chunk():
+    chunks = [b"<p>eins</p>" * 50, b"<p>zwei</p>" * 50]
+    out = list(proxy_encoding.compress_stream(iter(chunks), "gzip"))
+    # Decodable up to the first chunk before the stream has ended.
+    partial = zlib.decompressobj(31).decompress(out[0])
+    assert partial == chunks[0]
+    assert gzip.decompress(b"".join(out)) == b"".join(chunks)
+
+
+def test_brotli_stream_roundtrip():
+    brotli = pytest.importorskip("brotli")
+    chunks = [b"<p>eins</p>" * 50, b"<p>zwei</p>" * 50]
+    out = b"".join(proxy_encoding.compress_stream(iter(chunks), "br"))
+    assert brotli.decompress(out) == b"".join(chunks)
+
+
+def test_variant_cache_compresses_each_body_once_per_coding():
+    variants = proxy_encoding.VariantCache(1 << 20)
+    page = b"<p>Reise</p>" * 500
+    first = variants.get(page, "gzip")
+    assert variants.get(page, "gzip") is first
+    assert gzip.decompress(first) == page
+    assert variants.stats == {"hits": 1, "misses": 1, "bytes": len(first)}
+
+
+# --- app.proxy against a compressing upstream ---------------------------------
+
+PAGE = (f"<p>Übersicht <a href='{OLD}/x'>x</a></p>" * 100).encode("ISO-8859-1")
+CSS = b"body { color: #333; }\n" * 200
+
+
+class _Site(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    seen: list = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        coding = self.headers.get("Accept-Encoding")
+        self.seen.append((self.path, coding))
+        if self.path == "/style.css":
+            body, ctype = CSS, "text/css"
+        else:
+            body, ctype = PAGE, "text/html; charset=iso-8859-1"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Cache-Control", "max-age=60")
+        if coding == "gzip":
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture()
+def site(monkeypatch):
+    import app
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Site)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Site.seen = []
+    monkeypatch.setattr(app, "BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(app, "_proxy_session", proxy_stream.new_session())
+    monkeypatch.setattr(app, "_proxy_cache", ProxyCache(1 << 20))
+    monkeypatch.setattr(app, "_proxy_variants", proxy_encoding.VariantCache(1 << 20))
+    monkeypatch.setattr(proxy_encoding, "CODINGS", ("gzip",))
+    yield app
+    server.shutdown()
+
+
+def test_gzip_assets_pass_through_untouched(site):
+    client = site.app.test_client()
+    resp = client.get("/style.css", headers={"Accept-Encoding": "gzip, br"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert int(resp.headers["Content-Length"]) == len(resp.data)
+    assert gzip.decompress(resp.data) == CSS
+    assert _Site.seen == [("/style.css", "gzip")]
+
+    # Cached per coding: a client without gzip gets (and caches) its own copy.
+    plain = client.get("/style.css", headers={"Accept-Encoding": "identity"})
+    assert plain.data == CSS and "Content-Encoding" not in plain.headers
+    again = client.get("/style.css", headers={"Accept-Encoding": "gzip"})
+    assert gzip.decompress(again.data) == CSS
+    assert _Site.seen == [("/style.css", "gzip"), ("/style.css", "identity")]
+
+
+def test_rewritten_html_is_recompressed_for_the_client(site):
+    client = site.app.test_client()
+    expected = PAGE.decode("ISO-8859-1").replace(OLD, "").encode("utf-8")
+
+    streamed = client.get("/Afrika", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in streamed.headers["Vary"]
+    assert gzip.decompress(streamed.data) == expected
+
+    # From the cache (stored decoded): once per coding, then the kept variant.
+    for _ in range(2):
+        cached = client.get("/Afrika", headers={"Accept-Encoding": "gzip"})
+        assert gzip.decompress(cached.data) == expected
+    assert site._proxy_variants.stats["misses"] == 1
+    assert site._proxy_variants.stats["hits"] == 1
+    plain = client.get("/Afrika", headers={"Accept-Encoding": "identity"})
+    assert plain.data == expected and "Content-Encoding" not in plain.headers
+    assert len(_Site.seen) == 1
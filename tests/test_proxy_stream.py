@@ -0,0 +1,159 @@
+"""Tests for the streaming site proxy (proxy_stream.py): the chunk-wise
+rewrite, the cache tee, and app.proxy against a local HTTP server."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import proxy_stream
+from proxy_cache import ProxyCache
+
+OLD = "https://chamaeleon-webbot-production.up.railway.app"
+
+
+def _split(data: bytes, rng: random.Random) -> list[bytes]:
+    cuts = sorted(rng.sample(range(1, len(data)), k=min(len(data) - 1, 8)))
+    return [data[a:b] for a, b in zip([0, *cuts], [*cuts, len(data)])]
+
+
+def test_replace_stream_equals_the_one_shot_replace():
+    rng = random.Random(7)
+    page = (f"<a href='{OLD}/x'>Übersicht</a> {OLD[:20]} " * 50 + OLD + OLD).encode(
+        "ISO-8859-1"
+    )
+    expected = page.decode("ISO-8859-1").replace(OLD, "").encode("utf-8")
+    for _ in range(200):
+        out = b"".join(proxy_stream.replace_stream(_split(page, rng), OLD, ""))
+        assert out == expected
+    # The held-back tail is never longer than the needle.
+    chunks = list(proxy_stream.replace_stream([b"a" * 1000], OLD, ""))
+    assert len(chunks[0]) == 1000 - (len(OLD) - 1)
+
+
+def test_rewrite_memory_does_not_grow_with_the_page():
+    import tracemalloc
+
+    block = (f"<div>{OLD}/reise</div>" + "x" * 900).encode("ISO-8859-1")
+    chunks = (block * 16 for _ in range(500))  # ~8 MB page, 16 KB chunks
+    tracemalloc.start()
+    try:
+        for _ in proxy_stream.replace_stream(chunks, OLD, ""):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 512 * 1024
+
+
+def test_tee_keeps_only_complete_bodies_within_the_limit():
+    kept = []
+    assert list(proxy_stream.tee([b"ab", b"cd"], 4, kept.append)) == [b"ab", b"cd"]
+    list(proxy_stream.tee([b"ab", b"cde"], 4, kept.append))
+    stream = proxy_stream.tee([b"ab", b"cd"], 4, kept.append)
+    next(stream)
+    stream.close()  # the client went away
+    assert kept == [b"abcd"]
+
+
+# --- app.proxy against a real upstream ----------------------------------------
+
+
+class _Site(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    release = threading.Event()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=iso-8859-1")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Set-Cookie", f"visitor={self.path}")
+        self.end_headers()
+        for part in (f"<p>Erster Teil {OLD}/a</p>", f"<p>Zweiter Teil {OLD}/b</p>"):
+            data = part.encode("ISO-8859-1")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+            self.release.wait(5)  # the second part only once the test saw the first
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture()
+def site(monkeypatch):
+    import app
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Site)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Site.release.clear()
+    monkeypatch.setattr(app, "BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(app, "_proxy_session", proxy_stream.new_session())
+    monkeypatch.setattr(app, "_proxy_cache", ProxyCache(1 << 20))
+    yield app
+    _Site.release.set()
+    server.shutdown()
+
+
+def test_first_byte_arrives_before_upstream_finishes(site):
+    client = site.app.test_client()
+    started = time.monotonic()
+    resp = client.get("/Afrika", buffered=False)
+    body = iter(resp.response)
+    first = next(body)
+    assert time.monotonic() - started < 4  # not waiting on release
+    assert first == b"<p>Erster Teil "  # the rest waits for the next chunk
+    _Site.release.set()
+    assert b"".join(body) == b"/a</p><p>Zweiter Teil /b</p>"
+    resp.close()
+
+
+def test_upstream_cookies_do_not_leak_into_the_shared_session(site):
+    _Site.release.set()
+    client = site.app.test_client()
+    assert client.get("/eins").status_code == 200
+    assert len(site._proxy_session.cookies) == 0
+
+
+class _PerVisitor(BaseHTTPRequestHandler):
+    """Answers per cookie, but says the page may be cached (no Vary: Cookie)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = f"Hallo {self.headers.get('Cookie') or 'Gast'}".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Cache-Control", "max-age=60")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_cookies_bypass_the_shared_cache(monkeypatch):
+    import app
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PerVisitor)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(app, "BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(app, "_proxy_session", proxy_stream.new_session())
+    monkeypatch.setattr(app, "_proxy_cache", ProxyCache(1 << 20))
+    try:
+        anna, ben = app.app.test_client(), app.app.test_client()
+        anna.set_cookie("kunde", "anna")
+        ben.set_cookie("kunde", "ben")
+        assert anna.get("/konto.txt").data == b"Hallo kunde=anna"
+        assert ben.get("/konto.txt").data == b"Hallo kunde=ben"
+        assert len(app._proxy_cache) == 0
+        # Without cookies the page is still shared.
+        assert app.app.test_client().get("/konto.txt").data == b"Hallo Gast"
+        assert len(app._proxy_cache) == 1
+    finally:
+        server.shutdown()
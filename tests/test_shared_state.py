@@ -0,0 +1,181 @@
+"""Tests for the cross-process state (shared_state.py): session_binding stores
+and rate-limit counters in one SQLite file. Each ``SharedState`` below has its
+own connection, i.e. stands in for one worker process; one test uses real
+processes."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import pytest
+from limits import RateLimitItemPerHour
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+import session_binding
+import shared_state
+from shared_state import SharedState
+
+
+@pytest.fixture()
+def path(tmp_path):
+    return str(tmp_path / "state.sqlite3")
+
+
+def test_shared_map_behaves_like_the_dict_it_replaces(path):
+    m = SharedState(path).map("t:bindings", expires_of=lambda e: e[1])
+    m["s1"] = ("12345", 100.0)
+    assert m["s1"] == ("12345", 100.0) and m.get("s1")[0] == "12345"
+    assert "s1" in m and "s2" not in m and len(m) == 1
+    assert m.setdefault("s2", ("6", 200.0)) == ("6", 200.0)
+    assert m.pop("s2") == ("6", 200.0) and m.pop("s2", None) is None
+    with pytest.raises(KeyError):
+        del m["s2"]
+    assert m.expired(150.0) == [("s1", ("12345", 100.0))]
+    m.clear()
+    assert list(m) == []
+
+
+def _stores(path, ttl=3600):
+    """The same store as two worker processes see it."""
+    return (
+        session_binding.new_store(ttl, shared=SharedState(path), name="kunden"),
+        session_binding.new_store(ttl, shared=SharedState(path), name="kunden"),
+    )
+
+
+def test_binding_made_in_one_worker_resolves_in_the_other(path):
+    a, b = _stores(path)
+    session_binding.bind(a, "sess", "111")
+    assert session_binding.resolve(b, "sess") == "111"
+    session_binding.unbind(b, "sess")
+    assert session_binding.resolve(a, "sess") is None
+
+
+def test_newest_auth_wins_across_workers(path):
+    a, b = _stores(path)
+    slow = session_binding.begin(a, "sess")  # worker A: ss.php stalls
+    fast = session_binding.begin(b, "sess")  # worker B: newer auth
+    assert fast > slow
+    assert session_binding.commit(b, "sess", "", fast)  # B: logged out
+    assert not session_binding.commit(a, "sess", "111", slow)  # A lands last: refused
+    assert session_binding.resolve(a, "sess") is None
+    assert len(a["inflight"]) == 0
+
+
+def test_sweep_evicts_expired_bindings_of_every_worker(path):
+    a, b = _stores(path, ttl=-1)
+    session_binding.bind(a, "s1", "111")
+    session_binding.bind(a, "s2", "222")
+    b["ttl"] = 3600
+    session_binding.bind(b, "s3", "333")
+    assert session_binding.sweep(b) == 2
+    assert sorted(a["bindings"]) == ["s3"]
+    assert session_binding.gauges(a) == {"bindings": 1, "inflight": 0, "evicted": 2}
+
+
+def test_drop_fires_on_supersede_and_expiry(path):
+    dropped = []
+    store = session_binding.new_store(
+        lambda: 0.05, on_drop=dropped.append, shared=SharedState(path), name="agentur"
+    )
+    session_binding.bind(store, "sess", "42")
+    g = session_binding.begin(store, "sess")
+    session_binding.commit(store, "sess", "43", g)
+    assert dropped == ["42"]
+    time.sleep(0.06)
+    assert session_binding.resolve(store, "sess") is None
+    assert dropped == ["42", "43"]
+
+
+def test_if_bound_runs_inside_the_transaction(path):
+    a, b = _stores(path)
+    session_binding.bind(a, "sess", "111")
+    ran = []
+    assert session_binding.if_bound(b, "sess", "111", lambda: ran.append(1))
+    assert not session_binding.if_bound(b, "sess", "222", lambda: ran.append(2))
+    assert ran == [1]
+
+
+def test_a_failed_transaction_rolls_back(path):
+    state = SharedState(path)
+    m = state.map("t")
+    with pytest.raises(RuntimeError):
+        with state.lock:
+            m["x"] = 1
+            raise RuntimeError("boom")
+    assert "x" not in m
+
+
+def test_fixed_window_limit_through_limits(path):
+    storage = storage_from_string("sqlite:///" + path)
+    limiter = FixedWindowRateLimiter(storage)
+    item = RateLimitItemPerHour(3)
+    assert [limiter.hit(item, "1.2.3.4") for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit(item, "5.6.7.8")
+    assert limiter.get_window_stats(item, "1.2.3.4").remaining == 0
+    storage.clear(item.key_for("1.2.3.4"))
+    assert limiter.hit(item, "1.2.3.4")
+
+
+def test_a_busy_database_is_retried_not_waited_on_inside_sqlite(path):
+    """A held write lock delays BEGIN by sleeping (cooperative under gevent)."""
+    holder, waiter = SharedState(path), SharedState(path)
+    entered = threading.Event()
+
+    def hold():
+        with holder.lock:
+            entered.set()
+            time.sleep(0.2)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    entered.wait(5)
+    started = time.monotonic()
+    with waiter.lock:
+        waiter.map("t").__setitem__("k", 1)
+    t.join()
+    assert time.monotonic() - started >= 0.1
+    assert holder.map("t")["k"] == 1
+
+
+def test_a_database_busy_past_the_timeout_raises(monkeypatch, path):
+    monkeypatch.setattr(shared_state, "BUSY_TIMEOUT_SECONDS", 0.05)
+    holder, waiter = SharedState(path), SharedState(path)
+    with holder.lock:
+        with pytest.raises(sqlite3.OperationalError):
+            with waiter.lock:
+                pass
+
+
+def test_limiter_uri_follows_the_setting(monkeypatch, path):
+    monkeypatch.setattr(shared_state, "SHARED_STATE", "off")
+    assert shared_state.limiter_uri() == "memory://" and shared_state.get() is None
+    monkeypatch.setattr(shared_state, "SHARED_STATE", path)
+    assert shared_state.limiter_uri() == "sqlite:///" + path
+    assert shared_state.get() is shared_state.open_state(path)
+
+
+def _hammer(path, n):
+    storage = storage_from_string("sqlite:///" + path)
+    store = session_binding.new_store(3600, shared=SharedState(path), name="kunden")
+    for _ in range(n):
+        storage.incr("ip", 3600)
+        session_binding.begin(store, "sess")
+
+
+def test_counters_and_generations_are_exact_across_processes(path):
+    SharedState(path)  # schema before the race
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_hammer, args=(path, 50)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+    assert all(p.exitcode == 0 for p in procs)
+    state = SharedState(path)
+    assert storage_from_string("sqlite:///" + path).get("ip") == 200
+    assert state.map("kunden:counters")["seq"] == 200
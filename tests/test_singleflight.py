@@ -0,0 +1,186 @@
+"""Tests for request coalescing (singleflight.py) and its two users:
+agent_base.get_chamaeleon_website_html and the site proxy (app.proxy)."""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+import proxy_encoding
+import proxy_stream
+import singleflight
+from proxy_cache import ProxyCache
+
+N = 8
+
+
+def _burst(fn, n=N):
+    """``fn()`` from ``n`` threads at once; results (or exceptions) in order."""
+    start = threading.Barrier(n)
+
+    def call(_):
+        start.wait()
+        try:
+            return fn()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(n) as pool:
+        return list(pool.map(call, range(n)))
+
+
+def test_concurrent_callers_share_one_call():
+    group = singleflight.Group()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return "seite"
+
+    assert _burst(lambda: group.do("k", fetch, timeout=5)) == ["seite"] * N
+    assert len(calls) == 1
+    assert group.stats["leaders"] == 1 and group.stats["followers"] == N - 1
+    assert len(group) == 0  # the key is free again: nothing is cached here
+    group.do("k", fetch, timeout=5)
+    assert len(calls) == 2
+
+
+def test_the_leaders_error_reaches_every_follower():
+    group = singleflight.Group()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ConnectionError("upstream down")
+
+    results = _burst(lambda: group.do("k", fetch, timeout=5))
+    assert len(calls) == 1
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert group.stats["errors"] == 1
+
+
+def test_a_follower_that_times_out_fetches_on_its_own():
+    group = singleflight.Group()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)  # the leader hangs
+            return "spät"
+        return "eigen"
+
+    leader = threading.Thread(target=group.do, args=("k", fetch, 5))
+    leader.start()
+    while not calls:
+        time.sleep(0.01)
+    assert group.do("k", fetch, timeout=0.1) == "eigen"
+    assert group.stats["timeouts"] == 1 and len(calls) == 2
+    release.set()
+    leader.join()
+
+
+# --- get_chamaeleon_website_html ------------------------------------------------
+
+
+def test_website_html_burst_is_one_request(monkeypatch):
+    import agent_base
+
+    calls = []
+
+    def fake_get(url, headers, timeout):
+        calls.append(url)
+        time.sleep(0.2)
+        return SimpleNamespace(text="<html>Namibia</html>", raise_for_status=lambda: None)
+
+    monkeypatch.setattr(agent_base.requests, "get", fake_get)
+    monkeypatch.setattr(agent_base, "_website_flights", singleflight.Group())
+    agent_base.get_chamaeleon_website_html.cache_clear()
+    try:
+        results = _burst(lambda: agent_base.get_chamaeleon_website_html("/Afrika/Namibia"))
+    finally:
+        agent_base.get_chamaeleon_website_html.cache_clear()
+    assert results == ["<html>Namibia</html>"] * N
+    assert calls == [agent_base.BASE_URL + "/Afrika/Namibia"]
+
+
+# --- app.proxy ----------------------------------------------------------------
+
+
+class _Site(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    seen: list = []
+    status = 200
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.seen.append(self.path)
+        time.sleep(0.3)  # long enough for the whole burst to arrive
+        body = b"<p>Reise</p>"
+        self.send_response(self.status)
+        self.send_header("Content-Type", "text/html; charset=iso-8859-1")
+        self.send_header("Cache-Control", "max-age=60")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture()
+def site(monkeypatch):
+    import app
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Site)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Site.seen = []
+    _Site.status = 200
+    monkeypatch.setattr(app, "BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(app, "_proxy_session", proxy_stream.new_session())
+    monkeypatch.setattr(app, "_proxy_cache", ProxyCache(1 << 20))
+    monkeypatch.setattr(app, "_proxy_variants", proxy_encoding.VariantCache(1 << 20))
+    monkeypatch.setattr(app, "_proxy_flights", singleflight.Group())
+    yield app
+    server.shutdown()
+
+
+def _get(app, path):
+    resp = app.app.test_client().get(path, headers={"Accept-Encoding": "identity"})
+    return resp.status_code, resp.data
+
+
+def test_proxy_burst_on_one_page_is_one_upstream_request(site):
+    results = _burst(lambda: _get(site, "/Afrika"))
+    assert results == [(200, b"<p>Reise</p>")] * N
+    assert _Site.seen == ["/Afrika"]
+    assert site._proxy_flights.stats["followers"] == N - 1
+
+
+def test_proxy_upstream_error_reaches_every_follower(site, monkeypatch):
+    calls = []
+
+    def failing(**kwargs):
+        calls.append(1)
+        time.sleep(0.3)
+        raise site.requests.exceptions.ConnectionError("site down")
+
+    monkeypatch.setattr(site, "_proxy_session", SimpleNamespace(request=failing))
+    results = _burst(lambda: _get(site, "/Afrika"))
+    assert len(calls) == 1
+    assert all(status == 502 for status, _ in results)
+
+
+def test_proxy_follower_timeout_falls_back_to_its_own_fetch(site, monkeypatch):
+    monkeypatch.setattr(site, "PROXY_FOLLOW_TIMEOUT", 0.05)
+    results = _burst(lambda: _get(site, "/Afrika"), n=2)
+    assert results == [(200, b"<p>Reise</p>")] * 2
+    assert _Site.seen == ["/Afrika", "/Afrika"]
+    assert site._proxy_flights.stats["timeouts"] == 1
@@ -0,0 +1,119 @@
+"""Tests for the persisted visa pages (visa_store) behind visa_tool_base.
+
+Supabase is stubbed and visum.de is never asked: the fetch function is a fake.
+"""
+
+import common as _  # noqa: F401  (adds repo root to sys.path)
+
+import pytest
+
+import agent_base
+import visa_store
+
+
+class _StubTable:
+    def __init__(self, client):
+        self._c = client
+
+    def upsert(self, row):
+        self._c.rows = [r for r in self._c.rows if r["land_id"] != row["land_id"]] + [row]
+        return self
+
+    def select(self, *a, **k):
+        return self
+
+    def execute(self):
+        class R:
+            data = list(self._c.rows)
+
+        return R()
+
+
+class _StubClient:
+    def __init__(self, rows=None, fail=False):
+        self.rows = rows or []
+        self.fail = fail
+
+    def table(self, name):
+        if self.fail:
+            raise RuntimeError("db down")
+        return _StubTable(self)
+
+
+@pytest.fixture()
+def store(monkeypatch):
+    stub = _StubClient()
+    monkeypatch.setattr(visa_store, "supabase", stub)
+    monkeypatch.setattr(visa_store, "_pages", {})
+    return stub
+
+
+def test_pages_survive_a_restart(store, monkeypatch):
+    visa_store.put("NAM", "# Namibia", now=1_760_000_000.0)
+    assert store.rows[0]["land_id"] == "NAM"
+
+    monkeypatch.setattr(visa_store, "_pages", {})  # a new process
+    assert visa_store.get("NAM") is None
+    assert visa_store.load() == 1
+    assert visa_store.get("NAM") == "# Namibia"
+    assert visa_store._pages["NAM"]["fetched_at"] == 1_760_000_000.0
+
+
+def test_failed_refresh_keeps_the_last_good_copy(store):
+    visa_store.put("NAM", "# alt")
+    visa_store.put("BWA", "# alt")
+
+    def fetch(land_id):
+        if land_id == "NAM":
+            raise ValueError("visum.de kaputt")
+        return f"# neu {land_id}"
+
+    summary = visa_store.refresh(fetch, ["NAM", "BWA", "ZAF"])
+    assert summary == {"due": 3, "refreshed": 2, "failed": 1}
+    assert visa_store.get("NAM") == "# alt"
+    assert visa_store.get("BWA") == "# neu BWA"
+    assert visa_store.get("ZAF") == "# neu ZAF"
+
+
+def test_boot_refresh_only_fetches_missing_or_old_copies(store):
+    visa_store.put("NAM", "# frisch")
+    visa_store.put("BWA", "# alt", now=0.0)
+    fetched = []
+    visa_store.refresh(lambda land_id: fetched.append(land_id) or "# x", ["NAM", "BWA", "ZAF"], max_age=3600)
+    assert sorted(fetched) == ["BWA", "ZAF"]
+
+
+def test_store_fails_open(monkeypatch):
+    monkeypatch.setattr(visa_store, "supabase", _StubClient(fail=True))
+    monkeypatch.setattr(visa_store, "_pages", {})
+    visa_store.put("NAM", "# Namibia")  # memory still works
+    assert visa_store.get("NAM") == "# Namibia"
+    assert visa_store.load() == 0
+
+
+def test_visa_tool_serves_from_the_store_and_fetches_only_on_a_miss(store, monkeypatch):
+    land_id = next(iter(agent_base.visa_labels))
+    fetched = []
+
+    def fetch(land_id):
+        fetched.append(land_id)
+        return f"# live {land_id}"
+
+    monkeypatch.setattr(agent_base, "fetch_visa_markdown", fetch)
+    assert agent_base.visa_tool_base(land_id.lower()) == f"# live {land_id}"
+    assert agent_base.visa_tool_base(land_id) == f"# live {land_id}"
+    assert fetched == [land_id]
+    assert store.rows[0]["land_id"] == land_id
+    with pytest.raises(ValueError):
+        agent_base.visa_tool_base("XXX")
+
+
+def test_visa_tool_does_not_store_errors(store, monkeypatch):
+    land_id = next(iter(agent_base.visa_labels))
+
+    def fetch(land_id):
+        raise agent_base.requests.ConnectionError("down")
+
+    monkeypatch.setattr(agent_base, "fetch_visa_markdown", fetch)
+    assert agent_base.visa_tool_base(land_id).startswith("Fehler beim Abrufen der Seite")
+    assert visa_store.get(land_id) is None
@@ -50,6 +50,8 @@ from datetime import datetime
 import requests
 from cachetools.func import ttl_cache
 
+import preview_index
+
 BASE_URL = "https://api.tourone.de"
 WEBSITE_URL = "https://www.chamaeleon-reisen.de"
 _WEBSITE_HEADERS = {
@@ -190,6 +192,9 @@ def _fetch_widget_code(path: str, timeout: int = 15) -> str | None:
         )
         if r.status_code != 200:
             return None
+        # The build reads every trip page anyway: index its preview metadata
+        # on the way, so recommendation previews never parse a page.
+        preview_index.record(path, r.text)
         return _page_widget_code(r.text)
     except requests.RequestException:
         return None
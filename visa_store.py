@@ -0,0 +1,172 @@
+"""Persistent store of the rendered visa pages (visa_tool), refreshed daily.
+
+``visa_tool_base`` used to fetch and parse visum.de on demand behind a
+per-process 24 h ``ttl_cache``: every deploy emptied it, so the first visa
+question per country after a deploy waited on a slow third-party page. Now:
+
+    daily 04:00 ──► refresh(): every visa_labels country, REFRESH_PARALLEL at
+                    a time ──► ok: put() ──► memory + Supabase row
+                               fails: the last good copy stays
+    boot ──► load() from Supabase ──► refresh() of missing / day-old copies
+    visa_tool ──► get(land_id) ──► hit: served from memory
+                                  miss: fetched live, then put()
+
+One row per country in ``visa_pages``, created once by hand in the Supabase
+SQL editor (the API client cannot run DDL):
+
+    create table visa_pages (
+      land_id    text primary key,
+      markdown   text not null,
+      fetched_at timestamptz not null
+    );
+    alter table visa_pages enable row level security;
+    -- service-role key bypasses RLS; no public policies on purpose.
+
+Every Supabase call fails open, like sitemap_store: without the table the
+store is a memory cache that the daily job keeps warm.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Iterable, TypedDict
+
+from db_logging import supabase  # single initialised client for the process
+
+TABLE = "visa_pages"
+
+# visum.de is a third-party site: a handful of requests at a time, no burst.
+REFRESH_PARALLEL = 2
+
+# Copies older than this are refreshed at boot instead of waiting for 04:00.
+MAX_AGE_SECONDS = 86400
+
+
+class VisaPage(TypedDict):
+    markdown: str
+    fetched_at: float
+
+
+_lock = threading.Lock()
+_pages: dict[str, VisaPage] = {}
+stats = {"hits": 0, "misses": 0, "refreshed": 0, "failed": 0}
+
+
+def get(land_id: str) -> str | None:
+    """The stored markdown for ``land_id`` — however old, it is the last good copy."""
+    page = _pages.get(land_id)
+    if page is None:
+        stats["misses"] += 1
+        return None
+    stats["hits"] += 1
+    return page["markdown"]
+
+
+def put(land_id: str, markdown: str, now: float | None = None) -> None:
+    """Keep a freshly rendered page, in memory and in Supabase."""
+    page: VisaPage = {"markdown": markdown, "fetched_at": time.time() if now is None else now}
+    with _lock:
+        _pages[land_id] = page
+    try:
+        supabase.table(TABLE).upsert(
+            {
+                "land_id": land_id,
+                "markdown": markdown,
+                "fetched_at": datetime.fromtimestamp(page["fetched_at"], timezone.utc).isoformat(),
+            }
+        ).execute()
+    except Exception as e:
+        print(f"[visa-store] save {land_id} failed (table missing? see module docstring): {e}")
+
+
+def load() -> int:
+    """Read every stored page into memory; returns how many. Newer copies in memory win."""
+    try:
+        rows = supabase.table(TABLE).select("land_id, markdown, fetched_at").execute().data
+    except Exception as e:
+        print(f"[visa-store] load failed (table missing? see module docstring): {e}")
+        return 0
+    loaded = 0
+    with _lock:
+        for row in rows or []:
+            try:
+                fetched_at = datetime.fromisoformat(row["fetched_at"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            current = _pages.get(row["land_id"])
+            if current is None or current["fetched_at"] < fetched_at:
+                _pages[row["land_id"]] = {"markdown": row["markdown"], "fetched_at": fetched_at}
+                loaded += 1
+    print(f"[visa-store] loaded {loaded} visa pages")
+    return loaded
+
+
+def refresh(
+    fetch: Callable[[str], str],
+    land_ids: Iterable[str],
+    max_age: float | None = None,
+) -> dict:
+    """Re-render every country with ``fetch``; with ``max_age``, only older copies.
+
+    ``fetch`` raises on any failure, so a broken page never replaces a good one.
+    """
+    now = time.time()
+    due = [
+        land_id
+        for land_id in land_ids
+        if max_age is None
+        or land_id not in _pages
+        or now - _pages[land_id]["fetched_at"] > max_age
+    ]
+
+    def one(land_id: str) -> bool:
+        try:
+            markdown = fetch(land_id)
+        except Exception as e:
+            print(f"[visa-store] refresh {land_id} failed, keeping the last copy: {e}")
+            return False
+        put(land_id, markdown)
+        return True
+
+    with ThreadPoolExecutor(max_workers=REFRESH_PARALLEL) as ex:
+        results = list(ex.map(one, due))
+    summary = {"due": len(due), "refreshed": sum(results), "failed": results.count(False)}
+    stats["refreshed"] += summary["refreshed"]
+    stats["failed"] += summary["failed"]
+    print(
+        f"[visa-store] refreshed {summary['refreshed']}/{summary['due']} visa pages, "
+        f"{summary['failed']} failed"
+    )
+    return summary
+
+
+_scheduler = None
+
+
+def start_scheduler(fetch: Callable[[str], str], land_ids: Iterable[str]):
+    """Daily 04:00 Europe/Berlin refresh. Idempotent per process.
+
+    Mirrors sitemap_sync / travel_index (02:00, 03:00), an hour after the last.
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+    import pytz
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    _scheduler = BackgroundScheduler(timezone=pytz.timezone("Europe/Berlin"))
+    _scheduler.add_job(
+        refresh,
+        "cron",
+        args=(fetch, list(land_ids)),
+        hour=4,
+        minute=0,
+        id="visa-store",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=3600,
+    )
+    _scheduler.start()
+    print("[visa-store] scheduler started - daily at 04:00 Europe/Berlin")
+    return _scheduler